@@ -4,14 +4,64 @@ import os
 
 class Settings(BaseSettings):
     TWITTER_BEARER_TOKEN: str
+    TWITTER_BEARER_TOKENS: str = ""  # 额外的 bearer token（逗号分隔），与 TWITTER_BEARER_TOKEN 组成额度池
     WECHAT_WEBHOOK_URL: str
     
-    TWITTER_USERNAMES: str = ""  # 改为字符串类型，稍后解析
+    WECHAT_RATE_LIMIT_PER_MINUTE: int = 20  # 企业微信 webhook 每分钟最多 20 条（多 worker 部署时为所有 worker 合计）
+    WECHAT_MAX_CONCURRENCY: int = 4  # 同时发送的最大请求数
+    OUTBOX_RETRY_BASE_SECONDS: int = 5  # 通知发送失败后的首次重试间隔，之后指数增长
+    OUTBOX_RETRY_MAX_SECONDS: int = 3600  # 重试间隔上限
+    NOTIFY_RULES_FILE: Optional[str] = None  # 分组订阅规则（JSON），未设置时全部发送到 WECHAT_WEBHOOK_URL
+    NOTIFY_DIGEST_WINDOW_SECONDS: float = 0  # 摘要窗口，大于 0 时将窗口内的推文合并为一条消息
+    NOTIFY_DIGEST_MAX_TWEETS: int = 10  # 积压达到该数量时不等窗口结束立即发送
+    DEDUP_WINDOW_SECONDS: int = 600  # 近似重复检测的时间窗口，0 表示关闭
+    DEDUP_MAX_DISTANCE: int = 3  # SimHash 汉明距离不超过该值视为重复内容
+    DEDUP_MAX_ENTRIES: int = 10000  # 内存索引最多保留的指纹数量
+    METRICS_TRACKING_ENABLED: bool = False  # 是否定期重新采样新推文的互动数据
+    METRICS_TRACKING_HOURS: int = 48  # 推文发布后跟踪多长时间
+    METRICS_SAMPLE_BASE_SECONDS: int = 300  # 首次重新采样的间隔，之后每次翻倍
+    METRICS_API_RESERVE: float = 0.5  # 采样只使用剩余额度高于该比例的部分，其余留给推文检测
+    METRICS_ALERT_LIKES: int = 0  # 点赞数达到该值时发送提醒，0 表示不提醒
+    METRICS_ALERT_RETWEETS: int = 0  # 转推数达到该值时发送提醒，0 表示不提醒
+    
+    TWITTER_API_BASE_URL: str = "https://api.twitter.com"
+    TWITTER_HTTP_POOL_SIZE: int = 10  # 共享连接池的最大连接数
+    TWITTER_REQUEST_TIMEOUT_SECONDS: int = 30
+    
+    TWITTER_USERNAMES: str = ""  # 启动时同步到 watched_users 表，运行时通过 /monitor/users 或 WATCHLIST_FILE 修改
+    WATCHLIST_FILE: Optional[str] = None  # 监控列表文件（JSON），修改后自动同步账号和可热更新的配置
+    WATCHLIST_RELOAD_SECONDS: int = 10  # 检查监控列表文件和其他 worker 修改的间隔
     CHECK_INTERVAL_SECONDS: int = 20  # 20秒检查一次，实现准实时监控
     AUTO_START_MONITORING: bool = False
+    POLLING_MODE: str = "timeline"  # timeline: 逐个用户轮询时间线; search: 合并 from: 查询批量轮询
+    SEARCH_QUERY_MAX_LENGTH: int = 512  # recent search 查询长度上限（Basic 为 512）
+    POLLING_STRATEGY: str = "round_robin"  # timeline 模式下的账号选择: round_robin 或 adaptive
+    ADAPTIVE_MIN_INTERVAL_SECONDS: int = 60  # adaptive 策略下单个账号的最小轮询间隔
+    ADAPTIVE_MAX_INTERVAL_SECONDS: int = 3600  # adaptive 策略下单个账号的最大轮询间隔
+    ACTIVITY_HALF_LIFE_HOURS: float = 72  # 发推频率的衰减半衰期
+    USER_ID_CACHE_TTL_HOURS: int = 168  # 用户ID缓存有效期，过期后重新解析
+    BACKFILL_ENABLED: bool = True  # 一页取不完的新推文（停机、限流、集中发推后）按分页补齐
+    BACKFILL_API_RESERVE: float = 0.5  # 补齐只使用剩余额度高于该比例的部分，其余留给实时轮询
+    BACKFILL_MAX_PAGES: int = 50  # 单个缺口最多补齐的页数（时间线接口本身最多返回最近 3200 条）
+    STREAM_ENABLED: bool = False  # 通过 filtered stream 长连接接收推文，连接断开或不可用时回退到轮询
+    STREAM_RULE_MAX_LENGTH: int = 512  # 单条 stream 规则的长度上限（Pro 为 1024）
+    STREAM_STALL_SECONDS: int = 30  # 超过该时间没有收到任何数据（服务端每 20 秒发送一次心跳）视为连接中断
+    STREAM_RECONNECT_MAX_SECONDS: int = 320  # 重连退避间隔的上限
+    RETENTION_DAYS: int = 0  # 推文记录保留的天数，更早的推文移入压缩归档后从数据库删除；0 为不清理（最少 8 天）
+    ARCHIVE_DIR: str = "./archive"  # 归档目录，每天一个或多个 gzip 压缩的 NDJSON 段文件
+    RETENTION_BATCH_SIZE: int = 1000  # 每批归档并删除的行数，每批一个短事务
+    RETENTION_INTERVAL_SECONDS: int = 3600  # 归档任务的运行间隔
+    PIPELINE_QUEUE_SIZE: int = 100  # 监控流水线每个阶段前最多排队的批次数，队列满时上游阶段等待
+    
+    SHARDING_BACKEND: str = "local"  # local: 单进程负责全部账号; sqlite: 多个 worker 通过共享数据库的租约分担账号
+    SHARD_COUNT: int = 64  # 账号分片数量，应明显大于 worker 数量
+    SHARD_LEASE_SECONDS: int = 30  # 分片租约时长，worker 停止心跳超过该时间后其账号由其他 worker 接管
+    SHARD_HEARTBEAT_SECONDS: int = 10  # 心跳续约间隔，应小于租约时长的一半
+    WORKER_ID: Optional[str] = None  # worker 标识，默认为 主机名-进程号
     
     DATABASE_URL: Optional[str] = "sqlite:///./twitter_monitor.db"
     
+    WEB_LOG_CAPACITY: int = 1000  # 管理面板日志缓冲区保留的条数
     LOG_LEVEL: str = "INFO"
     
     class Config:
@@ -25,4 +75,10 @@ class Settings(BaseSettings):
             return []
         return [username.strip() for username in self.TWITTER_USERNAMES.split(',') if username.strip()]
 
+    @property
+    def twitter_bearer_tokens_list(self) -> List[str]:
+        """TWITTER_BEARER_TOKEN 与 TWITTER_BEARER_TOKENS 合并去重后的 token 列表"""
+        tokens = [self.TWITTER_BEARER_TOKEN] + self.TWITTER_BEARER_TOKENS.split(',')
+        return list(dict.fromkeys(token.strip() for token in tokens if token.strip()))
+
 settings = Settings()
\ No newline at end of file
@@ -1,14 +1,22 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Query
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
 import asyncio
 import logging
 from app.config import settings
 from app.services.twitter_service import TwitterService
 from app.services.wechat_service import WeChatService
 from app.services.monitor_service import MonitorService
-from app.utils.web_logger import setup_web_logging, get_web_logs
+from app.services.tweet_history import search_tweets
+from app.services.tweet_export import EXPORT_FORMATS, export_tweets
+from app.services.watch_list import watch_list
+from app.models.database import init_db, close_db, get_db
+from app.utils.web_logger import setup_web_logging, get_web_logs, get_last_seq, stream_web_logs
+from app.utils.metrics import TWITTER_RATE_LIMIT_REMAINING, render_metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,10 +27,16 @@ setup_web_logging()
 monitor_service = None
 templates = Jinja2Templates(directory="app/templates")
 
+class WatchListRequest(BaseModel):
+    usernames: List[str]
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global monitor_service
     
+    # 启动时建立共享数据库连接（WAL 模式）
+    await init_db()
+    await watch_list.load()
     twitter_service = TwitterService()
     wechat_service = WeChatService()
     monitor_service = MonitorService(twitter_service, wechat_service)
@@ -36,6 +50,10 @@ async def lifespan(app: FastAPI):
     if monitor_service:
         await monitor_service.stop_monitoring()
         logger.info("Stopped monitoring service")
+    
+    await twitter_service.close()
+    await monitor_service.outbox.close()
+    await close_db()
 
 app = FastAPI(
     title="Twitter Monitor Framework",
@@ -81,6 +99,17 @@ async def stop_monitoring():
     await monitor_service.stop_monitoring()
     return {"message": "Monitoring stopped"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 指标（文本格式）"""
+    if monitor_service:
+        # 按时间刷新的指标在抓取时更新；发件箱积压在写入和投递时更新
+        for endpoint, budget in monitor_service.twitter_service.rate_limiter.snapshot().items():
+            if budget['remaining'] is not None:
+                TWITTER_RATE_LIMIT_REMAINING.labels(endpoint).set(budget['remaining'])
+
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/monitor/status")
 async def monitor_status():
     if not monitor_service:
@@ -93,49 +122,144 @@ async def monitor_status():
 
     return {
         "is_monitoring": monitor_service.is_monitoring,
-        "monitored_users": len(settings.twitter_usernames_list),
+        "monitored_users": len(watch_list.usernames),
         "check_interval": settings.CHECK_INTERVAL_SECONDS,
         "rate_limited": is_rate_limited,
-        "rate_limit_reset_seconds": reset_time
+        "rate_limit_reset_seconds": reset_time,
+        "rate_limits": twitter_service.rate_limiter.snapshot(),
+        "token_budgets": twitter_service.rate_limiter.token_snapshot(),
+        "outbox_pending": await monitor_service.outbox.pending_count(),
+        "backfill_gaps": monitor_service.backfill.open_gaps,
+        "stream": monitor_service.stream.status(),
+        "retention": monitor_service.retention.status(),
+        "pipeline": monitor_service.pipeline.status(),
+        "owned_users": len(monitor_service.owned_usernames),
+        "sharding": monitor_service.coordinator.status()
     }
 
 @app.get("/monitor/users")
 async def get_monitored_users():
-    """获取监控用户列表及状态"""
-    users_data = []
-    for username in settings.twitter_usernames_list:
-        users_data.append({
-            "username": username,
-            "last_check": "刚刚",  # 实际应该从数据库获取
-            "status": "正常"
-        })
+    """获取监控用户列表及每个账号的上次检查和上次发现新推文的时间"""
+    users_data = await watch_list.details()
 
     return {
         "users": users_data,
         "total_count": len(users_data)
     }
 
-@app.get("/monitor/logs")
-async def get_logs():
-    """获取系统日志"""
-    import datetime
+@app.post("/monitor/users")
+async def add_monitored_users(request: WatchListRequest):
+    """添加监控账号，运行中的监控下一轮即开始轮询，只为新增账号解析用户ID"""
+    try:
+        added = await watch_list.add(request.usernames)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # 获取web日志
-    web_logs = get_web_logs()
+    resolved = {}
+    if added and monitor_service:
+        resolved = await monitor_service.twitter_service.resolve_user_ids(added)
 
-    # 如果没有日志，添加一些状态信息
-    if not web_logs:
-        now = datetime.datetime.now().strftime("%H:%M:%S")
-        web_logs = [f"[{now}] INFO: 系统初始化完成，等待监控事件..."]
+    return {
+        "added": added,
+        "unresolved": [username for username in added if username not in resolved],
+        "total_count": len(watch_list.usernames)
+    }
+
+@app.delete("/monitor/users")
+async def remove_monitored_users(request: WatchListRequest):
+    """移除监控账号，下一轮轮询起生效"""
+    try:
+        removed = await watch_list.remove(request.usernames)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     return {
-        "logs": web_logs,
-        "timestamp": datetime.datetime.now().strftime("%H:%M:%S")
+        "removed": removed,
+        "total_count": len(watch_list.usernames)
     }
 
+@app.get("/tweets/search")
+async def search_tweet_history(
+    q: Optional[str] = None,
+    author: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200)
+):
+    """全文检索历史推文；翻页时把返回的 next_before_id 作为 before_id 传入"""
+    try:
+        return await search_tweets(q, author, since, until, before_id, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/tweets/export")
+async def export_tweet_history(
+    author: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    include_archive: bool = False
+):
+    """按推文 ID 从旧到新流式导出历史推文（NDJSON 或 CSV）；include_archive 时包含已归档的推文"""
+    return StreamingResponse(
+        export_tweets(format, author, since, until, include_archive),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="tweets.{format}"'}
+    )
+
+@app.get("/tweets/{tweet_id}/metrics")
+async def get_tweet_metrics(tweet_id: int):
+    """获取推文互动数据的采样时间序列（需开启 METRICS_TRACKING_ENABLED）"""
+    async with get_db() as db:
+        cursor = await db.execute(
+            """SELECT sampled_at, likes, retweets, replies, quotes FROM tweet_metrics
+               WHERE tweet_id = ? ORDER BY sampled_at""",
+            (tweet_id,)
+        )
+        rows = await cursor.fetchall()
+    if not rows:
+        raise HTTPException(status_code=404, detail="No metrics recorded for this tweet")
+
+    return {
+        "tweet_id": str(tweet_id),
+        "samples": [
+            {"sampled_at": sampled_at, "likes": likes, "retweets": retweets, "replies": replies, "quotes": quotes}
+            for sampled_at, likes, retweets, replies, quotes in rows
+        ]
+    }
+
+@app.get("/monitor/logs")
+async def get_logs(after: int = Query(0, ge=0)):
+    """获取系统日志；传入上次返回的 last_seq 只获取新增日志"""
+    # 获取web日志
+    entries = get_web_logs(after)
+
+    return {
+        "logs": [entry['text'] for entry in entries],
+        "last_seq": entries[-1]['seq'] if entries else max(after, get_last_seq()),
+        "timestamp": datetime.now().strftime("%H:%M:%S")
+    }
+
+@app.get("/monitor/logs/stream")
+async def stream_logs(request: Request, after: Optional[int] = Query(None, ge=0)):
+    """以 Server-Sent Events 推送新日志；断线重连时浏览器会带上 Last-Event-ID"""
+    last_event_id = request.headers.get("last-event-id")
+    if after is None:
+        after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+
+    return StreamingResponse(
+        stream_web_logs(after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/webhook/test")
 async def test_webhook():
-    wechat_service = WeChatService()
+    if not monitor_service:
+        raise HTTPException(status_code=500, detail="Monitor service not initialized")
+
+    wechat_service = monitor_service.wechat_service
     success = await wechat_service.send_message("测试消息：Twitter 监控框架运行正常")
 
     if success:
@@ -151,8 +275,7 @@ async def clear_rate_limit():
 
     try:
         twitter_service = monitor_service.twitter_service
-        twitter_service.rate_limited_until = None
-        await twitter_service._clear_rate_limit_in_db()
+        await twitter_service.clear_rate_limit()
 
         return {"message": "Rate limit status cleared successfully"}
     except Exception as e:
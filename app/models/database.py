@@ -1,26 +1,62 @@
 import aiosqlite
+import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import Optional
 from app.config import settings
+from app.utils.metrics import DB_TRANSACTION_SECONDS
 
 logger = logging.getLogger(__name__)
 
-class TweetRecord:
-    def __init__(self, tweet_id: str, username: str, content: str, 
-                 tweet_url: str, created_at: str, metrics: str):
-        self.tweet_id = tweet_id
-        self.username = username
-        self.content = content
-        self.tweet_url = tweet_url
-        self.created_at = created_at
-        self.metrics = metrics
+# 进程内共享的长连接，启动时创建；aiosqlite 连接内部是单线程串行执行，
+# 用锁保证同一时间只有一个协程使用它，避免事务交错
+_connection: Optional[aiosqlite.Connection] = None
+_lock: Optional[asyncio.Lock] = None
+
+def _db_path() -> str:
+    return settings.DATABASE_URL.replace('sqlite:///', '')
+
+async def _get_connection() -> aiosqlite.Connection:
+    global _connection
+    if _connection is None:
+        connection = aiosqlite.connect(_db_path())
+        connection.daemon = True  # 未调用 close_db 时也不阻止进程退出
+        db = await connection
+        # 新建的数据库启用增量回收，归档删除旧推文后分步释放空间（已有数据库由归档任务首次运行时转换）
+        await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute("PRAGMA synchronous=NORMAL")
+        await db.execute("PRAGMA busy_timeout=5000")
+        _connection = db
+    return _connection
+
+def _get_lock() -> asyncio.Lock:
+    global _lock
+    if _lock is None:
+        _lock = asyncio.Lock()
+    return _lock
+
+async def close_db():
+    """关闭共享连接（应用退出时调用）"""
+    global _connection, _lock
+    if _connection is not None:
+        await _connection.close()
+    _connection = None
+    _lock = None
+
+async def _add_missing_columns(db, table: str, columns: dict):
+    """为已存在的表补充新增的列（SQLite 不支持 ADD COLUMN IF NOT EXISTS）"""
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in await cursor.fetchall()}
+    for name, column_type in columns.items():
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
 
 async def init_db():
     try:
-        db_path = settings.DATABASE_URL.replace('sqlite:///', '')
-        
-        async with aiosqlite.connect(db_path) as db:
+        async with get_db() as db:
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS tweet_records (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -34,6 +70,12 @@ async def init_db():
                 )
             ''')
             
+            # 内容指纹（SimHash）用于启动时重建近似重复索引；duplicate_of 记录被合并到的原推文
+            await _add_missing_columns(db, 'tweet_records', {
+                'simhash': 'INTEGER',
+                'duplicate_of': 'TEXT'
+            })
+            
             await db.execute('''
                 CREATE INDEX IF NOT EXISTS idx_username_created 
                 ON tweet_records(username, created_at DESC)
@@ -44,7 +86,129 @@ async def init_db():
                 ON tweet_records(tweet_id)
             ''')
 
-            # 添加速率限制状态表
+            # 推文 ID 的整数形式用于按时间顺序分页（雪花 ID 随时间递增）
+            await db.execute('''
+                CREATE INDEX IF NOT EXISTS idx_tweet_num
+                ON tweet_records(CAST(tweet_id AS INTEGER))
+            ''')
+            await db.execute('''
+                CREATE INDEX IF NOT EXISTS idx_username_tweet_num
+                ON tweet_records(username, CAST(tweet_id AS INTEGER))
+            ''')
+
+            # 全文索引：trigram 分词支持中文子串匹配；不保存原文（content=''），rowid 为推文 ID。
+            # username 也建索引，关键词加作者的查询直接在索引内求交集
+            cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE name = 'tweet_fts'")
+            fts_exists = await cursor.fetchone() is not None
+            await db.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS tweet_fts
+                USING fts5(content, username, content='', tokenize='trigram')
+            ''')
+            await db.execute('''
+                CREATE TRIGGER IF NOT EXISTS tweet_fts_insert AFTER INSERT ON tweet_records BEGIN
+                    INSERT INTO tweet_fts(rowid, content, username)
+                    VALUES (CAST(new.tweet_id AS INTEGER), new.content, new.username);
+                END
+            ''')
+            await db.execute('''
+                CREATE TRIGGER IF NOT EXISTS tweet_fts_delete AFTER DELETE ON tweet_records BEGIN
+                    INSERT INTO tweet_fts(tweet_fts, rowid, content, username)
+                    VALUES ('delete', CAST(old.tweet_id AS INTEGER), old.content, old.username);
+                END
+            ''')
+            await db.execute('''
+                CREATE TRIGGER IF NOT EXISTS tweet_fts_update AFTER UPDATE OF content, username ON tweet_records BEGIN
+                    INSERT INTO tweet_fts(tweet_fts, rowid, content, username)
+                    VALUES ('delete', CAST(old.tweet_id AS INTEGER), old.content, old.username);
+                    INSERT INTO tweet_fts(rowid, content, username)
+                    VALUES (CAST(new.tweet_id AS INTEGER), new.content, new.username);
+                END
+            ''')
+            if not fts_exists:
+                await db.execute(
+                    """INSERT INTO tweet_fts(rowid, content, username)
+                       SELECT CAST(tweet_id AS INTEGER), content, username FROM tweet_records"""
+                )
+
+            # 用户名到用户ID的缓存表
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS twitter_users (
+                    username TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    resolved_at REAL NOT NULL
+                )
+            ''')
+
+            # 每个用户的轮询游标，启动时一次查询加载
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS poll_cursors (
+                    username TEXT PRIMARY KEY,
+                    since_id INTEGER,
+                    last_polled_at TEXT,
+                    last_new_at TEXT
+                )
+            ''')
+            # 旧版本从 tweet_records 推导游标，首次升级时按数值最大的 tweet_id 迁移一次
+            cursor = await db.execute("SELECT 1 FROM poll_cursors LIMIT 1")
+            if await cursor.fetchone() is None:
+                await db.execute('''
+                    INSERT INTO poll_cursors (username, since_id)
+                    SELECT username, MAX(CAST(tweet_id AS INTEGER)) FROM tweet_records GROUP BY username
+                ''')
+
+            # 轮询缺口：实时轮询一页没取完时记录 (since_id, until_id) 开区间，由补齐任务分页取回后删除。
+            # kind 为 timeline（target 为用户名）或 search（target 为合并查询）
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS poll_gaps (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    since_id INTEGER NOT NULL,
+                    until_id INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+
+            # 监控账号列表：来源为 env / file / api，运行时增删无需重启
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS watched_users (
+                    username TEXT PRIMARY KEY COLLATE NOCASE,
+                    source TEXT NOT NULL,
+                    added_at REAL NOT NULL
+                )
+            ''')
+
+            # 通知发件箱：与推文记录同一事务写入，由后台任务投递
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS notification_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tweet_id TEXT NOT NULL,
+                    target TEXT NOT NULL DEFAULT 'default',
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    locked_until REAL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    delivered_at REAL
+                )
+            ''')
+            # 每条推文对每个分组最多一条记录（旧版本只按 tweet_id 唯一）
+            await _add_missing_columns(db, 'notification_outbox', {
+                'target': "TEXT NOT NULL DEFAULT 'default'"
+            })
+            await db.execute("DROP INDEX IF EXISTS idx_outbox_tweet")
+            await db.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_tweet_target
+                ON notification_outbox(tweet_id, target)
+            ''')
+            await db.execute('''
+                CREATE INDEX IF NOT EXISTS idx_outbox_due
+                ON notification_outbox(status, next_attempt_at)
+            ''')
+
+            # 添加速率限制状态表（每个接口一行）
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS rate_limit_status (
                     id INTEGER PRIMARY KEY,
@@ -52,6 +216,76 @@ async def init_db():
                     updated_at TEXT DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
+            await _add_missing_columns(db, 'rate_limit_status', {
+                'endpoint': 'TEXT',
+                'limit_total': 'INTEGER',
+                'remaining': 'INTEGER',
+                'reset_at': 'REAL',
+                'token_id': "TEXT NOT NULL DEFAULT ''"
+            })
+            # 旧版本只保存一行全局状态（没有 endpoint）或不区分 token，窗口最长 15 分钟，直接丢弃
+            await db.execute("DELETE FROM rate_limit_status WHERE endpoint IS NULL OR token_id = ''")
+            # 每个 bearer token 的每个接口一行
+            await db.execute("DROP INDEX IF EXISTS idx_rate_limit_endpoint")
+            await db.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_rate_limit_token_endpoint
+                ON rate_limit_status(token_id, endpoint)
+            ''')
+
+            # 互动数据采样：待采样推文的调度表，以及只含整数列的时间序列
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS tracked_tweets (
+                    tweet_id INTEGER PRIMARY KEY,
+                    username TEXT NOT NULL,
+                    posted_at INTEGER NOT NULL,
+                    next_sample_at INTEGER NOT NULL,
+                    samples INTEGER NOT NULL DEFAULT 0,
+                    alerted INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            await db.execute('''
+                CREATE INDEX IF NOT EXISTS idx_tracked_due
+                ON tracked_tweets(next_sample_at)
+            ''')
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS tweet_metrics (
+                    tweet_id INTEGER NOT NULL,
+                    sampled_at INTEGER NOT NULL,
+                    likes INTEGER NOT NULL,
+                    retweets INTEGER NOT NULL,
+                    replies INTEGER NOT NULL,
+                    quotes INTEGER NOT NULL,
+                    PRIMARY KEY (tweet_id, sampled_at)
+                ) WITHOUT ROWID
+            ''')
+
+            # 多 worker 分片：每个分片一行租约，以及各 worker 的心跳
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS shard_leases (
+                    shard INTEGER PRIMARY KEY,
+                    owner TEXT,
+                    lease_until REAL
+                )
+            ''')
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS worker_heartbeats (
+                    worker_id TEXT PRIMARY KEY,
+                    heartbeat_at REAL NOT NULL,
+                    started_at REAL NOT NULL
+                )
+            ''')
+
+            # 多 worker 共用 webhook 的发送记录（滑动窗口限流），webhook 以地址的哈希标识
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS webhook_sends (
+                    webhook TEXT NOT NULL,
+                    sent_at REAL NOT NULL
+                )
+            ''')
+            await db.execute('''
+                CREATE INDEX IF NOT EXISTS idx_webhook_sends
+                ON webhook_sends(webhook, sent_at)
+            ''')
 
             await db.commit()
             logger.info("Database initialized successfully")
@@ -62,14 +296,30 @@ async def init_db():
 
 @asynccontextmanager
 async def get_db():
-    db_path = settings.DATABASE_URL.replace('sqlite:///', '')
-    db = None
-    try:
-        db = await aiosqlite.connect(db_path)
+    """
+    独占使用共享连接；退出时未提交的修改会被回滚，与关闭连接的语义一致
+
+    期间有写入时（transaction() 或直接 commit）把包括等待锁在内的占用时间计入 DB_TRANSACTION_SECONDS。
+    """
+    started = time.perf_counter()
+    async with _get_lock():
+        db = await _get_connection()
+        changes = db.total_changes
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"Database connection error: {str(e)}")
+            raise
+        finally:
+            if db.in_transaction:
+                await db.rollback()
+            if db.total_changes != changes:
+                DB_TRANSACTION_SECONDS.observe(time.perf_counter() - started)
+
+@asynccontextmanager
+async def transaction():
+    """在一个事务内执行多条写入，正常退出时提交，异常时回滚"""
+    async with get_db() as db:
+        await db.execute("BEGIN")
         yield db
-    except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
-        raise
-    finally:
-        if db:
-            await db.close()
\ No newline at end of file
+        await db.commit()
@@ -0,0 +1,93 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class Media:
+    __slots__ = ('type', 'url', 'preview_image_url', 'alt_text')
+
+    def __init__(self, media_type: Optional[str] = None, url: Optional[str] = None,
+                 preview_image_url: Optional[str] = None, alt_text: Optional[str] = None):
+        self.type = media_type
+        self.url = url
+        self.preview_image_url = preview_image_url
+        self.alt_text = alt_text
+
+    def to_dict(self) -> Dict[str, Optional[str]]:
+        return {
+            'type': self.type,
+            'url': self.url,
+            'preview_image_url': self.preview_image_url,
+            'alt_text': self.alt_text
+        }
+
+
+class Tweet:
+    """
+    在监控流水线各阶段之间传递的推文
+
+    字段固定并用 __slots__ 存储，互动数据展开为整数属性，发布时间只解析一次。
+    写入发件箱时通过 to_payload() 转换为 JSON 字典，格式与旧版本的推文字典相同，升级前未投递的记录仍可发送。
+    """
+
+    __slots__ = ('id', 'author', 'text', 'created_at', 'posted_at',
+                 'retweets', 'likes', 'replies', 'quotes', 'media')
+
+    def __init__(self, tweet_id: int, author: str, text: str, created_at: str, posted_at: float,
+                 retweets: int = 0, likes: int = 0, replies: int = 0, quotes: int = 0,
+                 media: Tuple[Media, ...] = ()):
+        self.id = tweet_id
+        self.author = author
+        self.text = text
+        self.created_at = created_at  # ISO 格式，与 tweet_records.created_at 一致
+        self.posted_at = posted_at  # Unix 时间戳
+        self.retweets = retweets
+        self.likes = likes
+        self.replies = replies
+        self.quotes = quotes
+        self.media = media
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any], author: str, media: Tuple[Media, ...] = ()) -> 'Tweet':
+        """由 API v2 的推文对象创建"""
+        created_at = datetime.fromisoformat(data['created_at'].replace('Z', '+00:00'))
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        public_metrics = data.get('public_metrics') or {}
+        return cls(
+            int(data['id']),
+            author,
+            data['text'],
+            created_at.isoformat(),
+            created_at.timestamp(),
+            retweets=public_metrics.get('retweet_count', 0),
+            likes=public_metrics.get('like_count', 0),
+            replies=public_metrics.get('reply_count', 0),
+            quotes=public_metrics.get('quote_count', 0),
+            media=media
+        )
+
+    @property
+    def url(self) -> str:
+        return f"https://twitter.com/{self.author}/status/{self.id}"
+
+    @property
+    def metrics(self) -> Dict[str, int]:
+        return {'retweets': self.retweets, 'likes': self.likes, 'replies': self.replies, 'quotes': self.quotes}
+
+    def media_urls(self) -> List[Optional[str]]:
+        return [media.url or media.preview_image_url for media in self.media]
+
+    def to_payload(self) -> Dict[str, Any]:
+        """发件箱中保存的通知内容"""
+        return {
+            'id': self.id,
+            'text': self.text,
+            'created_at': self.created_at,
+            'author': self.author,
+            'url': self.url,
+            'media': [media.to_dict() for media in self.media],
+            'metrics': self.metrics
+        }
+
+    def __repr__(self) -> str:
+        return f"Tweet({self.id}, @{self.author})"
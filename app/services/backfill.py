@@ -0,0 +1,189 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+from app.config import settings
+from app.models.database import get_db, transaction
+from app.models.tweet import Tweet
+from app.utils import clock
+from app.utils.metrics import POLL_GAPS_OPEN
+from app.services.sharding import LocalShardCoordinator
+from app.services.watch_list import watch_list
+from app.services.twitter_service import (
+    TwitterService, TooManyRequests, Forbidden, NotFound, TwitterAPIError,
+    ENDPOINT_USER_TWEETS, ENDPOINT_SEARCH_RECENT, search_members
+)
+
+logger = logging.getLogger(__name__)
+
+GAP_TIMELINE = 'timeline'
+GAP_SEARCH = 'search'
+
+IDLE_POLL_SECONDS = 60  # 没有缺口时的最长等待时间
+BUDGET_RETRY_SECONDS = 30  # 额度不足或请求失败后的等待时间
+TIMELINE_PAGE_SIZE = 100  # 补齐时每页取满，减少调用次数
+
+GAP_SQL = """INSERT INTO poll_gaps (kind, target, since_id, until_id, created_at) VALUES (?, ?, ?, ?, ?)"""
+
+# (gap_id, kind, 取回的推文) -> 是否处理成功
+ProcessCallback = Callable[[int, str, List[Tweet]], Awaitable[bool]]
+
+
+def gap_row(kind: str, target: str, since_id: str, tweets: List[Tweet]) -> Tuple:
+    """
+    实时轮询一页没取完时的缺口：since_id 与本页最旧一条之间的推文尚未取回
+
+    返回 poll_gaps 参数，与推进游标在同一事务内写入，停机重启后缺口不会丢失。
+    """
+    until_id = min(tweet.id for tweet in tweets)
+    return (kind, target, int(since_id), until_id, clock.now())
+
+
+class BackfillService:
+    """
+    按 pagination_token 分页补齐轮询缺口
+
+    实时轮询每次只取最新一页（时间线 5 条、搜索 100 条）。停机、限流或集中发推后新推文超过一页时，
+    实时轮询照常通知最新一页并推进游标，同时把游标与本页最旧推文之间的区间记为缺口。
+    补齐任务按记录顺序逐个缺口固定 since_id/until_id 翻页，取完整个区间后交给监控流水线从旧到新处理，
+    处理结果与删除缺口在同一事务内提交：中途失败或重启时缺口保留，下次重新补齐，
+    推文记录和发件箱的唯一约束保证每条推文只通知一次。
+    补齐是低优先级任务：只在保留 BACKFILL_API_RESERVE 比例的额度后才调用，不会挤占实时轮询。
+    """
+
+    def __init__(self, twitter_service: TwitterService, process: ProcessCallback,
+                 coordinator: Optional[LocalShardCoordinator] = None):
+        self.twitter_service = twitter_service
+        self.process = process
+        self.coordinator = coordinator or LocalShardCoordinator()
+        self.task: Optional[asyncio.Task] = None
+        self.open_gaps = 0
+        self._wakeup = asyncio.Event()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def wake(self):
+        """记录了新缺口时唤醒补齐任务"""
+        self._wakeup.set()
+
+    async def _run(self):
+        logger.info("🧩 缺口补齐任务已启动")
+        while True:
+            try:
+                gap = await self._next_gap()
+                if gap is None:
+                    self._wakeup.clear()
+                    try:
+                        await clock.wait_for(self._wakeup.wait(), IDLE_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                gap_id, kind, target, since_id, until_id = gap
+                tweets = await self._fetch_gap(gap_id, kind, target, str(since_id), str(until_id))
+                if tweets is None:
+                    await clock.sleep(BUDGET_RETRY_SECONDS)
+                    continue
+                logger.info(f"🧩 补齐缺口 {kind} {target}: {len(tweets)} 条推文")
+                if not await self.process(gap_id, kind, tweets):
+                    await clock.sleep(BUDGET_RETRY_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in backfill loop: {str(e)}")
+                await clock.sleep(5)
+
+    def _owns(self, kind: str, target: str) -> bool:
+        """多 worker 部署时只补齐本 worker 负责的账号；合并查询按第一个成员归属"""
+        members = [target] if kind == GAP_TIMELINE else search_members(target)[:1]
+        return bool(self.coordinator.owned_accounts(members))
+
+    async def _next_gap(self) -> Optional[Tuple[int, str, str, int, int]]:
+        """最早记录的、本 worker 负责的缺口；已移出监控列表的账号的缺口直接删除"""
+        async with get_db() as db:
+            cursor = await db.execute("SELECT id, kind, target, since_id, until_id FROM poll_gaps ORDER BY id")
+            rows = await cursor.fetchall()
+        self.open_gaps = len(rows)
+        POLL_GAPS_OPEN.set(len(rows))
+
+        watched = {username.lower() for username in watch_list.usernames}
+        stale = []
+        for row in rows:
+            kind, target = row[1], row[2]
+            members = [target] if kind == GAP_TIMELINE else search_members(target)
+            if not any(member.lower() in watched for member in members):
+                stale.append(row[0])
+            elif self._owns(kind, target):
+                if stale:
+                    await self._delete_gaps(stale)
+                return row
+        if stale:
+            await self._delete_gaps(stale)
+        return None
+
+    async def _delete_gaps(self, gap_ids: List[int]):
+        async with transaction() as db:
+            await db.executemany("DELETE FROM poll_gaps WHERE id = ?", [(gap_id,) for gap_id in gap_ids])
+        logger.info(f"Dropped {len(gap_ids)} gaps for accounts no longer monitored")
+
+    async def _fetch_gap(self, gap_id: int, kind: str, target: str,
+                         since_id: str, until_id: str) -> Optional[List[Tweet]]:
+        """
+        翻页取回整个缺口的推文；额度不足时等待后继续翻页，请求失败时返回 None 稍后重试整个缺口
+
+        账号不存在或无权访问、以及查询已不可用（如 since_id 超出 recent search 的 7 天范围）时
+        无法补齐，返回空列表使缺口被删除。
+        """
+        endpoint = ENDPOINT_USER_TWEETS if kind == GAP_TIMELINE else ENDPOINT_SEARCH_RECENT
+        rate_limiter = self.twitter_service.rate_limiter
+        tweets: List[Tweet] = []
+        next_token = None
+        pages = 0
+        while pages < settings.BACKFILL_MAX_PAGES:
+            token = rate_limiter.try_acquire(endpoint, reserve=settings.BACKFILL_API_RESERVE)
+            if token is None:
+                await clock.sleep(BUDGET_RETRY_SECONDS)
+                continue
+            try:
+                if kind == GAP_TIMELINE:
+                    page, next_token = await self.twitter_service.fetch_user_tweets_page(
+                        target, since_id, until_id, next_token, max_results=TIMELINE_PAGE_SIZE, token=token
+                    )
+                else:
+                    page, next_token = await self.twitter_service.fetch_search_page(
+                        target, since_id, until_id, next_token, token=token
+                    )
+            except TooManyRequests:
+                await clock.sleep(BUDGET_RETRY_SECONDS)
+                continue
+            except (Forbidden, NotFound) as e:
+                logger.warning(f"Giving up backfill gap {gap_id} ({kind} {target}): {str(e)}")
+                return []
+            except TwitterAPIError as e:
+                if 400 <= e.status < 500:
+                    logger.warning(f"Giving up backfill gap {gap_id} ({kind} {target}): {str(e)}")
+                    return []
+                logger.error(f"Error backfilling gap {gap_id}: {str(e)}")
+                return None
+            except Exception as e:
+                logger.error(f"Error backfilling gap {gap_id}: {str(e)}")
+                return None
+
+            tweets.extend(page)
+            pages += 1
+            if not next_token or not page:
+                return tweets
+
+        logger.warning(f"Backfill gap {gap_id} ({kind} {target}) exceeded {settings.BACKFILL_MAX_PAGES} pages, "
+                       f"older tweets are skipped")
+        return tweets
@@ -0,0 +1,162 @@
+import hashlib
+import re
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+from app.models.tweet import Tweet
+
+FINGERPRINT_BITS = 64
+
+_URL_RE = re.compile(r'https?://\S+')
+_MENTION_RE = re.compile(r'@\w+')
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _features(text: str, media_urls: List[str]) -> List[str]:
+    """
+    规范化文本后提取特征：单词及相邻词对，外加媒体地址
+
+    t.co 短链每次转发都不同，不参与计算；@提及和大小写差异也被忽略。
+    """
+    text = _MENTION_RE.sub(' ', _URL_RE.sub(' ', text.lower()))
+    tokens = _TOKEN_RE.findall(text)
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    features.extend(f"media:{url}" for url in media_urls if url)
+    return features
+
+
+def simhash(text: str, media_urls: Optional[List[str]] = None) -> Optional[int]:
+    """计算 64 位 SimHash 指纹；相似内容的指纹汉明距离小。没有可用特征（如只有链接）时返回 None"""
+    features = _features(text, media_urls or [])
+    if not features:
+        return None
+    weights = [0] * FINGERPRINT_BITS
+    for feature in features:
+        value = _feature_hash(feature)
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def tweet_fingerprint(tweet: Tweet) -> Optional[int]:
+    return simhash(tweet.text, tweet.media_urls())
+
+
+def to_signed(fingerprint: int) -> int:
+    """SQLite INTEGER 为有符号 64 位，入库前转换"""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def to_unsigned(value: int) -> int:
+    return value & ((1 << 64) - 1)
+
+
+class SimHashIndex:
+    """
+    有时间窗口和容量上限的近似重复索引
+
+    指纹按位切成 max_distance + 1 段，汉明距离不超过 max_distance 的两个指纹
+    至少有一段完全相同（抽屉原理），因此只需比较同段桶内的候选，每条推文近似 O(1)。
+    每条原文记录已收到该内容的分组，重复内容只发送给尚未收到的分组。
+    """
+
+    def __init__(self, window_seconds: float, max_distance: int = 3, max_entries: int = 10000):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._entries: deque = deque()  # (posted_at, tweet_id, fingerprint)，按加入顺序
+        self._delivered: Dict[str, Set[str]] = {}  # 原文 ID -> 已收到该内容的分组
+        self._build(max_distance)
+
+    def _build(self, max_distance: int):
+        """按汉明距离上限切分指纹并把已有条目放入新的桶"""
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width = FINGERPRINT_BITS // bands
+        self._bands: List[Tuple[int, int]] = [
+            (i * width, (FINGERPRINT_BITS - i * width) if i == bands - 1 else width) for i in range(bands)
+        ]
+        # 段值 -> {推文ID: (指纹, 发布时间)}
+        self._buckets: List[Dict[int, Dict[str, Tuple[int, float]]]] = [{} for _ in self._bands]
+        for posted_at, tweet_id, fingerprint in self._entries:
+            for band, key in self._keys(fingerprint):
+                self._buckets[band].setdefault(key, {})[tweet_id] = (fingerprint, posted_at)
+
+    def configure(self, max_distance: int):
+        """运行时修改汉明距离上限（配置热更新），分段方式随之改变，已有条目重新分桶"""
+        if max_distance != self.max_distance:
+            self._build(max_distance)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _keys(self, fingerprint: int):
+        for band, (shift, width) in enumerate(self._bands):
+            yield band, fingerprint >> shift & ((1 << width) - 1)
+
+    def _evict(self, now: float):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._entries[0][0] < now - self.window_seconds
+        ):
+            _, tweet_id, fingerprint = self._entries.popleft()
+            self._remove(tweet_id, fingerprint)
+
+    def _remove(self, tweet_id: str, fingerprint: int):
+        for band, key in self._keys(fingerprint):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.pop(tweet_id, None)
+                if not bucket:
+                    del self._buckets[band][key]
+        self._delivered.pop(tweet_id, None)
+
+    def find(self, fingerprint: int, posted_at: float, now: float) -> Optional[str]:
+        """
+        返回与该指纹近似重复、且发布时间与 posted_at 相差不超过时间窗口的推文 ID
+
+        now 之前超出窗口的条目被淘汰；补齐取回的旧推文与较新的条目比较发布时间，不会误判为重复。
+        """
+        self._evict(now)
+        for band, key in self._keys(fingerprint):
+            for tweet_id, (other, other_posted_at) in self._buckets[band].get(key, {}).items():
+                if (abs(posted_at - other_posted_at) <= self.window_seconds
+                        and bin(fingerprint ^ other).count('1') <= self.max_distance):
+                    return tweet_id
+        return None
+
+    def add(self, tweet_id: str, fingerprint: int, posted_at: float, groups: Optional[Set[str]] = None):
+        """加入一条原文，groups 为已收到该推文的分组"""
+        for band, key in self._keys(fingerprint):
+            self._buckets[band].setdefault(key, {})[tweet_id] = (fingerprint, posted_at)
+        self._entries.append((posted_at, tweet_id, fingerprint))
+        self._delivered[tweet_id] = set(groups or ())
+        self._evict(posted_at)
+
+    def discard(self, tweet_id: str):
+        """移除一条原文（所在批次写库失败时撤销 add）"""
+        for index, (_, entry_id, fingerprint) in enumerate(self._entries):
+            if entry_id == tweet_id:
+                del self._entries[index]
+                self._remove(tweet_id, fingerprint)
+                return
+
+    def unroute(self, original: str, groups: Set[str]):
+        """撤销 route 记下的分组（所在批次写库失败，这些分组并没有收到）"""
+        delivered = self._delivered.get(original)
+        if delivered is not None:
+            delivered -= groups
+
+    def route(self, original: str, groups: Set[str]) -> Set[str]:
+        """重复内容应发送的分组：groups 中尚未收到原文的部分，并记为已收到"""
+        delivered = self._delivered.get(original)
+        if delivered is None:
+            return set(groups)
+        pending = groups - delivered
+        delivered |= pending
+        return pending
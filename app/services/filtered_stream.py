@@ -0,0 +1,207 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from app.config import settings
+from app.models.tweet import Tweet
+from app.utils import clock
+from app.utils.metrics import STREAM_CONNECTED, STREAM_DISCONNECTS
+from app.services.sharding import LocalShardCoordinator
+from app.services.watch_list import watch_list
+from app.services.twitter_service import (
+    TwitterService, TooManyRequests, TwitterAPIError, build_search_query, build_search_shards, search_members
+)
+
+logger = logging.getLogger(__name__)
+
+RULE_TAG = 'twitter-monitor'  # 只管理带该标签的规则，同一应用下的其他规则不受影响
+IDLE_RETRY_SECONDS = 10  # 本 worker 没有账号时重新检查的间隔
+
+# 重连退避（Twitter 的建议）：网络错误从 0.25 秒线性增加，HTTP 错误从 5 秒、429 从 60 秒开始指数增加
+NETWORK_BACKOFF_STEP = 0.25
+NETWORK_BACKOFF_MAX = 16
+HTTP_BACKOFF_BASE = 5
+RATE_LIMIT_BACKOFF_BASE = 60
+
+# 推送的一组推文（可能来自多个账号）
+DeliverCallback = Callable[[List[Tweet]], Awaitable[None]]
+
+
+class FilteredStream:
+    """
+    filtered stream 推送模式：按监控列表维护 from: 规则，通过一条长连接接收新推文
+
+    连接正常时推送的推文直接进入监控流水线，轮询循环只需为每个账号做一次追赶轮询：
+    从 since_id 游标取回连接建立前（或规则生效前）发布的推文，之后该账号不再轮询。
+    连接断开或不可用（如套餐不支持）时 connected 为 False，轮询循环照常轮询全部账号，
+    同时按退避间隔重连；重新连接后所有账号重新追赶一次，断开期间的推文由游标（超过一页时由缺口补齐）取回。
+
+    caught_up 中的账号在本次连接内已完成追赶，此后推送的推文可以推进游标；
+    其余账号推送的推文只按推文记录去重，游标仍由轮询推进，追赶轮询不会因游标超前而漏掉更早的推文。
+    """
+
+    def __init__(self, twitter_service: TwitterService, deliver: DeliverCallback,
+                 coordinator: Optional[LocalShardCoordinator] = None):
+        self.twitter_service = twitter_service
+        self.deliver = deliver
+        self.coordinator = coordinator or LocalShardCoordinator()
+        self.task: Optional[asyncio.Task] = None
+        self.connected = False
+        self.session = 0  # 每次建立连接加一，用于判断追赶轮询是否在本次连接内开始
+        self.caught_up: Set[str] = set()  # 本次连接内已完成追赶的账号（小写）
+        self.covered: Set[str] = set()  # 已有规则覆盖的账号（小写）
+        self.rules: Optional[Dict[str, str]] = None  # 规则 value -> id，首次同步时从 API 加载
+        self.tweets = 0
+        self.reconnects = 0
+        self._failures = 0
+        self._synced_usernames: Optional[List[str]] = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self._disconnected()
+
+    def begin_poll(self, usernames: List[str]) -> Optional[Tuple[int, List[str]]]:
+        """轮询请求发出前调用：连接正常时返回 (连接序号, 其中已有规则覆盖的账号)，作为追赶轮询的凭据"""
+        if not self.connected:
+            return None
+        return self.session, [username for username in usernames if username.lower() in self.covered]
+
+    def finish_poll(self, ticket: Optional[Tuple[int, List[str]]]):
+        """
+        轮询结果放入流水线后调用：凭据所属的连接仍然有效时，这些账号完成追赶
+
+        轮询在连接建立、规则生效之后发出，之前的推文由轮询取回，之后的推文由推送送达，两者之间没有空档；
+        推送的推文在此之后才放入流水线，按游标处理时不会越过追赶轮询的结果。
+        """
+        if ticket is None or not self.connected or ticket[0] != self.session:
+            return
+        self.caught_up.update(username.lower() for username in ticket[1] if username.lower() in self.covered)
+
+    async def _run(self):
+        logger.info("📡 filtered stream 推送任务已启动")
+        while True:
+            try:
+                await self.sync_rules()
+                if not self.covered:
+                    await clock.sleep(IDLE_RETRY_SECONDS)
+                    continue
+                stream = self.twitter_service.stream_tweets(settings.STREAM_STALL_SECONDS)
+                try:
+                    async for tweets in stream:
+                        if not self.connected:
+                            self._connected()
+                        if tweets:
+                            self.tweets += len(tweets)
+                            await self.deliver(tweets)
+                        await self.sync_rules()
+                finally:
+                    # 中途退出（取消或处理出错）时立即关闭连接，不等生成器被回收
+                    await stream.aclose()
+                delay = self._backoff('closed')
+                logger.warning(f"Filtered stream closed by server, reconnecting in {delay:.2f}s")
+            except asyncio.CancelledError:
+                raise
+            except TooManyRequests as e:
+                delay = self._backoff('rate_limited')
+                logger.warning(f"Filtered stream rate limited ({str(e)}), reconnecting in {delay:.0f}s")
+            except TwitterAPIError as e:
+                delay = self._backoff('http_error')
+                logger.error(f"Filtered stream unavailable ({str(e)}), polling until reconnect in {delay:.0f}s")
+            except asyncio.TimeoutError:
+                delay = self._backoff('stalled')
+                logger.warning(f"Filtered stream stalled for {settings.STREAM_STALL_SECONDS}s, "
+                               f"reconnecting in {delay:.2f}s")
+            except Exception as e:
+                delay = self._backoff('network_error')
+                logger.error(f"Filtered stream error: {str(e)}, reconnecting in {delay:.2f}s")
+            self._disconnected()
+            await clock.sleep(delay)
+
+    def _connected(self):
+        self.connected = True
+        self.session += 1
+        self.caught_up.clear()
+        self._failures = 0
+        if self.session > 1:
+            self.reconnects += 1
+        STREAM_CONNECTED.set(1)
+        logger.info(f"📡 filtered stream 已连接，{len(self.covered)} 个账号由推送接收，轮询只追赶断开期间的推文")
+
+    def _disconnected(self):
+        if self.connected:
+            logger.warning("📡 filtered stream 已断开，回退到轮询")
+        self.connected = False
+        self.caught_up.clear()
+        STREAM_CONNECTED.set(0)
+
+    def _backoff(self, reason: str) -> float:
+        """记录一次失败并返回重连前的等待时间"""
+        STREAM_DISCONNECTS.labels(reason).inc()
+        # 连续失败次数在连接成功后清零，正常运行中的连接断开后立即重连
+        failures = self._failures
+        self._failures += 1
+        if reason == 'rate_limited':
+            delay = RATE_LIMIT_BACKOFF_BASE * 2 ** failures
+        elif reason == 'http_error':
+            delay = HTTP_BACKOFF_BASE * 2 ** failures
+        else:
+            delay = min(NETWORK_BACKOFF_STEP * failures, NETWORK_BACKOFF_MAX)
+        return min(delay, settings.STREAM_RECONNECT_MAX_SECONDS)
+
+    async def sync_rules(self):
+        """
+        使带 RULE_TAG 的规则与本 worker 负责的账号一致；账号没有变化时不调用 API
+
+        规则按 build_search_shards 切分（与 search 模式的合并查询相同），先添加新规则再删除旧规则，
+        账号在规则变化期间不会出现没有规则覆盖的空档。新加入的账号在规则生效后才开始追赶。
+        """
+        usernames = self.coordinator.owned_accounts(watch_list.usernames)
+        if usernames == self._synced_usernames:
+            return
+        if self.rules is None:
+            self.rules = {
+                rule['value']: rule['id']
+                for rule in await self.twitter_service.get_stream_rules()
+                if rule.get('tag') == RULE_TAG
+            }
+
+        wanted = [build_search_query(members)
+                  for members in build_search_shards(usernames, settings.STREAM_RULE_MAX_LENGTH)]
+        missing = [value for value in wanted if value not in self.rules]
+        stale = [value for value in self.rules if value not in wanted]
+        if missing:
+            created = await self.twitter_service.update_stream_rules(
+                add=[{'value': value, 'tag': RULE_TAG} for value in missing]
+            )
+            self.rules.update({rule['value']: rule['id'] for rule in created})
+        if stale:
+            await self.twitter_service.update_stream_rules(delete_ids=[self.rules[value] for value in stale])
+            for value in stale:
+                del self.rules[value]
+
+        self.covered = {member.lower() for value in self.rules for member in search_members(value)}
+        self.caught_up &= self.covered
+        self._synced_usernames = usernames
+        if missing or stale:
+            logger.info(f"Synced filtered stream rules: {len(self.rules)} rules covering {len(self.covered)} accounts "
+                        f"(+{len(missing)} / -{len(stale)})")
+
+    def status(self) -> Dict:
+        return {
+            'enabled': settings.STREAM_ENABLED,
+            'connected': self.connected,
+            'rules': len(self.rules or {}),
+            'covered_users': len(self.covered),
+            'caught_up_users': len(self.caught_up),
+            'reconnects': self.reconnects,
+            'tweets': self.tweets
+        }
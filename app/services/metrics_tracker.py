@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.models.database import get_db, transaction
+from app.models.tweet import Tweet
+from app.utils import clock
+from app.services.notification_outbox import NotificationOutbox, ENQUEUE_SQL, enqueue_rows
+from app.services.routing import RuleEngine
+from app.services.sharding import LocalShardCoordinator
+from app.services.watch_list import watch_list
+from app.services.twitter_service import (
+    TwitterService, ENDPOINT_USER_TWEETS, ENDPOINT_SEARCH_RECENT, TWEETS_LOOKUP_BATCH_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+IDLE_POLL_SECONDS = 60  # 没有到期推文时的最长等待时间
+BUDGET_RETRY_SECONDS = 30  # 额度不足或主轮询被限流时的等待时间
+
+# tracked_tweets.alerted 的位标记，每种阈值只提醒一次
+ALERT_LIKES = 1
+ALERT_RETWEETS = 2
+
+TRACK_SQL = """INSERT OR IGNORE INTO tracked_tweets (tweet_id, username, posted_at, next_sample_at)
+               VALUES (?, ?, ?, ?)"""
+SAMPLE_SQL = """INSERT OR REPLACE INTO tweet_metrics (tweet_id, sampled_at, likes, retweets, replies, quotes)
+                VALUES (?, ?, ?, ?, ?, ?)"""
+
+
+def _sample_row(tweet_id: int, sampled_at: int, metrics: Dict[str, int]) -> Tuple:
+    return (tweet_id, sampled_at, metrics.get('likes', 0), metrics.get('retweets', 0),
+            metrics.get('replies', 0), metrics.get('quotes', 0))
+
+
+def track_rows(tweets: List[Tweet]) -> Tuple[List[Tuple], List[Tuple]]:
+    """新推文开始跟踪：返回 (tracked_tweets 参数, 检测时的首个采样参数)，与推文记录在同一事务内写入"""
+    now = int(clock.now())
+    tracked = [
+        (tweet.id, tweet.author, int(tweet.posted_at), now + settings.METRICS_SAMPLE_BASE_SECONDS)
+        for tweet in tweets
+    ]
+    samples = [_sample_row(tweet.id, now, tweet.metrics) for tweet in tweets]
+    return tracked, samples
+
+
+async def prune_samples(before_id: int, batch_size: int) -> int:
+    """
+    删除 before_id 之前发布的推文的互动采样和跟踪记录，分批提交，返回删除的采样行数
+
+    由归档任务按推文的保留期调用：采样随推文记录一起过期，跟踪早已结束的推文不再占用数据库。
+    """
+    pruned = 0
+    async with transaction() as db:
+        await db.execute("DELETE FROM tracked_tweets WHERE tweet_id < ?", (before_id,))
+    while True:
+        async with transaction() as db:
+            cursor = await db.execute(
+                """DELETE FROM tweet_metrics WHERE tweet_id IN (
+                       SELECT DISTINCT tweet_id FROM tweet_metrics WHERE tweet_id < ? LIMIT ?
+                   )""",
+                (before_id, batch_size)
+            )
+            deleted = cursor.rowcount
+        pruned += deleted
+        if not deleted:
+            return pruned
+
+
+class MetricsTracker:
+    """
+    按衰减间隔重新采样近期推文的互动数据
+
+    第 n 次采样后间隔 METRICS_SAMPLE_BASE_SECONDS * 2^n 秒再采样，超过 METRICS_TRACKING_HOURS 后停止；
+    每次调用 /2/tweets 批量查询最多 100 条。采样是低优先级任务：只在保留 METRICS_API_RESERVE
+    比例的额度后才调用，主轮询接口被限流时暂停，不会挤占推文检测的调用额度。
+    多 worker 部署时每个 worker 只采样自己负责的账号的推文，使用各自的额度。
+    """
+
+    def __init__(self, twitter_service: TwitterService, rule_engine: RuleEngine, outbox: NotificationOutbox,
+                 coordinator: Optional[LocalShardCoordinator] = None):
+        self.twitter_service = twitter_service
+        self.coordinator = coordinator or LocalShardCoordinator()
+        self.rule_engine = rule_engine
+        self.outbox = outbox
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def _polling_blocked(self) -> bool:
+        rate_limiter = self.twitter_service.rate_limiter
+        return rate_limiter.is_rate_limited(ENDPOINT_USER_TWEETS) or rate_limiter.is_rate_limited(ENDPOINT_SEARCH_RECENT)
+
+    async def _run(self):
+        logger.info("📈 互动数据采样任务已启动")
+        while True:
+            try:
+                if self._polling_blocked():
+                    await clock.sleep(BUDGET_RETRY_SECONDS)
+                    continue
+
+                now = int(clock.now())
+                rows, next_due = await self._claim_due(now)
+                if not rows:
+                    wait = IDLE_POLL_SECONDS if next_due is None else min(IDLE_POLL_SECONDS, max(1, next_due - now))
+                    await clock.sleep(wait)
+                    continue
+
+                metrics = await self.twitter_service.lookup_tweet_metrics(
+                    [row[0] for row in rows], reserve=settings.METRICS_API_RESERVE
+                )
+                if metrics is None:
+                    await clock.sleep(BUDGET_RETRY_SECONDS)
+                    continue
+                await self._record_samples(rows, metrics, int(clock.now()))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in metrics tracker loop: {str(e)}")
+                await clock.sleep(5)
+
+    async def _claim_due(self, now: int) -> Tuple[list, Optional[int]]:
+        """返回到期的推文（最多一批）以及下一次到期时间；多 worker 部署时只取本 worker 负责的账号"""
+        owned_filter, params = "", ()
+        if self.coordinator.is_distributed:
+            owned_filter = " AND username IN (SELECT value FROM json_each(?))"
+            params = (json.dumps(self.coordinator.owned_accounts(watch_list.usernames)),)
+        async with get_db() as db:
+            cursor = await db.execute(
+                f"""SELECT tweet_id, username, posted_at, samples, alerted FROM tracked_tweets
+                    WHERE next_sample_at <= ?{owned_filter} ORDER BY next_sample_at LIMIT ?""",
+                (now, *params, TWEETS_LOOKUP_BATCH_SIZE)
+            )
+            rows = await cursor.fetchall()
+            cursor = await db.execute(f"SELECT MIN(next_sample_at) FROM tracked_tweets WHERE 1{owned_filter}", params)
+            next_due = (await cursor.fetchone())[0]
+        return rows, next_due
+
+    def _crossed(self, metrics: Dict[str, int], alerted: int) -> List[Tuple[int, str, int]]:
+        """本次采样新越过的阈值：(位标记, 指标名, 阈值)"""
+        crossed = []
+        thresholds = [
+            (ALERT_LIKES, 'likes', settings.METRICS_ALERT_LIKES),
+            (ALERT_RETWEETS, 'retweets', settings.METRICS_ALERT_RETWEETS)
+        ]
+        for flag, name, threshold in thresholds:
+            if threshold > 0 and not alerted & flag and metrics.get(name, 0) >= threshold:
+                crossed.append((flag, name, threshold))
+        return crossed
+
+    async def _record_samples(self, rows: list, metrics: Dict[int, Dict[str, int]], now: int):
+        """在一个事务内写入采样、推进调度，并为越过阈值的推文写入提醒"""
+        horizon = settings.METRICS_TRACKING_HOURS * 3600
+        samples, updates, finished, alerts = [], [], [], []
+        for tweet_id, username, posted_at, sample_count, alerted in rows:
+            tweet_metrics = metrics.get(tweet_id)
+            if tweet_metrics is None:
+                finished.append((tweet_id,))  # 已删除或不可见
+                continue
+
+            samples.append(_sample_row(tweet_id, now, tweet_metrics))
+            crossed = self._crossed(tweet_metrics, alerted)
+            for flag, name, threshold in crossed:
+                alerted |= flag
+                alerts.append((tweet_id, username, name, threshold, tweet_metrics))
+
+            next_sample_at = now + settings.METRICS_SAMPLE_BASE_SECONDS * 2 ** (sample_count + 1)
+            if next_sample_at > posted_at + horizon:
+                finished.append((tweet_id,))
+            else:
+                updates.append((next_sample_at, sample_count + 1, alerted, tweet_id))
+
+        async with transaction() as db:
+            await db.executemany(SAMPLE_SQL, samples)
+            await db.executemany(
+                "UPDATE tracked_tweets SET next_sample_at = ?, samples = ?, alerted = ? WHERE tweet_id = ?",
+                updates
+            )
+            await db.executemany("DELETE FROM tracked_tweets WHERE tweet_id = ?", finished)
+            enqueued = 0
+            if alerts:
+                cursor = await db.executemany(ENQUEUE_SQL, enqueue_rows(await self._build_alerts(db, alerts)))
+                enqueued = cursor.rowcount
+
+        logger.info(f"📈 采样 {len(samples)} 条推文的互动数据，{len(finished)} 条结束跟踪")
+        if enqueued:
+            self.outbox.enqueued(enqueued)
+
+    async def _build_alerts(self, db, alerts: list) -> List[Tuple[dict, str]]:
+        """生成提醒消息并按订阅规则路由，返回 (消息, 分组) 列表"""
+        tweet_ids = sorted({str(alert[0]) for alert in alerts})
+        cursor = await db.execute(
+            f"SELECT tweet_id, content, tweet_url FROM tweet_records WHERE tweet_id IN ({','.join('?' * len(tweet_ids))})",
+            tweet_ids
+        )
+        records = {row[0]: (row[1], row[2]) for row in await cursor.fetchall()}
+
+        labels = {'likes': '点赞', 'retweets': '转推'}
+        routed = []
+        for tweet_id, username, name, threshold, tweet_metrics in alerts:
+            text, url = records.get(str(tweet_id), ('', f"https://twitter.com/{username}/status/{tweet_id}"))
+            alert = {
+                'id': f"{tweet_id}:{name}",  # 发件箱按 (id, 分组) 去重，与原推文通知区分
+                'author': username,
+                'text': text,
+                'url': url,
+                'metrics': tweet_metrics,
+                'alert': f"🔥 @{username} 的推文{labels[name]}数突破 {threshold}"
+            }
+            logger.info(f"🔥 推文 {tweet_id} 的{labels[name]}数达到 {tweet_metrics[name]}")
+            routed.extend((alert, group) for group in self.rule_engine.match(username, text))
+        return routed
@@ -1,22 +1,98 @@
 import asyncio
+import json
 import logging
-from typing import Dict, Optional, Set
-from datetime import datetime
-from app.services.twitter_service import TwitterService
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from datetime import datetime, timedelta, timezone
+from app.services.twitter_service import TwitterService, build_search_query, build_search_shards
 from app.services.wechat_service import WeChatService
-from app.models.database import TweetRecord, init_db, get_db
+from app.services.poll_scheduler import AdaptivePollScheduler
+from app.services.notification_outbox import NotificationOutbox, ENQUEUE_SQL, enqueue_rows
+from app.services.routing import DEFAULT_GROUP, load_routing_config, build_rule_engine
+from app.services.dedup import SimHashIndex, tweet_fingerprint, to_signed, to_unsigned
+from app.services.metrics_tracker import MetricsTracker, TRACK_SQL, SAMPLE_SQL, track_rows
+from app.services.sharding import LocalShardCoordinator, build_shard_coordinator
+from app.services.watch_list import watch_list
+from app.services.tweet_history import snowflake_from_datetime
+from app.services.backfill import BackfillService, GAP_SQL, GAP_TIMELINE, GAP_SEARCH, gap_row
+from app.services.pipeline import TweetPipeline, PollBatch
+from app.services.filtered_stream import FilteredStream
+from app.services.retention import RetentionService
+from app.utils.metrics import POLL_CYCLE_SECONDS, DETECTION_LAG_SECONDS, TWEETS_DETECTED, TWEETS_BACKFILLED
+from app.utils import clock
+from app.models.database import init_db, get_db, transaction
+from app.models.tweet import Tweet
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+RECENT_IDS_MAX = 10000  # 内存中保留的最近处理过的推文ID数量，用于推送与轮询结果之间的去重
+
+def _parse_timestamp(value: str) -> float:
+    """ISO 格式时间字符串转换为 Unix 时间戳"""
+    created_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.timestamp()
+
 class MonitorService:
-    def __init__(self, twitter_service: TwitterService, wechat_service: WeChatService):
+    def __init__(self, twitter_service: TwitterService, wechat_service: WeChatService,
+                 coordinator: Optional[LocalShardCoordinator] = None):
         self.twitter_service = twitter_service
         self.wechat_service = wechat_service
         self.is_monitoring = False
         self.monitor_task: Optional[asyncio.Task] = None
+        # 分组订阅规则：每条推文只匹配一次，然后扇出到各分组的 webhook
+        routing_config = load_routing_config()
+        self.rule_engine = build_rule_engine(routing_config)
+        services = {}
+        for group in routing_config['groups']:
+            if group['name'] == DEFAULT_GROUP and group['webhook_url'] == wechat_service.webhook_url:
+                services[group['name']] = wechat_service
+            else:
+                services[group['name']] = WeChatService(group['webhook_url'])
+        self.outbox = NotificationOutbox(services)
+        # 多 worker 部署时每个 worker 只负责租约内分片的账号
+        self.coordinator = coordinator or build_shard_coordinator()
+        self.owned_usernames: Set[str] = set()
+        self.metrics_tracker = MetricsTracker(twitter_service, self.rule_engine, self.outbox, self.coordinator)
+        # 一页取不完的新推文记为缺口，由低优先级任务分页补齐
+        self.backfill = BackfillService(twitter_service, self._process_backfill, self.coordinator)
+        # filtered stream 推送：连接正常时轮询只追赶断开期间的推文，断开时回退到轮询
+        self.stream = FilteredStream(twitter_service, self._process_stream, self.coordinator)
+        # 超过保留期的推文记录移入压缩归档，保持数据库和索引的大小
+        self.retention = RetentionService(self.coordinator)
+        # 抓取（轮询循环、推送和补齐任务）之后的各阶段由有界队列串联，某个阶段变慢时只会逐级减缓抓取；
+        # 通知阶段是发件箱的投递任务
+        self.pipeline = TweetPipeline([
+            ('normalize', self._normalize_batch),
+            ('filter', self._filter_batch),
+            ('persist', self._persist_batch),
+        ], capacity=settings.PIPELINE_QUEUE_SIZE)
         self.last_tweet_ids: Dict[str, str] = {}
+        self.recent_ids: Dict[int, None] = {}  # 过滤阶段最近保留的推文ID（按插入顺序淘汰）
         self.current_user_index = 0  # 轮换用户索引，避免同时处理多个用户
+        self.search_since_ids: Dict[str, str] = {}  # search 模式下每条合并查询的 since_id
+        # adaptive 策略：按账号活跃度分配轮询频率
+        self.poll_scheduler = self._new_poll_scheduler()
+        # 近似重复索引：多个账号转发的同一内容只通知一次
+        self.dedup_index = self._new_dedup_index()
+
+    def _new_poll_scheduler(self) -> AdaptivePollScheduler:
+        return AdaptivePollScheduler(
+            poll_interval=settings.CHECK_INTERVAL_SECONDS,
+            min_interval=settings.ADAPTIVE_MIN_INTERVAL_SECONDS,
+            max_interval=settings.ADAPTIVE_MAX_INTERVAL_SECONDS,
+            half_life=settings.ACTIVITY_HALF_LIFE_HOURS * 3600,
+            prior_rate=1 / (7 * 24 * 3600)  # 无历史时假定每周一条
+        )
+
+    def _new_dedup_index(self) -> SimHashIndex:
+        return SimHashIndex(
+            window_seconds=settings.DEDUP_WINDOW_SECONDS,
+            max_distance=settings.DEDUP_MAX_DISTANCE,
+            max_entries=settings.DEDUP_MAX_ENTRIES
+        )
         
     async def start_monitoring(self):
         if self.is_monitoring:
@@ -24,11 +100,36 @@ class MonitorService:
             return
 
         await init_db()
+        # 上次停止时丢弃的批次已推进了内存中的游标和去重状态，重新开始时全部从数据库恢复；
+        # 活跃度同样重建，否则回看窗口内的推文会被重复计入
+        self.last_tweet_ids.clear()
+        self.search_since_ids.clear()
+        self.recent_ids.clear()
+        self.poll_scheduler = self._new_poll_scheduler()
+        self.dedup_index = self._new_dedup_index()
         await self._load_last_tweet_ids()
+        await self._load_activity()
+        await self._load_dedup_index()
+        await self.twitter_service.load_user_id_cache()
+        await watch_list.load()
+        await self.twitter_service.resolve_user_ids(watch_list.usernames)
+        await self.coordinator.start()
+        self.owned_usernames = set(self.coordinator.owned_accounts(watch_list.usernames))
 
         self.is_monitoring = True
+        watch_list.start()
+        self.pipeline.start()
+        self.outbox.start()
+        if settings.METRICS_TRACKING_ENABLED:
+            self.metrics_tracker.start()
+        if settings.BACKFILL_ENABLED:
+            self.backfill.start()
+        if settings.STREAM_ENABLED:
+            self.stream.start()
+        if settings.RETENTION_DAYS > 0:
+            self.retention.start()
         self.monitor_task = asyncio.create_task(self._monitoring_loop())
-        usernames = ', '.join([f'@{u}' for u in settings.twitter_usernames_list])
+        usernames = ', '.join([f'@{u}' for u in watch_list.usernames if u in self.owned_usernames])
         logger.info(f"🚀 开始监控 Twitter 用户: {usernames}")
         
     async def stop_monitoring(self):
@@ -43,13 +144,23 @@ class MonitorService:
                 await self.monitor_task
             except asyncio.CancelledError:
                 pass
+        await self.stream.stop()
+        await self.retention.stop()
+        await self.backfill.stop()
+        await self.pipeline.stop()
+        await self.outbox.stop()
+        await self.metrics_tracker.stop()
+        await watch_list.stop()
+        await self.coordinator.stop()
         logger.info("⏹️ 已停止 Twitter 监控")
     
     async def _monitoring_loop(self):
         try:
             while self.is_monitoring:
+                started = time.perf_counter()
                 await self._check_tweets()
-                await asyncio.sleep(settings.CHECK_INTERVAL_SECONDS)
+                POLL_CYCLE_SECONDS.labels(settings.POLLING_MODE).observe(time.perf_counter() - started)
+                await clock.sleep(settings.CHECK_INTERVAL_SECONDS)
         except asyncio.CancelledError:
             logger.info("Monitoring loop cancelled")
         except Exception as e:
@@ -57,123 +168,470 @@ class MonitorService:
             self.is_monitoring = False
     
     async def _check_tweets(self):
-        usernames = settings.twitter_usernames_list
-        if not usernames:
+        if not watch_list.usernames:
             logger.warning("No Twitter usernames configured for monitoring")
             return
-            
-        try:
-            # 极度保守策略：每次只处理一个用户，避免任何API调用集中
-            # 轮换用户 - 每次只处理一个
-            current_username = usernames[self.current_user_index]
-            self.current_user_index = (self.current_user_index + 1) % len(usernames)
+        usernames = await self._owned_usernames()
+        if not usernames:
+            return  # 多 worker 部署时本 worker 暂未分到账号
 
-            logger.info(f"🔄 轮换监控用户: @{current_username} ({self.current_user_index}/{len(usernames)})")
-            logger.info(f"⚠️  Free Tier限制: 每个用户15分钟内只能调用1次API")
+        # filtered stream 连接正常时只轮询尚未追赶的账号（以及没有规则覆盖的账号）
+        catching_up = self.stream.connected
+        if catching_up:
+            usernames = [username for username in usernames if username.lower() not in self.stream.caught_up]
+            if not usernames:
+                return
 
-            since_id = self.last_tweet_ids.get(current_username)
-            user_tweets = await self.twitter_service.get_user_tweets(current_username, since_id)
+        if settings.POLLING_MODE == "search":
+            await self._check_tweets_search(usernames)
+            return
 
-            all_tweets = {current_username: user_tweets}
-            logger.info(f"📊 本轮处理完成用户 @{current_username}，下次轮换到该用户需等待15分钟")
-            
-            for username, tweets in all_tweets.items():
-                if tweets:
-                    new_tweets = await self._filter_new_tweets(username, tweets)
-                    
-                    for tweet in new_tweets:
-                        await self._process_new_tweet(tweet)
-                        
-                    if new_tweets:
-                        self.last_tweet_ids[username] = tweets[0]['id']
-                        await self._save_last_tweet_id(username, tweets[0]['id'])
+        try:
+            # 每次只处理一个用户，避免任何API调用集中
+            if settings.POLLING_STRATEGY == "adaptive" and not catching_up:
+                now = clock.now()
+                self.poll_scheduler.configure(settings.CHECK_INTERVAL_SECONDS, settings.ADAPTIVE_MIN_INTERVAL_SECONDS,
+                                              settings.ADAPTIVE_MAX_INTERVAL_SECONDS, now)
+                self.poll_scheduler.sync(usernames, now)
+                current_username = self.poll_scheduler.next_account(now)
+                if not current_username:
+                    return
+                interval = self.poll_scheduler.interval(current_username, now)
+                logger.info(f"🔄 自适应轮询用户: @{current_username} (目标间隔 {int(interval)}s)")
+            else:
+                # 轮换用户 - 每次只处理一个
+                current_username = usernames[self.current_user_index % len(usernames)]
+                self.current_user_index = (self.current_user_index + 1) % len(usernames)
+                logger.info(f"🔄 轮换监控用户: @{current_username} ({self.current_user_index}/{len(usernames)})")
+
+            since_id = self._since_id(current_username)
+            ticket = self.stream.begin_poll([current_username])
+            user_tweets, has_more = await self.twitter_service.poll_user_tweets(current_username, since_id)
+            logger.info(f"📊 本轮处理完成用户 @{current_username}")
+
+            gaps = []
+            # 时间线排除了转推和回复，过滤后的一页可能为空但仍带 next_token，此时没有边界可以记录缺口
+            if user_tweets and has_more and since_id and settings.BACKFILL_ENABLED:
+                gaps.append(gap_row(GAP_TIMELINE, current_username, since_id, user_tweets))
+                logger.info(f"🧩 @{current_username} 的新推文超过一页，更早的推文将分页补齐")
+            await self.pipeline.submit(PollBatch(user_tweets, [current_username], gaps))
+            if has_more is not None:
+                self.stream.finish_poll(ticket)
                         
         except Exception as e:
             logger.error(f"Error checking tweets: {str(e)}")
+
+    async def _check_tweets_search(self, usernames: list):
+        """search 模式：每轮用少量合并查询覆盖全部用户，检测延迟不随用户数线性增长；每条查询的结果作为一个批次"""
+        try:
+            shards = build_search_shards(usernames, settings.SEARCH_QUERY_MAX_LENGTH)
+            logger.info(f"🔎 合并查询轮询 {len(usernames)} 个用户，共 {len(shards)} 条查询")
+
+            queries = []
+            for members in shards:
+                query = build_search_query(members)
+                queries.append(query)
+                since_id = self.search_since_ids.get(query) or self._shard_since_id(members)
+                ticket = self.stream.begin_poll(members)
+                tweets, has_more = await self.twitter_service.poll_search(query, since_id)
+
+                gaps = []
+                search_cursor = None
+                if tweets:
+                    search_cursor = (query, self.search_since_ids.get(query))
+                    self.search_since_ids[query] = str(max(tweet.id for tweet in tweets))
+                    if has_more and since_id and settings.BACKFILL_ENABLED:
+                        gaps.append(gap_row(GAP_SEARCH, query, since_id, tweets))
+                        logger.info(f"🧩 合并查询的新推文超过一页，更早的推文将分页补齐 ({len(members)} 个用户)")
+                await self.pipeline.submit(PollBatch(tweets, members, gaps, search_cursor=search_cursor))
+                if has_more is not None:
+                    self.stream.finish_poll(ticket)
+
+            # 清理已不在用户列表中的旧查询
+            self.search_since_ids = {q: v for q, v in self.search_since_ids.items() if q in queries}
+
+        except Exception as e:
+            logger.error(f"Error checking tweets via search: {str(e)}")
+
+    async def _owned_usernames(self) -> List[str]:
+        """
+        本 worker 当前负责的账号（监控列表在运行时修改后下一轮即生效）
+
+        新加入的账号（新添加或从其他 worker 接管）先从数据库加载轮询游标，并只为其中缺少用户ID的账号批量解析一次。
+        """
+        usernames = self.coordinator.owned_accounts(watch_list.usernames)
+        acquired = [username for username in usernames if username not in self.owned_usernames]
+        if acquired:
+            await self._load_last_tweet_ids(acquired)
+            if settings.POLLING_MODE != "search":
+                await self.twitter_service.resolve_user_ids(acquired)
+            logger.info(f"Started polling {len(acquired)} new accounts")
+        self.owned_usernames = set(usernames)
+        return usernames
+
+    def _since_id(self, username: str) -> Optional[str]:
+        """
+        轮询的起点：上次处理到的推文；还没有游标的账号从加入监控列表的时刻开始
+
+        加入后到首次轮询之间发布的推文因此不会只保留最新一条，超过一页时同样记为缺口补齐。
+        """
+        last_id = self.last_tweet_ids.get(username)
+        if last_id:
+            return last_id
+        added_at = watch_list.added_at.get(username)
+        if added_at is None:
+            return None
+        return str(snowflake_from_datetime(datetime.fromtimestamp(added_at, tz=timezone.utc)) - 1)
+
+    def _shard_since_id(self, members: list) -> Optional[str]:
+        """新查询的 since_id 取成员中最小的轮询起点，任一成员无起点则不设置"""
+        last_ids = [self._since_id(username) for username in members]
+        if not all(last_ids):
+            return None
+        return str(min(int(last_id) for last_id in last_ids))
+
+    async def _handle_user_tweets(self, username: str, tweets: List[Tweet]) -> List[Tweet]:
+        """筛选出新推文并推进该用户的 last_tweet_id，返回新推文列表"""
+        if not tweets:
+            return []
+
+        new_tweets = await self._filter_new_tweets(username, tweets)
+        if new_tweets:
+            self.last_tweet_ids[username] = str(tweets[0].id)
+        return new_tweets
     
-    async def _filter_new_tweets(self, username: str, tweets: list) -> list:
+    async def _filter_new_tweets(self, username: str, tweets: List[Tweet]) -> List[Tweet]:
         if not tweets:
             return []
             
-        last_id = self.last_tweet_ids.get(username)
+        last_id = self._since_id(username)
         if not last_id:
             return [tweets[0]]  # Only return the latest tweet if no history
             
         new_tweets = []
         for tweet in tweets:
-            if int(tweet['id']) > int(last_id):
+            if tweet.id > int(last_id):
                 new_tweets.append(tweet)
             else:
                 break
                 
         return new_tweets
-    
-    async def _process_new_tweet(self, tweet_data: dict):
+
+    async def _process_backfill(self, gap_id: int, kind: str, tweets: List[Tweet]) -> bool:
+        """补齐任务取回的一个缺口：与实时轮询走同一条流水线，等待写库完成后返回是否成功"""
+        return await self.pipeline.submit(
+            PollBatch(tweets, [], closed_gap=gap_id, backfill_kind=kind, advance_cursor=False), wait=True
+        )
+
+    async def _process_stream(self, tweets: List[Tweet]):
+        """
+        filtered stream 推送的推文：已完成追赶的账号按游标处理并推进游标，其余账号按推文记录去重
+
+        其他 worker 负责的账号（规则变更尚未生效时）直接丢弃。
+        """
+        owned = {username.lower(): username for username in self.owned_usernames}
+        ordered, unordered = [], []
+        for tweet in tweets:
+            username = owned.get(tweet.author.lower())
+            if username is None:
+                continue
+            (ordered if username.lower() in self.stream.caught_up else unordered).append(tweet)
+        if ordered:
+            authors = sorted({owned[tweet.author.lower()] for tweet in ordered})
+            await self.pipeline.submit(PollBatch(ordered, authors))
+        if unordered:
+            await self.pipeline.submit(PollBatch(unordered, [], advance_cursor=False))
+
+    async def _normalize_batch(self, batch: PollBatch) -> PollBatch:
+        """规范化阶段：作者统一为监控列表中的写法（合并查询按 author_id 返回），丢弃不在列表中的作者，按从新到旧排列"""
+        by_name = {username.lower(): username for username in watch_list.usernames}
+        tweets = []
+        for tweet in batch.tweets:
+            username = by_name.get(tweet.author.lower())
+            if username:
+                tweet.author = username
+                tweets.append(tweet)
+        tweets.sort(key=lambda t: t.id, reverse=True)
+        batch.tweets = tweets
+        return batch
+
+    async def _filter_batch(self, batch: PollBatch) -> PollBatch:
+        """
+        过滤阶段：按游标保留新推文（不推进游标的批次剔除已记录的推文），查找近似重复并匹配订阅规则
+
+        本阶段推进内存中的游标（后续批次据此过滤），并把本批次对应的游标值随批次交给写库阶段，
+        写库的游标不会超前于已写入的推文；推进前的游标记在批次中，写库失败时恢复。
+        推送和轮询可能先后取到同一条推文，最近保留过的推文ID在内存中记录，尚未写库时也不会重复处理。
+        保留的推文按从旧到新排列，发件箱按写入顺序投递。
+        """
+        if batch.advance_cursor:
+            by_user: Dict[str, List[Tweet]] = {}
+            for tweet in batch.tweets:
+                by_user.setdefault(tweet.author, []).append(tweet)
+            batch.previous_cursors = {
+                username: self.last_tweet_ids.get(username) for username in set(batch.polled_usernames) | set(by_user)
+            }
+            new_tweets = []
+            for username, user_tweets in by_user.items():
+                new_tweets.extend(await self._handle_user_tweets(username, user_tweets))
+            batch.cursors = {username: self.last_tweet_ids.get(username) for username in batch.polled_usernames}
+        else:
+            new_tweets = await self._exclude_recorded(
+                [tweet for tweet in batch.tweets if tweet.id not in self.recent_ids]
+            )
+            if batch.backfill_kind:
+                TWEETS_BACKFILLED.labels(batch.backfill_kind).inc(len(new_tweets))
+
+        new_tweets = [tweet for tweet in new_tweets if tweet.id not in self.recent_ids]
+        for tweet in new_tweets:
+            self.recent_ids[tweet.id] = None
+        while len(self.recent_ids) > RECENT_IDS_MAX:
+            del self.recent_ids[next(iter(self.recent_ids))]
+        new_tweets.sort(key=lambda t: t.id)
+        batch.tweets = new_tweets
+        routes = {str(tweet.id): self.rule_engine.match(tweet.author, tweet.text) for tweet in new_tweets}
+        batch.fingerprints, batch.duplicates = self._find_near_duplicates(new_tweets, routes)
+        now = clock.now()
+        for tweet in new_tweets:
+            DETECTION_LAG_SECONDS.labels(tweet.author).observe(max(0.0, now - tweet.posted_at))
+            TWEETS_DETECTED.labels(tweet.author).inc()
+            tweet_text = tweet.text[:50] + '...' if len(tweet.text) > 50 else tweet.text
+            groups = routes[str(tweet.id)]
+            original = batch.duplicates.get(str(tweet.id))
+            if original and not groups:
+                logger.info(f"🔁 跳过重复内容: @{tweet.author} - {tweet_text} (与 {original} 相同)")
+            elif original:
+                logger.info(f"🔁 重复内容只发送给未收到 {original} 的分组 {', '.join(sorted(groups))}: "
+                            f"@{tweet.author} - {tweet_text}")
+            else:
+                logger.info(f"🐦 检测到新推文: @{tweet.author} - {tweet_text}")
+            batch.routed.extend((tweet, group) for group in groups)
+        return batch
+
+    async def _exclude_recorded(self, tweets: List[Tweet]) -> List[Tweet]:
+        """剔除已写入 tweet_records 的推文（如补齐中途重启后重新取回的部分）"""
+        if not tweets:
+            return []
+        async with get_db() as db:
+            cursor = await db.execute(
+                "SELECT tweet_id FROM tweet_records WHERE tweet_id IN (SELECT value FROM json_each(?))",
+                (json.dumps([str(tweet.id) for tweet in tweets]),)
+            )
+            recorded = {row[0] for row in await cursor.fetchall()}
+        return [tweet for tweet in tweets if str(tweet.id) not in recorded]
+
+    async def _persist_batch(self, batch: PollBatch) -> None:
+        """
+        写库阶段：一个事务提交整个批次，然后更新账号活跃度，唤醒通知阶段（发件箱投递任务）和补齐任务
+
+        写库失败时撤销过滤阶段对内存状态的修改，下一轮轮询从原来的游标重新取回这些推文。
+        """
         try:
-            tweet_id = tweet_data['id']
-            author = tweet_data['author']
-            tweet_text = tweet_data['text'][:50] + '...' if len(tweet_data['text']) > 50 else tweet_data['text']
+            enqueued = await self._save_poll_results(batch)
+        except Exception:
+            self._rollback_batch(batch)
+            raise
+        for tweet in batch.tweets:
+            self.poll_scheduler.observe(tweet.author, tweet.posted_at)
+        if enqueued:
+            self.outbox.enqueued(enqueued)
+        if batch.gaps:
+            self.backfill.wake()
+        return None
+
+    def _rollback_batch(self, batch: PollBatch):
+        """
+        撤销写库失败的批次对内存状态的修改：最近保留的推文ID、近似重复索引，以及推进过的游标
 
-            logger.info(f"🐦 检测到新推文: @{author} - {tweet_text}")
+        游标恢复为推进前的值（之后的批次已推进得更远时同样回退），重新轮询会再次取回本批次的推文；
+        之后的批次已保留的推文仍在最近保留的推文ID中，不会重复通知。补齐批次写库失败时缺口保留，稍后重试。
+        """
+        for tweet in batch.tweets:
+            self.recent_ids.pop(tweet.id, None)
+        for tweet, group in batch.routed:
+            original = batch.duplicates.get(str(tweet.id))
+            if original:
+                self.dedup_index.unroute(original, {group})
+        for tweet_id in batch.fingerprints:
+            if tweet_id not in batch.duplicates:
+                self.dedup_index.discard(tweet_id)
 
-            # Save to database
-            await self._save_tweet_record(tweet_data)
+        def restore(cursors: Dict[str, str], key: str, previous: Optional[str]):
+            current = cursors.get(key)
+            if previous is None:
+                cursors.pop(key, None)
+            elif current is None or int(previous) < int(current):
+                cursors[key] = previous
 
-            # Send notification
-            success = await self.wechat_service.send_tweet_notification(tweet_data)
+        for username, previous in batch.previous_cursors.items():
+            restore(self.last_tweet_ids, username, previous)
+        if batch.search_cursor:
+            restore(self.search_since_ids, *batch.search_cursor)
+        if batch.previous_cursors or batch.search_cursor:
+            logger.warning(f"Rolled back poll cursors for {len(batch.previous_cursors)} accounts, "
+                           f"{len(batch.tweets)} tweets will be fetched again")
 
-            if success:
-                logger.info(f"✅ 成功转发推文到企业微信: @{author} ({tweet_id})")
+    def _find_near_duplicates(self, tweets: List[Tweet],
+                              routes: Dict[str, Set[str]]) -> Tuple[Dict[str, int], Dict[str, str]]:
+        """
+        计算内容指纹并在时间窗口内查找近似重复，返回 (推文ID -> 指纹, 重复推文ID -> 原推文ID)
+
+        routes 为每条推文匹配的分组：重复推文只保留尚未收到原文的分组，按目的地去重，
+        订阅了转发者但没有收到原文的分组仍会收到这条内容。
+        """
+        fingerprints: Dict[str, int] = {}
+        duplicates: Dict[str, str] = {}
+        now = clock.now()
+        self.dedup_index.configure(settings.DEDUP_MAX_DISTANCE)
+        # 从旧到新处理，同一批内最早的一条作为原文
+        for tweet in sorted(tweets, key=lambda t: t.id):
+            fingerprint = tweet_fingerprint(tweet)
+            if fingerprint is None:
+                continue
+            tweet_id = str(tweet.id)
+            fingerprints[tweet_id] = fingerprint
+            if settings.DEDUP_WINDOW_SECONDS <= 0:
+                continue
+
+            original = self.dedup_index.find(fingerprint, tweet.posted_at, now)
+            if original:
+                duplicates[tweet_id] = original
+                routes[tweet_id] = self.dedup_index.route(original, routes[tweet_id])
             else:
-                logger.error(f"❌ 转发推文失败: @{author} ({tweet_id})")
+                self.dedup_index.add(tweet_id, fingerprint, tweet.posted_at, routes[tweet_id])
+        return fingerprints, duplicates
 
-        except Exception as e:
-            logger.error(f"❌ 处理推文时发生错误 {tweet_data.get('id', 'unknown')}: {str(e)}")
-    
-    async def _load_last_tweet_ids(self):
+    async def _load_dedup_index(self):
+        """启动时从时间窗口内的推文记录重建近似重复索引，并按当前的订阅规则恢复每条原文已发送的分组"""
+        if settings.DEDUP_WINDOW_SECONDS <= 0:
+            return
         try:
+            since = clock.utcnow() - timedelta(seconds=settings.DEDUP_WINDOW_SECONDS)
             async with get_db() as db:
-                for username in settings.twitter_usernames_list:
-                    result = await db.execute(
-                        "SELECT tweet_id FROM tweet_records WHERE username = ? ORDER BY created_at DESC LIMIT 1",
-                        (username,)
-                    )
-                    row = await result.fetchone()
-                    if row:
-                        self.last_tweet_ids[username] = row[0]
-                        
+                cursor = await db.execute(
+                    """SELECT tweet_id, username, content, simhash, created_at, duplicate_of FROM tweet_records
+                       WHERE created_at >= ? AND simhash IS NOT NULL
+                       ORDER BY created_at""",
+                    (since.isoformat(),)
+                )
+                rows = await cursor.fetchall()
+            for tweet_id, username, content, fingerprint, created_at, duplicate_of in rows:
+                groups = self.rule_engine.match(username, content)
+                if duplicate_of:
+                    self.dedup_index.route(duplicate_of, groups)
+                else:
+                    self.dedup_index.add(tweet_id, to_unsigned(fingerprint), _parse_timestamp(created_at), groups)
+            logger.info(f"Rebuilt near-duplicate index with {len(self.dedup_index)} fingerprints")
         except Exception as e:
-            logger.error(f"Error loading last tweet IDs: {str(e)}")
+            logger.error(f"Error loading near-duplicate index: {str(e)}")
     
-    async def _save_last_tweet_id(self, username: str, tweet_id: str):
+    async def _load_activity(self):
+        """从最近的推文记录一次性学习各账号的发推频率"""
         try:
+            since = clock.utcnow() - timedelta(hours=settings.ACTIVITY_HALF_LIFE_HOURS * 4)
             async with get_db() as db:
-                await db.execute(
-                    """UPDATE tweet_records 
-                       SET updated_at = ? 
-                       WHERE username = ? AND tweet_id = ?""",
-                    (datetime.utcnow().isoformat(), username, tweet_id)
+                cursor = await db.execute(
+                    "SELECT username, created_at FROM tweet_records WHERE created_at >= ?",
+                    (since.isoformat(),)
                 )
-                await db.commit()
+                rows = await cursor.fetchall()
+            for username, created_at in rows:
+                self.poll_scheduler.observe(username, _parse_timestamp(created_at))
         except Exception as e:
-            logger.error(f"Error saving last tweet ID: {str(e)}")
-    
-    async def _save_tweet_record(self, tweet_data: dict):
+            logger.error(f"Error loading posting activity: {str(e)}")
+
+    async def _load_last_tweet_ids(self, usernames: Optional[List[str]] = None):
+        """一次查询加载轮询游标：启动时加载全部用户，接管分片时只加载指定用户"""
         try:
             async with get_db() as db:
-                await db.execute(
+                if usernames is None:
+                    cursor = await db.execute("SELECT username, since_id FROM poll_cursors WHERE since_id IS NOT NULL")
+                else:
+                    cursor = await db.execute(
+                        """SELECT username, since_id FROM poll_cursors
+                           WHERE since_id IS NOT NULL AND username IN (SELECT value FROM json_each(?))""",
+                        (json.dumps(usernames),)
+                    )
+                rows = await cursor.fetchall()
+            for username, since_id in rows:
+                self.last_tweet_ids[username] = str(since_id)
+                        
+        except Exception as e:
+            logger.error(f"Error loading last tweet IDs: {str(e)}")
+    
+    def _persisted_cursor(self, username: str, cursor: Optional[str]) -> Optional[int]:
+        """
+        写库的游标不超过内存中的当前游标：之前的批次写库失败、内存游标已回退时，
+        之后的批次不能把数据库中的游标推进到失败批次的推文之后
+        """
+        current = self.last_tweet_ids.get(username)
+        if not cursor or not current:
+            return None
+        return min(int(cursor), int(current))
+
+    async def _save_poll_results(self, batch: PollBatch) -> int:
+        """
+        在一个事务内批量写入推文记录、发件箱和互动数据跟踪，并更新本批次轮询过的用户的游标；近似重复的推文只记录不通知
+
+        游标推进时跳过的区间作为缺口同时写入，补齐完成的缺口同时删除，缺口与游标不会不一致。
+        返回新写入发件箱的条数。
+        """
+        tweets = batch.tweets
+        duplicates = batch.duplicates
+        signed = {tweet_id: to_signed(fingerprint) for tweet_id, fingerprint in batch.fingerprints.items()}
+        now = clock.utcnow().replace(tzinfo=None).isoformat()
+        new_authors = {tweet.author for tweet in tweets}
+
+        enqueued = 0
+        async with transaction() as db:
+            if tweets:
+                await db.executemany(
                     """INSERT OR IGNORE INTO tweet_records 
-                       (tweet_id, username, content, tweet_url, created_at, metrics)
-                       VALUES (?, ?, ?, ?, ?, ?)""",
+                       (tweet_id, username, content, tweet_url, created_at, metrics, simhash, duplicate_of)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    [
+                        (
+                            str(tweet.id),
+                            tweet.author,
+                            tweet.text,
+                            tweet.url,
+                            tweet.created_at,
+                            str(tweet.metrics),
+                            signed.get(str(tweet.id)),
+                            duplicates.get(str(tweet.id))
+                        )
+                        for tweet in tweets
+                    ]
+                )
+                cursor = await db.executemany(
+                    ENQUEUE_SQL, enqueue_rows([(tweet.to_payload(), group) for tweet, group in batch.routed])
+                )
+                enqueued = cursor.rowcount
+                if settings.METRICS_TRACKING_ENABLED:
+                    tracked, samples = track_rows([tweet for tweet in tweets if str(tweet.id) not in duplicates])
+                    await db.executemany(TRACK_SQL, tracked)
+                    await db.executemany(SAMPLE_SQL, samples)
+            # 游标只前进不后退：分片交接时原 worker 迟到的写入不会覆盖接管者的进度
+            await db.executemany(
+                """INSERT INTO poll_cursors (username, since_id, last_polled_at, last_new_at)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(username) DO UPDATE SET
+                       since_id = MAX(COALESCE(excluded.since_id, poll_cursors.since_id),
+                                      COALESCE(poll_cursors.since_id, excluded.since_id)),
+                       last_polled_at = excluded.last_polled_at,
+                       last_new_at = COALESCE(excluded.last_new_at, poll_cursors.last_new_at)""",
+                [
                     (
-                        tweet_data['id'],
-                        tweet_data['author'],
-                        tweet_data['text'],
-                        tweet_data['url'],
-                        tweet_data['created_at'],
-                        str(tweet_data['metrics'])
+                        username,
+                        self._persisted_cursor(username, batch.cursors.get(username)),
+                        now,
+                        now if username in new_authors else None
                     )
-                )
-                await db.commit()
-        except Exception as e:
-            logger.error(f"Error saving tweet record: {str(e)}")
\ No newline at end of file
+                    for username in batch.polled_usernames
+                ]
+            )
+            if batch.gaps:
+                await db.executemany(GAP_SQL, batch.gaps)
+            if batch.closed_gap is not None:
+                await db.execute("DELETE FROM poll_gaps WHERE id = ?", (batch.closed_gap,))
+        return enqueued
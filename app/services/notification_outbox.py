@@ -0,0 +1,311 @@
+import asyncio
+import json
+import logging
+import random
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.models.database import get_db, transaction
+from app.utils import clock
+from app.utils.metrics import OUTBOX_PENDING
+from app.services.wechat_service import WeChatService
+
+logger = logging.getLogger(__name__)
+
+CLAIM_BATCH_SIZE = 20  # 每次最多领取的条数，同时不超过 webhook 每分钟的发送额度
+CLAIM_LEASE_SECONDS = 120  # 领取后的租约时间，进程崩溃后租约过期即可被重新投递
+LEASE_RENEW_SECONDS = 30  # 投递期间续约的间隔，排队等待限流时租约不会过期
+IDLE_POLL_SECONDS = 30  # 没有待发送消息时的最长等待时间
+
+ENQUEUE_SQL = """INSERT OR IGNORE INTO notification_outbox
+                 (tweet_id, target, payload, next_attempt_at, created_at)
+                 VALUES (?, ?, ?, ?, ?)"""
+
+
+def enqueue_rows(routed: List[Tuple[dict, str]]) -> List[Tuple]:
+    """生成写入 notification_outbox 的参数（每个 (推文, 分组) 一行），与推文记录在同一事务内执行"""
+    now = clock.now()
+    return [
+        (str(tweet['id']), target, json.dumps(tweet, ensure_ascii=False), now, now)
+        for tweet, target in routed
+    ]
+
+
+async def prune_delivered(before: float, batch_size: int) -> int:
+    """分批删除 before 之前已投递的记录（每批一个短事务），返回删除的行数；未投递的记录保留"""
+    pruned = 0
+    while True:
+        async with transaction() as db:
+            cursor = await db.execute(
+                """DELETE FROM notification_outbox WHERE id IN (
+                       SELECT id FROM notification_outbox
+                       WHERE status = 'delivered' AND next_attempt_at < ? AND delivered_at < ? LIMIT ?
+                   )""",
+                (before, before, batch_size)
+            )
+            deleted = cursor.rowcount
+        pruned += deleted
+        if deleted < batch_size:
+            return pruned
+
+
+class NotificationOutbox:
+    """
+    持久化的通知发件箱投递器
+
+    新推文与发件箱记录在同一事务内写入；后台任务按 next_attempt_at 领取到期记录并发送，
+    只有企业微信返回 errcode == 0 才标记为 delivered，失败则按指数退避加随机抖动重试。
+    重启后未投递的记录会继续发送。
+
+    领取的记录在投递期间（包括在限流窗口和 45009 退避中排队）定期续约，
+    只有进程停止续约（崩溃）后才会被其他 worker 重新领取，不会重复发送。
+    """
+
+    def __init__(self, services: Dict[str, WeChatService]):
+        # 分组名 -> 该分组的企业微信 webhook；不同分组并行投递，各自限流
+        # NOTIFY_DIGEST_WINDOW_SECONDS > 0 时启用摘要模式：突发的多条推文合并为一条消息
+        self.services = services
+        self.task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        # 待投递条数：启动时从数据库加载一次，之后随写入和投递结果在内存中更新，抓取指标时不再查询
+        self.pending: Optional[int] = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def close(self):
+        """关闭所有分组的 HTTP 会话"""
+        for service in self.services.values():
+            await service.close()
+
+    def enqueued(self, count: int):
+        """写入发件箱的事务提交后调用：累加待投递条数并唤醒投递任务"""
+        if self.pending is not None:
+            self._set_pending(self.pending + count)
+        self._wakeup.set()
+
+    async def pending_count(self) -> int:
+        """待投递条数；第一次调用时从数据库加载"""
+        if self.pending is None:
+            async with get_db() as db:
+                cursor = await db.execute("SELECT COUNT(*) FROM notification_outbox WHERE status = 'pending'")
+                row = await cursor.fetchone()
+            self._set_pending(row[0])
+        return self.pending
+
+    def _set_pending(self, count: int):
+        self.pending = max(0, count)
+        OUTBOX_PENDING.set(self.pending)
+
+    async def _run(self):
+        logger.info("📮 通知发件箱投递任务已启动")
+        try:
+            await self.pending_count()
+        except Exception as e:
+            logger.error(f"Error loading outbox pending count: {str(e)}")
+        while True:
+            try:
+                if settings.NOTIFY_DIGEST_WINDOW_SECONDS > 0:
+                    wait = await self._digest_wait_time()
+                    if wait == 0:
+                        rows = await self._claim_due(settings.NOTIFY_DIGEST_MAX_TWEETS)
+                        if rows:
+                            by_target: Dict[str, list] = {}
+                            for row in rows:
+                                by_target.setdefault(row[4], []).append(row)
+                            async with self._leased(rows):
+                                await asyncio.gather(*(
+                                    self._deliver_digest(target, target_rows)
+                                    for target, target_rows in by_target.items()
+                                ))
+                            continue
+                    await self._wait_for_work(wait)
+                    continue
+
+                rows = await self._claim_due(min(CLAIM_BATCH_SIZE, settings.WECHAT_RATE_LIMIT_PER_MINUTE))
+                if rows:
+                    async with self._leased(rows):
+                        await asyncio.gather(*(self._deliver(*row) for row in rows))
+                    continue
+                await self._wait_for_work()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in notification outbox loop: {str(e)}")
+                await clock.sleep(5)
+
+    async def _digest_wait_time(self) -> Optional[float]:
+        """
+        距离下一批摘要可以发送的秒数；没有待发送记录时返回 None
+
+        最早一条待发送记录等满窗口时间，或者积压数量达到上限时立即发送，
+        这样突发时减少 webhook 调用，而单条推文的延迟不超过一个窗口。
+        """
+        now = clock.now()
+        async with get_db() as db:
+            cursor = await db.execute(
+                """SELECT COUNT(*), MIN(created_at) FROM notification_outbox
+                   WHERE status = 'pending' AND next_attempt_at <= ?
+                     AND (locked_until IS NULL OR locked_until < ?)""",
+                (now, now)
+            )
+            count, oldest = await cursor.fetchone()
+        if not count:
+            return None
+        if count >= settings.NOTIFY_DIGEST_MAX_TWEETS:
+            return 0
+        return max(0.0, oldest + settings.NOTIFY_DIGEST_WINDOW_SECONDS - now)
+
+    async def _wait_for_work(self, max_wait: Optional[float] = None):
+        """等待新记录写入或下一条重试（或租约）到期"""
+        # 先清除事件再查询，查询之后写入的记录一定能唤醒本次等待
+        self._wakeup.clear()
+        async with get_db() as db:
+            cursor = await db.execute(
+                """SELECT MIN(MAX(next_attempt_at, COALESCE(locked_until, 0)))
+                   FROM notification_outbox WHERE status = 'pending'"""
+            )
+            row = await cursor.fetchone()
+        if row[0] is None and self.pending:
+            # 没有待投递记录：校正计数（其他 worker 投递了本进程写入的记录）
+            self._set_pending(0)
+        timeout = IDLE_POLL_SECONDS if max_wait is None else min(IDLE_POLL_SECONDS, max_wait)
+        if row and row[0] is not None:
+            timeout = min(timeout, max(0.0, row[0] - clock.now()))
+
+        try:
+            await clock.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _claim_due(self, limit: int) -> list:
+        """原子地领取一批到期记录（设置租约），避免重复发送"""
+        now = clock.now()
+        async with get_db() as db:
+            cursor = await db.execute(
+                """UPDATE notification_outbox SET locked_until = ?
+                   WHERE id IN (
+                       SELECT id FROM notification_outbox
+                       WHERE status = 'pending' AND next_attempt_at <= ?
+                         AND (locked_until IS NULL OR locked_until < ?)
+                       ORDER BY id LIMIT ?
+                   )
+                   RETURNING id, tweet_id, payload, attempts, target""",
+                (now + CLAIM_LEASE_SECONDS, now, now, limit)
+            )
+            rows = await cursor.fetchall()
+            await db.commit()
+        return sorted(rows)
+
+    @asynccontextmanager
+    async def _leased(self, rows: list):
+        """投递期间每 LEASE_RENEW_SECONDS 秒为尚未记录结果的记录续约"""
+        task = asyncio.create_task(self._renew_leases([row[0] for row in rows]))
+        try:
+            yield
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _renew_leases(self, outbox_ids: List[int]):
+        while True:
+            await clock.sleep(LEASE_RENEW_SECONDS)
+            try:
+                async with get_db() as db:
+                    # 已记录结果的记录 locked_until 为 NULL，不会被重新锁定
+                    await db.execute(
+                        """UPDATE notification_outbox SET locked_until = ?
+                           WHERE id IN (SELECT value FROM json_each(?))
+                             AND status = 'pending' AND locked_until IS NOT NULL""",
+                        (clock.now() + CLAIM_LEASE_SECONDS, json.dumps(outbox_ids))
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"Error renewing outbox leases: {str(e)}")
+
+    def _service_for(self, target: str) -> Optional[WeChatService]:
+        service = self.services.get(target)
+        if service is None:
+            logger.error(f"Unknown notification group '{target}', check NOTIFY_RULES_FILE")
+        return service
+
+    async def _deliver(self, outbox_id: int, tweet_id: str, payload: str, attempts: int, target: str):
+        tweet_data = json.loads(payload)
+        author = tweet_data.get('author')
+        service = self._service_for(target)
+        try:
+            if service is None:
+                raise RuntimeError(f"unknown notification group {target}")
+            success = await service.send_tweet_notification(tweet_data)
+            error = None if success else "webhook returned non-zero errcode"
+        except Exception as e:
+            success, error = False, str(e)
+
+        delay = await self._record_result([(outbox_id, attempts)], success, error)
+        if success:
+            logger.info(f"✅ 成功转发推文到企业微信[{target}]: @{author} ({tweet_id})")
+        else:
+            logger.error(f"❌ 转发推文失败[{target}]: @{author} ({tweet_id})，{int(delay)}s 后第 {attempts + 2} 次重试")
+
+    async def _deliver_digest(self, target: str, rows: list):
+        """把同一分组的一批记录合并为尽量少的 markdown 消息按顺序发送，每条消息单独记录结果"""
+        service = self._service_for(target)
+        if service is None:
+            await self._record_result([(row[0], row[3]) for row in rows], False, f"unknown notification group {target}")
+            return
+
+        tweets = [json.loads(row[2]) for row in rows]
+        for content, indices in service.build_digest_messages(tweets):
+            try:
+                success = await service.send_markdown(content)
+                error = None if success else "webhook returned non-zero errcode"
+            except Exception as e:
+                success, error = False, str(e)
+
+            batch = [(rows[i][0], rows[i][3]) for i in indices]
+            delay = await self._record_result(batch, success, error)
+            if success:
+                logger.info(f"✅ 成功转发 {len(indices)} 条推文摘要到企业微信[{target}]")
+            else:
+                logger.error(f"❌ 转发 {len(indices)} 条推文摘要失败[{target}]，{int(delay)}s 后重试")
+
+    async def _record_result(self, rows: List[Tuple[int, int]], success: bool, error: Optional[str]) -> float:
+        """记录投递结果：成功标记 delivered，失败按指数退避加随机抖动安排重试，返回重试等待秒数"""
+        now = clock.now()
+        delay = 0.0
+        async with get_db() as db:
+            if success:
+                await db.executemany(
+                    """UPDATE notification_outbox
+                       SET status = 'delivered', delivered_at = ?, attempts = ?, locked_until = NULL
+                       WHERE id = ?""",
+                    [(now, attempts + 1, outbox_id) for outbox_id, attempts in rows]
+                )
+                delivered = len(rows)
+            else:
+                attempts = max(attempts for _, attempts in rows)
+                delay = min(settings.OUTBOX_RETRY_MAX_SECONDS, settings.OUTBOX_RETRY_BASE_SECONDS * 2 ** attempts)
+                delay = random.uniform(delay / 2, delay)  # 抖动，避免 webhook 恢复时集中重试
+                await db.executemany(
+                    """UPDATE notification_outbox
+                       SET attempts = ?, next_attempt_at = ?, last_error = ?, locked_until = NULL
+                       WHERE id = ?""",
+                    [(attempts + 1, now + delay, error, outbox_id) for outbox_id, attempts in rows]
+                )
+            await db.commit()
+        if success and self.pending is not None:
+            self._set_pending(self.pending - delivered)
+        return delay
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.models.tweet import Tweet
+from app.utils import clock
+from app.utils.metrics import PIPELINE_QUEUE_DEPTH, PIPELINE_TWEETS, PIPELINE_STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DRAIN_TIMEOUT_SECONDS = 10  # 停止时等待队列中已有批次处理完的最长时间
+
+
+class PollBatch:
+    """
+    一次轮询（或一个补齐缺口、一组推送的推文）的结果，在流水线各阶段之间传递
+
+    抓取阶段填写 tweets、polled_usernames 和 gaps；过滤阶段保留新推文并填写游标、指纹、重复和路由结果；
+    写库阶段在一个事务内提交。补齐的批次设置 closed_gap，与尚未追赶的账号推送的推文一样
+    advance_cursor 为 False：按推文记录去重，不推进游标。
+    抓取和过滤阶段推进内存中的游标时在 previous_cursors / search_cursor 中记下原值，写库失败时据此恢复。
+    """
+
+    __slots__ = ('tweets', 'polled_usernames', 'gaps', 'closed_gap', 'backfill_kind', 'advance_cursor',
+                 'search_cursor', 'cursors', 'previous_cursors', 'fingerprints', 'duplicates', 'routed', 'done')
+
+    def __init__(self, tweets: List[Tweet], polled_usernames: List[str],
+                 gaps: Optional[List[Tuple]] = None, closed_gap: Optional[int] = None,
+                 backfill_kind: Optional[str] = None, advance_cursor: bool = True,
+                 search_cursor: Optional[Tuple[str, Optional[str]]] = None):
+        self.tweets = tweets
+        self.polled_usernames = polled_usernames
+        self.gaps = gaps or []
+        self.closed_gap = closed_gap
+        self.backfill_kind = backfill_kind
+        self.advance_cursor = advance_cursor
+        self.search_cursor = search_cursor  # (合并查询, 推进前的 since_id)
+        self.cursors: Dict[str, Optional[str]] = {}
+        self.previous_cursors: Dict[str, Optional[str]] = {}
+        self.fingerprints: Dict[str, int] = {}
+        self.duplicates: Dict[str, str] = {}
+        self.routed: List[Tuple[Tweet, str]] = []
+        self.done: Optional[asyncio.Future] = None  # 提交方需要等待写库结果时设置
+
+    def finish(self, success: bool):
+        if self.done is not None and not self.done.done():
+            self.done.set_result(success)
+
+
+# 返回交给下一阶段的批次；返回 None 表示该批次到此结束
+StageHandler = Callable[[PollBatch], Awaitable[Optional[PollBatch]]]
+
+
+class PipelineStage:
+    """流水线的一个阶段：单个任务按顺序处理输入队列中的批次，下一阶段的队列满时等待（背压）"""
+
+    def __init__(self, name: str, handler: StageHandler, capacity: int):
+        self.name = name
+        self.handler = handler
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=capacity)
+        self.next_stage: Optional['PipelineStage'] = None
+        self.task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.tweets = 0
+        self.busy_seconds = 0.0
+
+    async def put(self, batch: PollBatch):
+        await self.queue.put(batch)
+        PIPELINE_QUEUE_DEPTH.labels(self.name).set(self.queue.qsize())
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        # 未处理的批次丢弃：游标尚未写库，重启后会重新抓取
+        while not self.queue.empty():
+            self.queue.get_nowait().finish(False)
+            self.queue.task_done()
+        PIPELINE_QUEUE_DEPTH.labels(self.name).set(0)
+
+    async def _run(self):
+        while True:
+            batch = await self.queue.get()
+            PIPELINE_QUEUE_DEPTH.labels(self.name).set(self.queue.qsize())
+            started = time.perf_counter()
+            try:
+                tweets = len(batch.tweets)
+                result = await self.handler(batch)
+                elapsed = time.perf_counter() - started
+                PIPELINE_STAGE_SECONDS.labels(self.name).observe(elapsed)
+                PIPELINE_TWEETS.labels(self.name).inc(tweets)
+                self.batches += 1
+                self.tweets += tweets
+                self.busy_seconds += elapsed
+                if result is not None and self.next_stage is not None:
+                    await self.next_stage.put(result)
+                else:
+                    batch.finish(True)
+            except asyncio.CancelledError:
+                batch.finish(False)
+                raise
+            except Exception as e:
+                logger.error(f"Error in pipeline stage {self.name}: {str(e)}")
+                batch.finish(False)
+            finally:
+                self.queue.task_done()
+
+    def status(self) -> Dict:
+        return {
+            'queued': self.queue.qsize(),
+            'capacity': self.queue.maxsize,
+            'batches': self.batches,
+            'tweets': self.tweets,
+            'busy_seconds': round(self.busy_seconds, 3)
+        }
+
+
+class TweetPipeline:
+    """
+    把若干阶段用有界队列串联起来
+
+    抓取方通过 submit 放入批次，第一个阶段的队列满时 submit 等待，慢的阶段因此会逐级减缓抓取，而不是无限堆积。
+    每个阶段只有一个任务，批次按提交顺序处理，游标和发件箱的写入顺序与抓取顺序一致。
+    """
+
+    def __init__(self, stages: List[Tuple[str, StageHandler]], capacity: int):
+        self.stages = [PipelineStage(name, handler, capacity) for name, handler in stages]
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    async def stop(self):
+        """依次等待各阶段处理完已排队的批次（最多 DRAIN_TIMEOUT_SECONDS 秒），然后停止"""
+        for stage in self.stages:
+            if stage.task is None:
+                continue
+            try:
+                await clock.wait_for(stage.queue.join(), DRAIN_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                logger.warning(f"Pipeline stage {stage.name} did not drain in time, "
+                               f"dropping {stage.queue.qsize()} batches")
+                break
+        for stage in self.stages:
+            await stage.stop()
+
+    async def submit(self, batch: PollBatch, wait: bool = False) -> bool:
+        """放入一个批次；wait 为 True 时等待该批次处理完成，返回是否成功写库"""
+        if wait:
+            batch.done = asyncio.get_running_loop().create_future()
+        await self.stages[0].put(batch)
+        if wait:
+            return await batch.done
+        return True
+
+    def status(self) -> Dict[str, Dict]:
+        return {stage.name: stage.status() for stage in self.stages}
@@ -0,0 +1,130 @@
+import heapq
+import math
+from typing import Dict, List, Optional, Tuple
+
+
+class AccountActivity:
+    """按指数衰减统计的账号发推频率"""
+
+    def __init__(self, half_life: float):
+        self.tau = half_life / math.log(2)
+        self.count = 0.0  # 衰减后的发推数量
+        self.updated_at: Optional[float] = None
+        self.last_polled: Optional[float] = None
+
+    def observe(self, posted_at: float):
+        if self.updated_at is None:
+            self.count, self.updated_at = 1.0, posted_at
+        elif posted_at >= self.updated_at:
+            self.count = self.count * math.exp(-(posted_at - self.updated_at) / self.tau) + 1.0
+            self.updated_at = posted_at
+        else:
+            # 乱序到达的旧推文：按其时间点衰减后计入
+            self.count += math.exp(-(self.updated_at - posted_at) / self.tau)
+
+    def rate(self, now: float) -> float:
+        """当前的发推速率（条/秒）"""
+        if self.updated_at is None:
+            return 0.0
+        return self.count * math.exp(-max(0.0, now - self.updated_at) / self.tau) / self.tau
+
+
+class AdaptivePollScheduler:
+    """
+    根据账号活跃度分配轮询频率的优先队列调度器
+
+    每次调用 next_account 仍只轮询一个账号（API 调用量与轮换策略相同），
+    但轮询频率与发推速率的平方根成正比，这样在相同调用量下平均检测延迟最小；
+    同时受最小/最大轮询间隔约束，不活跃的账号也不会被饿死。
+    """
+
+    def __init__(self, poll_interval: float, min_interval: float, max_interval: float,
+                 half_life: float, prior_rate: float):
+        self.poll_interval = poll_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.half_life = half_life
+        self.prior_rate = prior_rate  # 没有历史数据时假定的发推速率（条/秒）
+        self.accounts: Dict[str, AccountActivity] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._due: Dict[str, float] = {}
+        self._seq = 0
+
+    def configure(self, poll_interval: float, min_interval: float, max_interval: float, now: float):
+        """
+        运行时修改轮询间隔（配置热更新后每轮调用）；最大间隔缩短时，已排期较晚的账号提前到新的最大间隔内
+        """
+        if (poll_interval, min_interval, max_interval) == (self.poll_interval, self.min_interval, self.max_interval):
+            return
+        shortened = max_interval < self.max_interval
+        self.poll_interval, self.min_interval, self.max_interval = poll_interval, min_interval, max_interval
+        if not shortened:
+            return
+        for username, due in list(self._due.items()):
+            last_polled = self.accounts[username].last_polled
+            latest = (now if last_polled is None else last_polled) + max_interval
+            if due > latest:
+                self._push(username, latest)
+
+    def _push(self, username: str, due: float):
+        self._seq += 1
+        self._due[username] = due
+        heapq.heappush(self._heap, (due, self._seq, username))
+
+    def sync(self, usernames: List[str], now: float):
+        """
+        同步监控列表：尚未排队的账号立即排队，移除的账号从队列中删除
+
+        启动时 observe 会先为有历史推文的账号建立活跃度记录，这些账号同样需要在这里排队。
+        """
+        wanted = set(usernames)
+        for username in list(self.accounts):
+            if username not in wanted:
+                del self.accounts[username]
+                self._due.pop(username, None)
+        for offset, username in enumerate(usernames):
+            if username not in self.accounts:
+                self.accounts[username] = AccountActivity(self.half_life)
+            if username not in self._due:
+                self._push(username, now + offset * 1e-6)
+
+    def observe(self, username: str, posted_at: float):
+        """记录一条推文的发布时间，用于更新账号活跃度"""
+        activity = self.accounts.get(username)
+        if activity is None:
+            activity = self.accounts[username] = AccountActivity(self.half_life)
+        activity.observe(posted_at)
+
+    def rate(self, username: str, now: float) -> float:
+        activity = self.accounts.get(username)
+        return (activity.rate(now) if activity else 0.0) + self.prior_rate
+
+    def interval(self, username: str, now: float) -> float:
+        """账号的目标轮询间隔：interval_i = poll_interval * Σ√λ_j / √λ_i，并限制在 [min, max] 内"""
+        total = sum(math.sqrt(self.rate(name, now)) for name in self.accounts)
+        target = self.poll_interval * total / math.sqrt(self.rate(username, now))
+        return min(self.max_interval, max(self.min_interval, target))
+
+    def next_account(self, now: float) -> Optional[str]:
+        """取出最早到期的账号并重新排期；所有账号都在最小间隔内时返回 None"""
+        skipped = []
+        chosen = None
+        while self._heap:
+            due, seq, username = heapq.heappop(self._heap)
+            if self._due.get(username) != due:
+                continue  # 已删除或已重新排期的旧条目
+            activity = self.accounts[username]
+            if activity.last_polled is not None and now - activity.last_polled < self.min_interval:
+                skipped.append((due, seq, username))
+                continue
+            chosen = username
+            break
+
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+
+        if chosen is None:
+            return None
+        self.accounts[chosen].last_polled = now
+        self._push(chosen, now + self.interval(chosen, now))
+        return chosen
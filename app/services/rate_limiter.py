@@ -0,0 +1,304 @@
+import asyncio
+import hashlib
+import logging
+from typing import Dict, List, Optional, Any, Mapping, Tuple
+from app.models.database import get_db
+from app.utils import clock
+from app.utils.metrics import TWITTER_RATE_LIMIT_REMAINING
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESET_SECONDS = 15 * 60  # 429 响应缺少 x-rate-limit-reset 时的兜底等待时间
+
+
+class EndpointBudget:
+    """单个接口的速率限制预算（令牌桶），由响应头 x-rate-limit-* 校准"""
+
+    def __init__(self, endpoint: str, limit: Optional[int] = None,
+                 remaining: Optional[int] = None, reset_at: Optional[float] = None):
+        self.endpoint = endpoint
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_at = reset_at
+        self.last_grant = 0.0
+        self.saved_reset_at = reset_at  # 最近一次写入 rate_limit_status 的窗口重置时间
+
+    def refresh(self, now: float):
+        """窗口重置后补满令牌"""
+        if self.reset_at is not None and now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = None
+
+    def is_exhausted(self, now: float) -> bool:
+        self.refresh(now)
+        return self.remaining is not None and self.remaining <= 0
+
+    def wait_time(self, now: float) -> float:
+        """距离下一个可用调用的秒数：令牌耗尽时等到窗口重置，否则把剩余令牌均匀分配到窗口内"""
+        self.refresh(now)
+        if self.remaining is None or self.reset_at is None:
+            return 0.0
+        if self.remaining <= 0:
+            return self.reset_at - now
+        interval = (self.reset_at - now) / self.remaining
+        return max(0.0, self.last_grant + interval - now)
+
+    def consume(self, now: float):
+        self.last_grant = now
+        if self.remaining is not None:
+            self.remaining -= 1
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        self.refresh(now)
+        return {
+            'limit': self.limit,
+            'remaining': self.remaining,
+            'reset_seconds': max(0, int(self.reset_at - now)) if self.reset_at else None
+        }
+
+
+class RateLimitScheduler:
+    """单个 bearer token 按接口维护的令牌桶，调用额度由 TokenPool 分配；token_id 区分不同 bearer token 的持久化状态"""
+
+    def __init__(self, token_id: str = ''):
+        self.token_id = token_id
+        self.budgets: Dict[str, EndpointBudget] = {}
+
+    def budget(self, endpoint: str) -> EndpointBudget:
+        budget = self.budgets.get(endpoint)
+        if budget is None:
+            budget = self.budgets[endpoint] = EndpointBudget(endpoint)
+        return budget
+
+    def consume(self, endpoint: str, now: float):
+        """占用该接口的一次额度（由 TokenPool 在选中该 token 后调用）"""
+        self.budget(endpoint).consume(now)
+
+    async def record_response(self, endpoint: str, headers: Mapping[str, str], status: int = 200):
+        """根据响应头更新预算；429 只会阻塞当前接口"""
+        budget = self.budget(endpoint)
+        limit = headers.get('x-rate-limit-limit')
+        remaining = headers.get('x-rate-limit-remaining')
+        reset = headers.get('x-rate-limit-reset')
+
+        if limit is not None:
+            budget.limit = int(limit)
+        if remaining is not None:
+            budget.remaining = int(remaining)
+        if reset is not None:
+            budget.reset_at = float(reset)
+
+        if status == 429:
+            now = clock.now()
+            budget.remaining = 0
+            if reset is None:
+                budget.reset_at = now + DEFAULT_RESET_SECONDS
+            elif budget.reset_at <= now:
+                # 本地时钟与服务器存在偏差时，至少等待 1 秒再重试
+                budget.reset_at = now + 1
+            logger.warning(f"Rate limit exceeded for {endpoint}, blocked until reset")
+
+        # 只在进入新窗口、额度耗尽或被限流时持久化，不在每次请求的热路径上写库；
+        # 窗口内的剩余额度重启后可能偏高，由响应头或 429 重新校准
+        exhausted = budget.remaining is not None and budget.remaining <= 0
+        if status == 429 or exhausted or (
+                (limit is not None or remaining is not None) and budget.reset_at != budget.saved_reset_at):
+            await self._save(budget)
+            budget.saved_reset_at = budget.reset_at
+
+    def is_rate_limited(self, endpoint: Optional[str] = None) -> bool:
+        now = clock.now()
+        if endpoint:
+            return self.budget(endpoint).is_exhausted(now)
+        return any(budget.is_exhausted(now) for budget in self.budgets.values())
+
+    def get_reset_time(self, endpoint: Optional[str] = None) -> Optional[int]:
+        """耗尽接口距离重置的秒数（未指定接口时取最长的一个）"""
+        now = clock.now()
+        budgets = [self.budget(endpoint)] if endpoint else list(self.budgets.values())
+        waits = [budget.reset_at - now for budget in budgets if budget.is_exhausted(now) and budget.reset_at]
+        return max(0, int(max(waits))) if waits else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        now = clock.now()
+        return {endpoint: budget.to_dict(now) for endpoint, budget in self.budgets.items()}
+
+    async def load(self):
+        """从 rate_limit_status 表恢复各接口的预算"""
+        try:
+            async with get_db() as db:
+                cursor = await db.execute(
+                    """SELECT endpoint, limit_total, remaining, reset_at FROM rate_limit_status
+                       WHERE endpoint IS NOT NULL AND token_id = ?""",
+                    (self.token_id,)
+                )
+                rows = await cursor.fetchall()
+            now = clock.now()
+            for endpoint, limit, remaining, reset_at in rows:
+                if reset_at and reset_at > now:
+                    self.budgets[endpoint] = EndpointBudget(endpoint, limit, remaining, reset_at)
+                    logger.info(f"Loaded rate limit state for {endpoint} (token {self.token_id}): {remaining}/{limit}, "
+                                f"reset in {int(reset_at - now)}s")
+        except Exception as e:
+            logger.error(f"Error loading rate limit from database: {e}")
+
+    async def _save(self, budget: EndpointBudget):
+        try:
+            async with get_db() as db:
+                await db.execute(
+                    """INSERT INTO rate_limit_status
+                       (token_id, endpoint, rate_limited_until, limit_total, remaining, reset_at, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                       ON CONFLICT(token_id, endpoint) DO UPDATE SET
+                           rate_limited_until = excluded.rate_limited_until,
+                           limit_total = excluded.limit_total,
+                           remaining = excluded.remaining,
+                           reset_at = excluded.reset_at,
+                           updated_at = excluded.updated_at""",
+                    (
+                        self.token_id,
+                        budget.endpoint,
+                        budget.reset_at if budget.remaining is not None and budget.remaining <= 0 else None,
+                        budget.limit,
+                        budget.remaining,
+                        budget.reset_at
+                    )
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Error saving rate limit to database: {e}")
+
+    async def clear(self):
+        """清除所有接口的速率限制状态"""
+        self.budgets.clear()
+        try:
+            async with get_db() as db:
+                await db.execute("DELETE FROM rate_limit_status WHERE token_id = ?", (self.token_id,))
+                await db.commit()
+                logger.info("Rate limit state cleared from database")
+        except Exception as e:
+            logger.error(f"Error clearing rate limit from database: {e}")
+
+
+def token_fingerprint(token: str) -> str:
+    """bearer token 的短指纹，用于持久化和日志，不保存 token 本身"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()[:12]
+
+
+class BearerToken:
+    def __init__(self, token: str):
+        self.token_id = token_fingerprint(token)
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.scheduler = RateLimitScheduler(self.token_id)
+
+
+class TokenPool:
+    """
+    多个 bearer token 组成的额度池
+
+    每个 token 各自维护按接口的令牌桶，并按 token 持久化到 rate_limit_status；
+    每次请求分配给该接口当前可以调用且剩余额度最多的 token。某个 token 收到 429 只会让它在该接口上
+    退出轮换直到窗口重置，其他 token 照常服务，总轮询能力随 token 数量线性增长。
+    """
+
+    def __init__(self, tokens: List[str]):
+        tokens = list(dict.fromkeys(token for token in tokens if token))
+        if not tokens:
+            raise ValueError("At least one Twitter bearer token is required")
+        self.tokens = [BearerToken(token) for token in tokens]
+
+    def _pick(self, endpoint: str, now: float, reserve: float = 0.0) -> Tuple[Optional[BearerToken], Optional[float]]:
+        """可以立即调用的 token 中剩余额度最多的一个；都需要等待时返回 (None, 最短等待秒数)"""
+        best, best_key, min_wait = None, None, None
+        for token in self.tokens:
+            budget = token.scheduler.budget(endpoint)
+            wait = budget.wait_time(now)
+            if wait > 0:
+                min_wait = wait if min_wait is None else min(min_wait, wait)
+                continue
+            if reserve and budget.limit and budget.remaining is not None and budget.remaining <= budget.limit * reserve:
+                continue
+            # 尚未收到响应头的 token 视为额度充足；剩余额度相同时选最久未使用的，让调用均匀分布
+            remaining = budget.remaining if budget.remaining is not None else float('inf')
+            key = (remaining, -budget.last_grant)
+            if best is None or key > best_key:
+                best, best_key = token, key
+        return best, min_wait
+
+    async def acquire(self, endpoint: str) -> BearerToken:
+        """等待直到某个 token 在该接口有可用额度，占用一次并返回该 token"""
+        while True:
+            now = clock.now()
+            token, wait = self._pick(endpoint, now)
+            if token:
+                token.scheduler.consume(endpoint, now)
+                return token
+            if self.is_rate_limited(endpoint):
+                logger.warning(f"Rate limit exhausted for {endpoint} on all {len(self.tokens)} tokens, "
+                               f"waiting {int(wait)}s for reset")
+            await clock.sleep(wait)
+
+    def try_acquire(self, endpoint: str, reserve: float = 0.0) -> Optional[BearerToken]:
+        """不等待地尝试占用额度；reserve 为每个 token 需要为其他调用方保留的额度比例"""
+        now = clock.now()
+        token, _ = self._pick(endpoint, now, reserve)
+        if token:
+            token.scheduler.consume(endpoint, now)
+        return token
+
+    async def record_response(self, token: BearerToken, endpoint: str, headers: Mapping[str, str], status: int = 200):
+        await token.scheduler.record_response(endpoint, headers, status)
+        if status == 429 and len(self.tokens) > 1:
+            logger.warning(f"Token {token.token_id} taken out of rotation for {endpoint} until its window resets")
+        remaining = [t.scheduler.budgets[endpoint].remaining for t in self.tokens
+                     if endpoint in t.scheduler.budgets and t.scheduler.budgets[endpoint].remaining is not None]
+        if remaining:
+            TWITTER_RATE_LIMIT_REMAINING.labels(endpoint).set(sum(remaining))
+
+    def _endpoints(self) -> List[str]:
+        return list(dict.fromkeys(endpoint for token in self.tokens for endpoint in token.scheduler.budgets))
+
+    def is_rate_limited(self, endpoint: Optional[str] = None) -> bool:
+        """接口在所有 token 上都已耗尽才视为限流（未指定接口时任一接口全部耗尽即为限流）"""
+        endpoints = [endpoint] if endpoint else self._endpoints()
+        return any(all(token.scheduler.is_rate_limited(ep) for token in self.tokens) for ep in endpoints)
+
+    def get_reset_time(self, endpoint: Optional[str] = None) -> Optional[int]:
+        """限流接口距离第一个 token 恢复的秒数（未指定接口时取最长的一个）"""
+        waits = []
+        for ep in ([endpoint] if endpoint else self._endpoints()):
+            if not self.is_rate_limited(ep):
+                continue
+            resets = [token.scheduler.get_reset_time(ep) for token in self.tokens]
+            resets = [reset for reset in resets if reset is not None]
+            if resets:
+                waits.append(min(resets))
+        return max(waits) if waits else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """按接口汇总所有 token 的额度：limit/remaining 为合计，reset_seconds 为最早重置的 token"""
+        result = {}
+        for endpoint in self._endpoints():
+            budgets = [token.scheduler.budgets[endpoint].to_dict(clock.now())
+                       for token in self.tokens if endpoint in token.scheduler.budgets]
+            limits = [b['limit'] for b in budgets if b['limit'] is not None]
+            remaining = [b['remaining'] for b in budgets if b['remaining'] is not None]
+            resets = [b['reset_seconds'] for b in budgets if b['reset_seconds'] is not None]
+            result[endpoint] = {
+                'limit': sum(limits) if limits else None,
+                'remaining': sum(remaining) if remaining else None,
+                'reset_seconds': min(resets) if resets else None,
+                'tokens_available': sum(1 for token in self.tokens if not token.scheduler.is_rate_limited(endpoint))
+            }
+        return result
+
+    def token_snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """每个 token（以指纹标识）各接口的额度"""
+        return {token.token_id: token.scheduler.snapshot() for token in self.tokens}
+
+    async def load(self):
+        await asyncio.gather(*(token.scheduler.load() for token in self.tokens))
+
+    async def clear(self):
+        for token in self.tokens:
+            await token.scheduler.clear()
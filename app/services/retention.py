@@ -0,0 +1,320 @@
+import ast
+import asyncio
+import glob
+import gzip
+import json
+import logging
+import os
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.config import settings
+from app.models.database import get_db, transaction
+from app.services.metrics_tracker import prune_samples
+from app.services.notification_outbox import prune_delivered
+from app.services.sharding import LocalShardCoordinator
+from app.services.tweet_history import TWITTER_EPOCH_MS, snowflake_from_datetime
+from app.utils import clock
+from app.utils.metrics import TWEETS_ARCHIVED
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = 'tweets-'
+SEGMENT_SUFFIX = '.ndjson.gz'
+MIN_RETENTION_DAYS = 8  # 补齐和去重需要查询 recent search 范围（7 天）内的推文记录
+VACUUM_STEP_PAGES = 1000  # 每次 incremental_vacuum 释放的页数，分多次执行，不长时间占用连接
+
+ARCHIVE_COLUMNS = "tweet_id, username, content, tweet_url, created_at, metrics, simhash, duplicate_of"
+
+
+def tweet_day(tweet_id: int) -> date:
+    """雪花 ID 对应的发布日期（UTC）"""
+    timestamp = ((tweet_id >> 22) + TWITTER_EPOCH_MS) / 1000
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).date()
+
+
+def _day_start_id(day: date) -> int:
+    return snowflake_from_datetime(datetime(day.year, day.month, day.day, tzinfo=timezone.utc))
+
+
+def segment_path(archive_dir: str, day: date, first_id: int) -> str:
+    """归档段文件：每次清理为每一天新建一个段，按该段第一条推文的 ID 命名，已写入的段不再修改"""
+    return os.path.join(archive_dir, f"{SEGMENT_PREFIX}{day.isoformat()}-{first_id}{SEGMENT_SUFFIX}")
+
+
+def _segment_key(path: str) -> Tuple[str, int]:
+    """从文件名解析 (日期, 第一条推文ID)"""
+    name = os.path.basename(path)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+    day, _, first_id = name.rpartition('-')
+    return day, int(first_id)
+
+
+def list_segments(archive_dir: Optional[str] = None) -> List[str]:
+    """按日期和第一条推文ID排列的归档段"""
+    pattern = os.path.join(archive_dir or settings.ARCHIVE_DIR, f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")
+    return sorted(glob.glob(pattern), key=_segment_key)
+
+
+def archive_totals(archive_dir: Optional[str] = None) -> Tuple[int, int]:
+    """归档段的数量和总字节数（扫描目录，应在线程池中调用）"""
+    segments = list_segments(archive_dir)
+    return len(segments), sum(os.path.getsize(path) for path in segments)
+
+
+def parse_metrics(metrics: Optional[str]) -> Any:
+    """
+    互动数据以 str(dict) 保存（键为固定的英文名，值为整数），替换引号后按 JSON 解析，
+    比 ast.literal_eval 快一个数量级；格式不符时回退到 literal_eval，仍无法解析则保留原字符串
+    """
+    if not metrics:
+        return metrics
+    try:
+        return json.loads(metrics.replace("'", '"'))
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(metrics)
+    except (ValueError, SyntaxError):
+        return metrics
+
+
+def archive_record(row: Tuple) -> Dict[str, Any]:
+    """tweet_records 的一行转换为归档记录，互动数据解析为字典"""
+    tweet_id, username, content, tweet_url, created_at, metrics, simhash, duplicate_of = row
+    return {
+        'id': tweet_id,
+        'author': username,
+        'text': content,
+        'url': tweet_url,
+        'created_at': created_at,
+        'metrics': parse_metrics(metrics),
+        'simhash': simhash,
+        'duplicate_of': duplicate_of
+    }
+
+
+def _append_member(path: str, records: List[Dict[str, Any]]) -> Tuple[bool, int]:
+    """
+    把一批记录作为一个 gzip 成员追加到段文件并落盘；多个成员首尾相接仍是合法的 gzip 文件
+
+    返回 (是否新建了段文件, 写入的字节数)。
+    """
+    data = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records).encode('utf-8')
+    created = not os.path.exists(path)
+    compressed = gzip.compress(data)
+    with open(path, 'ab') as f:
+        f.write(compressed)
+        f.flush()
+        os.fsync(f.fileno())
+    return created, len(compressed)
+
+
+def read_archive(archive_dir: Optional[str] = None, author: Optional[str] = None,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """
+    逐条读取归档的推文，按日期从旧到新；只解压时间范围内的段，内存占用与归档大小无关
+
+    清理中途停止时同一批推文可能被归档两次，同一天内按推文 ID 去重；
+    写入中途断电造成的不完整末尾会被跳过（这部分推文尚未从数据库删除，下次清理会重新归档）。
+    """
+    lower = snowflake_from_datetime(since) if since else None
+    upper = snowflake_from_datetime(until) if until else None
+    first_day = since.astimezone(timezone.utc).date().isoformat() if since else None
+    last_day = until.astimezone(timezone.utc).date().isoformat() if until else None
+
+    current_day, seen = None, set()
+    for path in list_segments(archive_dir):
+        day, _ = _segment_key(path)
+        if (first_day and day < first_day) or (last_day and day > last_day):
+            continue
+        if day != current_day:
+            current_day, seen = day, set()
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    tweet_id = int(record['id'])
+                    if tweet_id in seen:
+                        continue
+                    seen.add(tweet_id)
+                    if author and record['author'] != author:
+                        continue
+                    if (lower is not None and tweet_id < lower) or (upper is not None and tweet_id >= upper):
+                        continue
+                    yield record
+        except (EOFError, gzip.BadGzipFile, zlib.error, json.JSONDecodeError) as e:
+            logger.warning(f"Skipping truncated archive segment tail {path}: {str(e)}")
+
+
+class RetentionService:
+    """
+    tweet_records 的保留策略：超过 RETENTION_DAYS 整天的推文移入压缩归档后删除
+
+    按推文 ID（随时间递增，走 idx_tweet_num 索引）从最旧的一天开始逐天处理：每批读出 RETENTION_BATCH_SIZE 行，
+    作为一个 gzip 成员追加到当天的归档段并 fsync，然后在一个短事务内删除这些行（全文索引由触发器同步删除）。
+    每批单独提交，监控的写入只需等待一批；归档先于删除落盘，中途停止不会丢失推文。
+    同一轮清理还会删除截止日期之前已投递的发件箱记录和互动采样（这两张表不归档，未投递的通知保留）。
+    删除后用 incremental_vacuum 分步把空闲页还给文件系统。多 worker 部署时只由持有 0 号分片的 worker 执行。
+    归档段的数量和大小在任务启动时扫描一次（线程池中），之后随写入累加，状态接口不访问文件系统。
+    """
+
+    def __init__(self, coordinator: Optional[LocalShardCoordinator] = None):
+        self.coordinator = coordinator or LocalShardCoordinator()
+        self.task: Optional[asyncio.Task] = None
+        self.last_run_at: Optional[float] = None
+        self.archived_rows = 0
+        self.pruned_rows = 0  # 删除的已投递通知和互动采样
+        self.archive_segments: Optional[int] = None  # 尚未扫描归档目录时为 None
+        self.archive_bytes: Optional[int] = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        logger.info(f"🗄️ 推文归档任务已启动（保留 {self.retention_days} 天）")
+        try:
+            await self.load_archive_totals()
+        except Exception as e:
+            logger.error(f"Error scanning archive directory: {str(e)}")
+        while True:
+            try:
+                if 0 in self.coordinator.shards:
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in retention job: {str(e)}")
+            await clock.sleep(settings.RETENTION_INTERVAL_SECONDS)
+
+    async def load_archive_totals(self):
+        """扫描归档目录，得到段的数量和总字节数"""
+        self.archive_segments, self.archive_bytes = await asyncio.to_thread(archive_totals, settings.ARCHIVE_DIR)
+
+    @property
+    def retention_days(self) -> int:
+        return max(settings.RETENTION_DAYS, MIN_RETENTION_DAYS)
+
+    def cutoff(self) -> date:
+        """早于该日期（UTC 零点）的推文被归档"""
+        return clock.utcnow().date() - timedelta(days=self.retention_days)
+
+    async def run_once(self) -> int:
+        """归档并删除截止日期之前的全部推文，返回处理的行数"""
+        cutoff_id = _day_start_id(self.cutoff())
+        await asyncio.to_thread(os.makedirs, settings.ARCHIVE_DIR, exist_ok=True)
+        total = 0
+        while True:
+            async with get_db() as db:
+                cursor = await db.execute(
+                    "SELECT MIN(CAST(tweet_id AS INTEGER)) FROM tweet_records WHERE CAST(tweet_id AS INTEGER) < ?",
+                    (cutoff_id,)
+                )
+                oldest = (await cursor.fetchone())[0]
+            if oldest is None:
+                break
+            day = tweet_day(oldest)
+            archived = await self._archive_day(day, oldest, min(_day_start_id(day + timedelta(days=1)), cutoff_id))
+            logger.info(f"🗄️ 已归档 {day.isoformat()} 的 {archived} 条推文")
+            total += archived
+
+        pruned = await self._prune(cutoff_id)
+        self.last_run_at = clock.now()
+        if total:
+            self.archived_rows += total
+        if total or pruned:
+            await self._vacuum()
+        return total
+
+    async def _prune(self, cutoff_id: int) -> int:
+        """删除截止日期之前已投递的发件箱记录和互动采样，这些表不归档，返回删除的行数"""
+        cutoff = self.cutoff()
+        before = datetime(cutoff.year, cutoff.month, cutoff.day, tzinfo=timezone.utc).timestamp()
+        delivered = await prune_delivered(before, settings.RETENTION_BATCH_SIZE)
+        samples = await prune_samples(cutoff_id, settings.RETENTION_BATCH_SIZE)
+        if delivered or samples:
+            logger.info(f"🗄️ 已删除 {delivered} 条已投递的通知和 {samples} 条互动采样")
+        self.pruned_rows += delivered + samples
+        return delivered + samples
+
+    async def _archive_day(self, day: date, first_id: int, end_id: int) -> int:
+        """把 [first_id, end_id) 内的推文分批写入当天的一个新归档段并删除"""
+        path = segment_path(settings.ARCHIVE_DIR, day, first_id)
+        archived = 0
+        after = first_id - 1
+        while True:
+            async with get_db() as db:
+                cursor = await db.execute(
+                    f"""SELECT {ARCHIVE_COLUMNS} FROM tweet_records
+                        WHERE CAST(tweet_id AS INTEGER) > ? AND CAST(tweet_id AS INTEGER) < ?
+                        ORDER BY CAST(tweet_id AS INTEGER) LIMIT ?""",
+                    (after, end_id, settings.RETENTION_BATCH_SIZE)
+                )
+                rows = await cursor.fetchall()
+            if not rows:
+                return archived
+
+            created, written = await asyncio.to_thread(_append_member, path, [archive_record(row) for row in rows])
+            if self.archive_segments is not None:
+                self.archive_segments += int(created)
+                self.archive_bytes += written
+            tweet_ids = [row[0] for row in rows]
+            async with transaction() as db:
+                await db.execute(
+                    "DELETE FROM tweet_records WHERE tweet_id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(tweet_ids),)
+                )
+            archived += len(rows)
+            TWEETS_ARCHIVED.inc(len(rows))
+            after = int(tweet_ids[-1])
+
+    async def _vacuum(self):
+        """
+        把删除后的空闲页还给文件系统
+
+        新建的数据库启用了 auto_vacuum=INCREMENTAL；之前创建的数据库首次清理时执行一次完整的 VACUUM 完成转换，
+        期间监控的写入需要等待。
+        """
+        async with get_db() as db:
+            cursor = await db.execute("PRAGMA auto_vacuum")
+            mode = (await cursor.fetchone())[0]
+            if mode != 2:
+                logger.warning("Converting database to incremental auto-vacuum with a full VACUUM, "
+                               "writes are blocked until it finishes")
+                await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                await db.execute("VACUUM")
+                return
+
+        freed = 0
+        while True:
+            async with get_db() as db:
+                cursor = await db.execute("PRAGMA freelist_count")
+                free_pages = (await cursor.fetchone())[0]
+                if not free_pages:
+                    break
+                cursor = await db.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})")
+                await cursor.fetchall()
+                freed += min(free_pages, VACUUM_STEP_PAGES)
+        async with get_db() as db:
+            await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        logger.info(f"Reclaimed {freed} free database pages")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'enabled': settings.RETENTION_DAYS > 0,
+            'retention_days': self.retention_days if settings.RETENTION_DAYS > 0 else None,
+            'last_run_at': self.last_run_at,
+            'archived_rows': self.archived_rows,
+            'pruned_rows': self.pruned_rows,
+            'archive_segments': self.archive_segments,
+            'archive_bytes': self.archive_bytes
+        }
@@ -0,0 +1,170 @@
+import json
+import logging
+import re
+from collections import deque
+from typing import Dict, List, Optional, Set, Any
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GROUP = 'default'
+WILDCARD = '*'
+
+
+class AhoCorasick:
+    """多关键词匹配自动机：一次扫描文本即可找出所有命中的关键词，耗时与关键词数量无关"""
+
+    def __init__(self, keywords: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Set[int]] = [set()]
+
+        for index, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                state = next_state
+            self.output[state].add(index)
+
+        # BFS 构建失败指针
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] |= self.output[self.fail[next_state]]
+
+    def search(self, text: str) -> Set[int]:
+        """返回文本中出现过的关键词下标"""
+        found: Set[int] = set()
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+class RoutingRule:
+    def __init__(self, group: str, accounts: List[str], keywords: List[str], patterns: List[str]):
+        self.group = group
+        self.accounts = [account.lower() for account in accounts] or [WILDCARD]
+        self.keywords = [keyword.lower() for keyword in keywords if keyword]
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+
+    @property
+    def unfiltered(self) -> bool:
+        return not self.keywords and not self.patterns
+
+
+class RuleEngine:
+    """
+    把订阅规则编译为一次性匹配的结构
+
+    - 所有关键词编译进一个 Aho-Corasick 自动机，命中的关键词直接映射到规则；
+    - 所有正则合并为一个预筛选正则，未命中时跳过逐条正则检查；
+    - 账号到规则的索引按作者预先分组，只检查订阅了该作者的规则。
+    """
+
+    def __init__(self, rules: List[RoutingRule]):
+        self.rules = rules
+        keywords: List[str] = []
+        self._keyword_rules: List[Set[int]] = []
+        keyword_index: Dict[str, int] = {}
+        for rule_id, rule in enumerate(rules):
+            for keyword in rule.keywords:
+                if keyword not in keyword_index:
+                    keyword_index[keyword] = len(keywords)
+                    keywords.append(keyword)
+                    self._keyword_rules.append(set())
+                self._keyword_rules[keyword_index[keyword]].add(rule_id)
+        self._automaton = AhoCorasick(keywords)
+
+        compiled = [pattern for rule in rules for pattern in rule.patterns]
+        patterns = [pattern.pattern for pattern in compiled]
+        self._has_patterns = bool(patterns)
+        self._combined = None
+        if any(pattern.groups for pattern in compiled):
+            # 合并后捕获组重新编号，编号反向引用会指向其他规则的分组，预筛选可能漏掉本应匹配的推文
+            logger.info("Routing patterns contain capture groups, checking them one by one")
+        elif patterns:
+            try:
+                self._combined = re.compile('|'.join(f'(?:{p})' for p in patterns), re.IGNORECASE)
+            except re.error as e:
+                # 个别正则带有无法合并的内联标志时，退化为逐条检查
+                logger.warning(f"Cannot combine routing patterns, checking them one by one: {e}")
+
+        # 作者 -> 不带过滤条件的分组 / 带关键词的规则 / 带正则的规则
+        self._unfiltered: Dict[str, Set[str]] = {}
+        self._keyworded: Dict[str, Set[int]] = {}
+        self._patterned: Dict[str, List[int]] = {}
+        for rule_id, rule in enumerate(rules):
+            for account in rule.accounts:
+                if rule.unfiltered:
+                    self._unfiltered.setdefault(account, set()).add(rule.group)
+                if rule.keywords:
+                    self._keyworded.setdefault(account, set()).add(rule_id)
+                if rule.patterns:
+                    self._patterned.setdefault(account, []).append(rule_id)
+
+    def match(self, author: str, text: str) -> Set[str]:
+        """返回应接收该推文的分组名称"""
+        author = author.lower()
+        groups = set(self._unfiltered.get(author, ())) | self._unfiltered.get(WILDCARD, set())
+
+        keyworded = self._keyworded.get(author, set()) | self._keyworded.get(WILDCARD, set())
+        if keyworded:
+            for keyword_id in self._automaton.search(text.lower()):
+                for rule_id in self._keyword_rules[keyword_id] & keyworded:
+                    groups.add(self.rules[rule_id].group)
+
+        if self._has_patterns and (self._combined is None or self._combined.search(text)):
+            for rule_id in self._patterned.get(author, []) + self._patterned.get(WILDCARD, []):
+                rule = self.rules[rule_id]
+                if rule.group not in groups and any(pattern.search(text) for pattern in rule.patterns):
+                    groups.add(rule.group)
+
+        return groups
+
+
+def load_routing_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    读取分组订阅配置；未配置 NOTIFY_RULES_FILE 时所有推文发送到 WECHAT_WEBHOOK_URL
+
+    配置格式:
+    {"groups": [{"name": "A", "webhook_url": "https://...",
+                 "rules": [{"accounts": ["x"], "keywords": ["发布"], "patterns": ["v\\\\d+"]}]}]}
+    """
+    path = path or settings.NOTIFY_RULES_FILE
+    if not path:
+        return {'groups': [{'name': DEFAULT_GROUP, 'webhook_url': settings.WECHAT_WEBHOOK_URL,
+                            'rules': [{'accounts': [WILDCARD]}]}]}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_rule_engine(config: Dict[str, Any]) -> RuleEngine:
+    rules = []
+    for group in config.get('groups', []):
+        for rule in group.get('rules', []):
+            rules.append(RoutingRule(
+                group=group['name'],
+                accounts=rule.get('accounts', []),
+                keywords=rule.get('keywords', []),
+                patterns=rule.get('patterns', [])
+            ))
+    logger.info(f"Compiled {len(rules)} routing rules for {len(config.get('groups', []))} groups")
+    return RuleEngine(rules)
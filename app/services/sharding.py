@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import os
+import socket
+import zlib
+from typing import Dict, List, Optional, Set
+from app.config import settings
+from app.models.database import transaction
+from app.utils import clock
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(username: str, shard_count: int) -> int:
+    """账号所属的分片：对小写用户名取 CRC32，所有 worker 计算结果一致"""
+    return zlib.crc32(username.lower().encode('utf-8')) % shard_count
+
+
+def fair_share(shard_count: int, workers: List[str], worker_id: str) -> int:
+    """按 worker ID 排序平均分配分片，余数分给排在前面的 worker；各 worker 的份额之和等于分片总数"""
+    if worker_id not in workers:
+        workers = sorted(workers + [worker_id])
+    index = workers.index(worker_id)
+    share, extra = divmod(shard_count, len(workers))
+    return share + (1 if index < extra else 0)
+
+
+def default_worker_id() -> str:
+    return settings.WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LocalShardCoordinator:
+    """单进程部署：本 worker 负责全部账号，不需要协调"""
+
+    is_distributed = False
+
+    def __init__(self, worker_id: Optional[str] = None, shard_count: Optional[int] = None):
+        self.worker_id = worker_id or default_worker_id()
+        self.shard_count = shard_count or settings.SHARD_COUNT
+        self.shards: Set[int] = set(range(self.shard_count))
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def owned_accounts(self, usernames: List[str]) -> List[str]:
+        return list(usernames)
+
+    def status(self) -> Dict:
+        return {
+            'backend': 'local',
+            'worker_id': self.worker_id,
+            'shards': len(self.shards),
+            'shard_count': self.shard_count
+        }
+
+
+class SQLiteShardCoordinator(LocalShardCoordinator):
+    """
+    通过共享 SQLite 数据库协调多个 worker：账号按哈希分到固定数量的分片，每个分片同一时间只有一个租约持有者
+
+    每个心跳周期在一个事务内：写入本 worker 的心跳，按存活 worker 数计算公平份额，
+    释放超出份额的分片，认领无主或租约已过期的分片，并为持有的分片续约。
+    worker 停止心跳超过 SHARD_LEASE_SECONDS 后其分片租约过期，由其他 worker 在下一次心跳时接管；
+    本地同样按租约到期时间判断，心跳失败的 worker 在租约到期后停止轮询，不会与接管者同时负责同一账号。
+    交接瞬间若有两个 worker 检测到同一条推文，发件箱的 (tweet_id, target) 唯一约束保证只通知一次。
+    """
+
+    is_distributed = True
+
+    def __init__(self, worker_id: Optional[str] = None, shard_count: Optional[int] = None):
+        super().__init__(worker_id, shard_count)
+        self.shards = set()
+        self.lease_until = 0.0
+        self.live_workers: List[str] = []
+        self.task: Optional[asyncio.Task] = None
+        self._shard_cache: Dict[str, int] = {}
+
+    async def start(self):
+        """写入第一次心跳并认领分片，然后在后台定期续约"""
+        async with transaction() as db:
+            await db.executemany(
+                "INSERT OR IGNORE INTO shard_leases (shard) VALUES (?)",
+                [(shard,) for shard in range(self.shard_count)]
+            )
+        await self.heartbeat()
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止续约并立即释放全部分片，其他 worker 下一次心跳即可接管"""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        try:
+            async with transaction() as db:
+                await db.execute(
+                    "UPDATE shard_leases SET owner = NULL, lease_until = NULL WHERE owner = ?",
+                    (self.worker_id,)
+                )
+                await db.execute("DELETE FROM worker_heartbeats WHERE worker_id = ?", (self.worker_id,))
+            logger.info(f"Worker {self.worker_id} released {len(self.shards)} shards")
+        except Exception as e:
+            logger.error(f"Error releasing shard leases: {str(e)}")
+        self.shards = set()
+        self.lease_until = 0.0
+
+    async def _run(self):
+        while True:
+            await clock.sleep(settings.SHARD_HEARTBEAT_SECONDS)
+            try:
+                await self.heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error renewing shard leases: {str(e)}")
+
+    async def heartbeat(self):
+        now = clock.now()
+        lease_until = now + settings.SHARD_LEASE_SECONDS
+        # 事务的第一条语句就是写入，直接获取写锁（受 busy_timeout 保护），之后的读取不会与其他 worker 交错
+        async with transaction() as db:
+            await db.execute(
+                """INSERT INTO worker_heartbeats (worker_id, heartbeat_at, started_at) VALUES (?, ?, ?)
+                   ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at""",
+                (self.worker_id, now, now)
+            )
+            # 长时间没有心跳的 worker 记录只用于状态展示，过久的直接清理
+            await db.execute(
+                "DELETE FROM worker_heartbeats WHERE heartbeat_at < ?",
+                (now - settings.SHARD_LEASE_SECONDS * 10,)
+            )
+            cursor = await db.execute(
+                "SELECT worker_id FROM worker_heartbeats WHERE heartbeat_at >= ? ORDER BY worker_id",
+                (now - settings.SHARD_LEASE_SECONDS,)
+            )
+            workers = [row[0] for row in await cursor.fetchall()]
+            share = fair_share(self.shard_count, workers, self.worker_id)
+
+            cursor = await db.execute(
+                "SELECT shard FROM shard_leases WHERE owner = ? AND shard < ? ORDER BY shard",
+                (self.worker_id, self.shard_count)
+            )
+            owned = [row[0] for row in await cursor.fetchall()]
+            if len(owned) > share:
+                # 新 worker 加入后份额变小：释放编号最大的分片，由份额不足的 worker 认领
+                await db.executemany(
+                    "UPDATE shard_leases SET owner = NULL, lease_until = NULL WHERE shard = ? AND owner = ?",
+                    [(shard, self.worker_id) for shard in owned[share:]]
+                )
+                owned = owned[:share]
+            elif len(owned) < share:
+                cursor = await db.execute(
+                    """UPDATE shard_leases SET owner = ?, lease_until = ?
+                       WHERE shard IN (
+                           SELECT shard FROM shard_leases
+                           WHERE shard < ? AND (owner IS NULL OR lease_until < ?)
+                           ORDER BY shard LIMIT ?
+                       )
+                       RETURNING shard""",
+                    (self.worker_id, lease_until, self.shard_count, now, share - len(owned))
+                )
+                owned.extend(row[0] for row in await cursor.fetchall())
+            await db.execute(
+                "UPDATE shard_leases SET lease_until = ? WHERE owner = ?",
+                (lease_until, self.worker_id)
+            )
+
+        acquired = set(owned) - self.shards
+        released = self.shards - set(owned)
+        if acquired or released or workers != self.live_workers:
+            logger.info(f"Worker {self.worker_id}: {len(workers)} live workers, owning {len(owned)} shards "
+                        f"(+{len(acquired)} / -{len(released)})")
+        self.shards = set(owned)
+        self.lease_until = lease_until
+        self.live_workers = workers
+
+    def owned_accounts(self, usernames: List[str]) -> List[str]:
+        """本 worker 当前负责的账号；租约已过期（心跳失败）时返回空列表"""
+        if clock.now() > self.lease_until:
+            return []
+        owned = []
+        for username in usernames:
+            shard = self._shard_cache.get(username)
+            if shard is None:
+                shard = self._shard_cache[username] = shard_of(username, self.shard_count)
+            if shard in self.shards:
+                owned.append(username)
+        return owned
+
+    def status(self) -> Dict:
+        return {
+            'backend': 'sqlite',
+            'worker_id': self.worker_id,
+            'shards': len(self.shards),
+            'shard_count': self.shard_count,
+            'live_workers': self.live_workers,
+            'lease_seconds_left': max(0, int(self.lease_until - clock.now()))
+        }
+
+
+def build_shard_coordinator(worker_id: Optional[str] = None) -> LocalShardCoordinator:
+    """按 SHARDING_BACKEND 创建分片协调器"""
+    if settings.SHARDING_BACKEND == 'sqlite':
+        return SQLiteShardCoordinator(worker_id)
+    if settings.SHARDING_BACKEND != 'local':
+        logger.warning(f"Unknown SHARDING_BACKEND {settings.SHARDING_BACKEND!r}, falling back to local")
+    return LocalShardCoordinator(worker_id)
@@ -0,0 +1,126 @@
+import asyncio
+import csv
+import io
+import itertools
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from app.models.database import get_db
+from app.services.retention import ARCHIVE_COLUMNS, archive_record, read_archive, tweet_day
+from app.services.tweet_history import snowflake_from_datetime
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 1000  # 每批读取的行数，每批单独查询，导出期间监控的写入最多等待一批
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+CSV_COLUMNS = ['id', 'author', 'text', 'url', 'created_at', 'metrics', 'simhash', 'duplicate_of']
+
+
+def _records(rows: List[Tuple]) -> List[Dict[str, Any]]:
+    return [archive_record(row) for row in rows]
+
+
+async def iter_tweet_batches(author: Optional[str] = None, since: Optional[datetime] = None,
+                             until: Optional[datetime] = None,
+                             batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    按推文 ID 从旧到新分批读取 tweet_records，记录格式与归档相同
+
+    按 ID 做 keyset 分页（走 idx_tweet_num / idx_username_tweet_num 索引），每批的代价与导出进度无关；
+    每批是一次独立的查询，批次之间释放数据库连接，导出大量数据时不会长时间占用连接或读快照；
+    行的转换在线程池中进行，不阻塞事件循环。
+    """
+    lower = snowflake_from_datetime(since) if since else None
+    upper = snowflake_from_datetime(until) if until else None
+    after = lower - 1 if lower is not None else -1
+
+    conditions = ["CAST(tweet_id AS INTEGER) > ?"]
+    params: List[Any] = []
+    if author:
+        conditions.append("username = ?")
+        params.append(author)
+    if upper is not None:
+        conditions.append("CAST(tweet_id AS INTEGER) < ?")
+        params.append(upper)
+    sql = f"""SELECT {ARCHIVE_COLUMNS} FROM tweet_records WHERE {' AND '.join(conditions)}
+              ORDER BY CAST(tweet_id AS INTEGER) LIMIT ?"""
+
+    while True:
+        async with get_db() as db:
+            cursor = await db.execute(sql, [after] + params + [batch_size])
+            rows = await cursor.fetchall()
+        if not rows:
+            return
+        yield await asyncio.to_thread(_records, rows)
+        if len(rows) < batch_size:
+            return
+        after = int(rows[-1][0])
+
+
+async def iter_archive_batches(author: Optional[str] = None, since: Optional[datetime] = None,
+                               until: Optional[datetime] = None,
+                               batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+    """分批读取归档的推文，解压在线程池中进行，不阻塞事件循环"""
+    records = read_archive(author=author, since=since, until=until)
+    while True:
+        batch = await asyncio.to_thread(list, itertools.islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def format_ndjson(records: List[Dict[str, Any]]) -> str:
+    return ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+
+def format_csv(records: List[Dict[str, Any]], header: bool = False) -> str:
+    """互动数据以 JSON 字符串写入 metrics 列"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    for record in records:
+        metrics = record['metrics']
+        writer.writerow([
+            record['id'], record['author'], record['text'], record['url'], record['created_at'],
+            json.dumps(metrics, ensure_ascii=False) if isinstance(metrics, dict) else metrics,
+            record['simhash'], record['duplicate_of']
+        ])
+    return buffer.getvalue()
+
+
+async def export_tweets(fmt: str = 'ndjson', author: Optional[str] = None, since: Optional[datetime] = None,
+                        until: Optional[datetime] = None, include_archive: bool = False,
+                        batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[str]:
+    """
+    按 NDJSON 或 CSV 逐批生成导出内容，供 StreamingResponse 发送，内存占用只与批大小有关；
+    序列化在线程池中进行，导出期间事件循环仍能及时处理监控任务
+
+    include_archive 时先输出归档中的推文（都早于数据库中的推文），再输出数据库中的推文。
+    归档任务删除一批推文前会先写入归档，导出与归档同时进行时这一批可能在两边都读到；
+    归档按日期从旧到新处理，这样的推文只会出现在归档的最后一天，按这一天的推文 ID 去重。
+    """
+    formatter = format_csv if fmt == 'csv' else format_ndjson
+    if fmt == 'csv':
+        yield format_csv([], header=True)
+
+    last_day: Optional[date] = None
+    archived_ids: Set[int] = set()
+    if include_archive:
+        async for batch in iter_archive_batches(author, since, until, batch_size):
+            for record in batch:
+                tweet_id = int(record['id'])
+                day = tweet_day(tweet_id)
+                if day != last_day:
+                    last_day, archived_ids = day, set()
+                archived_ids.add(tweet_id)
+            yield await asyncio.to_thread(formatter, batch)
+
+    async for batch in iter_tweet_batches(author, since, until, batch_size):
+        if archived_ids:
+            batch = [record for record in batch if int(record['id']) not in archived_ids]
+        yield await asyncio.to_thread(formatter, batch)
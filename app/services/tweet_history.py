@@ -0,0 +1,99 @@
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from app.models.database import get_db
+
+logger = logging.getLogger(__name__)
+
+TWITTER_EPOCH_MS = 1288834974657  # 雪花 ID 的起始时间
+MIN_TERM_LENGTH = 3  # trigram 分词下短于 3 个字符的词（如“发布”）无法使用索引，改用 LIKE 过滤
+
+
+def snowflake_from_datetime(value: datetime) -> int:
+    """时间点对应的最小推文 ID，时间范围可以直接换算为 ID 范围"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return max(0, int(value.timestamp() * 1000) - TWITTER_EPOCH_MS) << 22
+
+
+def _phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def build_match_query(keywords: str) -> Tuple[Optional[str], List[str]]:
+    """
+    把空格分隔的关键词转换为查询条件，每个词按字面子串匹配，全部命中才返回
+
+    返回 (FTS5 查询, LIKE 模式列表)：不少于 3 个字符的词走全文索引，较短的词在索引结果上用 LIKE 过滤。
+    """
+    terms = keywords.split()
+    if not terms:
+        raise ValueError("Search keywords are empty")
+    indexed = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    short = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+    match_query = ' '.join(_phrase(term) for term in indexed) or None
+    patterns = ['%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%' for term in short]
+    return match_query, patterns
+
+
+async def search_tweets(keywords: Optional[str] = None, author: Optional[str] = None,
+                        since: Optional[datetime] = None, until: Optional[datetime] = None,
+                        before_id: Optional[int] = None, limit: int = 50) -> Dict[str, Any]:
+    """
+    按关键词、作者和时间范围检索历史推文，结果按推文 ID 从新到旧排列
+
+    使用 before_id 做 keyset 分页：下一页传入上一页返回的 next_before_id，
+    每页的代价只与 limit 有关，与翻到第几页无关。
+    """
+    lower = snowflake_from_datetime(since) if since else None
+    upper = snowflake_from_datetime(until) if until else None
+    if before_id is not None:
+        upper = before_id if upper is None else min(upper, before_id)
+
+    conditions: List[str] = []
+    params: List[Any] = []
+    match_query, patterns = build_match_query(keywords) if keywords else (None, [])
+    if match_query:
+        match_query = f"content : ({match_query})"
+        if author and len(author) >= MIN_TERM_LENGTH:
+            # 作者名按子串预筛选，再由 r.username 精确比较
+            match_query += f" AND username : {_phrase(author)}"
+        key = "f.rowid"
+        source = "tweet_fts f JOIN tweet_records r ON r.tweet_id = CAST(f.rowid AS TEXT)"
+        conditions.append("tweet_fts MATCH ?")
+        params.append(match_query)
+    else:
+        # 只有短关键词时按 ID 从新到旧扫描，命中常见词很快，罕见的短词会退化为全表扫描
+        key = "CAST(r.tweet_id AS INTEGER)"
+        source = "tweet_records r"
+    for pattern in patterns:
+        conditions.append("r.content LIKE ? ESCAPE '\\'")
+        params.append(pattern)
+    if author:
+        conditions.append("r.username = ?")
+        params.append(author)
+    if lower is not None:
+        conditions.append(f"{key} >= ?")
+        params.append(lower)
+    if upper is not None:
+        conditions.append(f"{key} < ?")
+        params.append(upper)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    async with get_db() as db:
+        cursor = await db.execute(
+            f"""SELECT r.tweet_id, r.username, r.content, r.tweet_url, r.created_at
+                FROM {source} {where}
+                ORDER BY {key} DESC LIMIT ?""",
+            params + [limit]
+        )
+        rows = await cursor.fetchall()
+
+    tweets = [
+        {'id': tweet_id, 'author': username, 'text': content, 'url': tweet_url, 'created_at': created_at}
+        for tweet_id, username, content, tweet_url, created_at in rows
+    ]
+    return {
+        'tweets': tweets,
+        'next_before_id': tweets[-1]['id'] if len(tweets) == limit else None
+    }
@@ -1,201 +1,489 @@
-import tweepy
+import aiohttp
 import asyncio
+import json
 import logging
+import re
 import time
-from typing import List, Dict, Optional
-from datetime import datetime, timezone
+from typing import AsyncIterator, List, Dict, Optional, Any, Tuple
 from app.config import settings
 from app.models.database import get_db
+from app.models.tweet import Tweet, Media
+from app.services.rate_limiter import TokenPool, BearerToken
+from app.utils import clock
+from app.utils.metrics import TWITTER_REQUEST_SECONDS, TWITTER_REQUESTS
 
 logger = logging.getLogger(__name__)
 
+TWEET_FIELDS = ['created_at', 'text', 'public_metrics', 'attachments']
+MEDIA_FIELDS = ['type', 'url', 'preview_image_url', 'alt_text']
+
+# 速率限制按接口独立计算，以下名称同时作为 rate_limit_status 表中的 endpoint 键
+ENDPOINT_USERS_LOOKUP = '/2/users/by'
+ENDPOINT_USER_TWEETS = '/2/users/:id/tweets'
+ENDPOINT_SEARCH_RECENT = '/2/tweets/search/recent'
+ENDPOINT_USERS_ME = '/2/users/me'
+ENDPOINT_TWEETS_LOOKUP = '/2/tweets'
+ENDPOINT_STREAM = '/2/tweets/search/stream'
+ENDPOINT_STREAM_RULES = '/2/tweets/search/stream/rules'
+USERS_LOOKUP_BATCH_SIZE = 100  # /2/users/by 每次最多查询 100 个用户名
+TWEETS_LOOKUP_BATCH_SIZE = 100  # /2/tweets 每次最多查询 100 条推文
+SEARCH_QUERY_SUFFIX = ' -is:retweet -is:reply'  # 与时间线模式一致，排除转推和回复
+
+
+def build_search_query(usernames: List[str]) -> str:
+    """生成 (from:a OR from:b ...) 形式的 recent search 查询"""
+    return f"({' OR '.join(f'from:{username}' for username in usernames)}){SEARCH_QUERY_SUFFIX}"
+
+
+def search_members(query: str) -> List[str]:
+    """build_search_query 生成的查询中包含的用户名"""
+    return re.findall(r'from:(\w+)', query)
+
+
+def build_search_shards(usernames: List[str], max_length: int) -> List[List[str]]:
+    """将用户名列表切分成若干组，每组生成的查询不超过 max_length"""
+    shards: List[List[str]] = []
+    current: List[str] = []
+    for username in usernames:
+        if current and len(build_search_query(current + [username])) > max_length:
+            shards.append(current)
+            current = []
+        current.append(username)
+    if current:
+        shards.append(current)
+    return shards
+
+
+class TwitterAPIError(Exception):
+    """Twitter API 返回非 200 状态码"""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(f"{status} {message}")
+        self.status = status
+        self.headers = headers or {}
+
+
+class TooManyRequests(TwitterAPIError):
+    pass
+
+
+class Forbidden(TwitterAPIError):
+    pass
+
+
+class NotFound(TwitterAPIError):
+    pass
+
+
 class TwitterService:
-    def __init__(self):
-        self.client = tweepy.Client(
-            bearer_token=settings.TWITTER_BEARER_TOKEN,
-            wait_on_rate_limit=False  # 不要阻塞等待，而是抛出异常
-        )
-        self.rate_limited_until = None
+    def __init__(self, bearer_tokens: Optional[List[str]] = None):
+        self.api_base_url = settings.TWITTER_API_BASE_URL.rstrip('/')
+        # 共享的 aiohttp 会话（连接池），首次请求时创建；Authorization 头按请求分配的 token 设置
+        self._session: Optional[aiohttp.ClientSession] = None
+        # bearer token 池：每个 token 按接口记录速率限制预算（由响应头驱动），请求分配给剩余额度最多的 token
+        self.rate_limiter = TokenPool(bearer_tokens or settings.twitter_bearer_tokens_list)
         self.user_id_cache = {}  # 缓存用户ID，避免重复API调用
-        self.api_call_count = 0  # API调用计数器
-        self.last_api_reset = time.time()  # 最后一次重置计数器的时间
+        self.user_id_resolved_at: Dict[str, float] = {}  # 用户ID的解析时间，用于判断是否过期
         # 初始化时从数据库加载速率限制状态
-        asyncio.create_task(self._load_rate_limit_from_db())
+        asyncio.create_task(self.rate_limiter.load())
         
-    async def _load_rate_limit_from_db(self):
-        """从数据库加载速率限制状态"""
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的 HTTP 会话，复用 keep-alive 连接"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.TWITTER_HTTP_POOL_SIZE,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=settings.TWITTER_REQUEST_TIMEOUT_SECONDS)
+            )
+        return self._session
+
+    async def close(self):
+        """关闭共享的 HTTP 会话"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, endpoint: str, path: str, params: Optional[Dict[str, Any]] = None,
+                       token: Optional[BearerToken] = None, method: str = 'GET',
+                       json_body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        发送请求到 Twitter API v2，不阻塞事件循环
+
+        调用前从 token 池等待该接口的额度（调用方已通过 try_acquire 占用额度时传入 token）；
+        池分配的 token 收到 429 后退出轮换，只要还有其他 token 未耗尽就立即换一个重试。
+        """
+        query = self._query(params)
+        session = self._get_session()
+        while True:
+            selected = token or await self.rate_limiter.acquire(endpoint)
+            started = time.perf_counter()
+            try:
+                async with session.request(method, f"{self.api_base_url}{path}", params=query,
+                                           json=json_body, headers=selected.headers) as response:
+                    try:
+                        payload = await response.json(content_type=None)
+                    except (aiohttp.ContentTypeError, ValueError):
+                        payload = {}
+            except Exception:
+                TWITTER_REQUESTS.labels(endpoint, 'error').inc()
+                raise
+            finally:
+                TWITTER_REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+            TWITTER_REQUESTS.labels(endpoint, response.status).inc()
+            await self.rate_limiter.record_response(selected, endpoint, response.headers, response.status)
+            if response.status == 429 and token is None and not self.rate_limiter.is_rate_limited(endpoint):
+                continue
+            break
+
+        if response.status in (200, 201):
+            return payload or {}
+        self._raise_for_status(response, payload)
+
+    @staticmethod
+    def _query(params: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """去掉值为 None 的参数，列表参数用逗号连接"""
+        query = {}
+        for key, value in (params or {}).items():
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                value = ','.join(str(v) for v in value)
+            query[key] = str(value)
+        return query
+
+    @staticmethod
+    def _raise_for_status(response: aiohttp.ClientResponse, payload: Optional[Dict[str, Any]]):
+        """按状态码抛出对应的 TwitterAPIError 子类"""
+        headers = dict(response.headers)
+        message = (payload or {}).get('detail') or (payload or {}).get('title') or response.reason
+        if response.status == 429:
+            raise TooManyRequests(response.status, message, headers)
+        if response.status in (401, 403):
+            raise Forbidden(response.status, message, headers)
+        if response.status == 404:
+            raise NotFound(response.status, message, headers)
+        raise TwitterAPIError(response.status, message, headers)
+
+    async def is_rate_limited(self) -> bool:
+        """检查是否有接口处于速率限制状态（供外部调用）"""
+        return self.rate_limiter.is_rate_limited()
+
+    def get_rate_limit_reset_time(self) -> Optional[int]:
+        """获取速率限制重置时间（秒）"""
+        return self.rate_limiter.get_reset_time()
+
+    async def clear_rate_limit(self):
+        """手动清除所有接口的速率限制状态"""
+        await self.rate_limiter.clear()
+
+    async def load_user_id_cache(self):
+        """启动时一次查询加载所有已解析的用户ID"""
         try:
             async with get_db() as db:
-                cursor = await db.execute(
-                    "SELECT rate_limited_until FROM rate_limit_status ORDER BY id DESC LIMIT 1"
-                )
-                row = await cursor.fetchone()
-                if row and row[0]:
-                    current_time = time.time()
-                    if row[0] > current_time:
-                        self.rate_limited_until = row[0]
-                        logger.info(f"Loaded rate limit state: {int(row[0] - current_time)}s remaining")
-                    else:
-                        # 清理过期的速率限制记录
-                        await self._clear_rate_limit_in_db()
+                cursor = await db.execute("SELECT username, user_id, resolved_at FROM twitter_users")
+                rows = await cursor.fetchall()
+            for username, user_id, resolved_at in rows:
+                self.user_id_cache[username] = user_id
+                self.user_id_resolved_at[username] = resolved_at
+            logger.info(f"Loaded {len(rows)} cached user IDs from database")
         except Exception as e:
-            logger.error(f"Error loading rate limit from database: {e}")
+            logger.error(f"Error loading user ID cache from database: {e}")
 
-    async def _save_rate_limit_to_db(self, rate_limited_until: float):
-        """保存速率限制状态到数据库"""
+    async def _save_user_ids(self, resolved: Dict[str, str], resolved_at: float):
+        """保存解析结果到数据库"""
         try:
             async with get_db() as db:
-                # 先清理旧记录
-                await db.execute("DELETE FROM rate_limit_status")
-                # 插入新记录
-                await db.execute(
-                    "INSERT INTO rate_limit_status (rate_limited_until) VALUES (?)",
-                    (rate_limited_until,)
+                await db.executemany(
+                    "INSERT OR REPLACE INTO twitter_users (username, user_id, resolved_at) VALUES (?, ?, ?)",
+                    [(username, user_id, resolved_at) for username, user_id in resolved.items()]
                 )
                 await db.commit()
-                logger.info(f"Rate limit state saved to database")
         except Exception as e:
-            logger.error(f"Error saving rate limit to database: {e}")
+            logger.error(f"Error saving user IDs to database: {e}")
 
-    async def _clear_rate_limit_in_db(self):
-        """清理数据库中的速率限制状态"""
-        try:
-            async with get_db() as db:
-                await db.execute("DELETE FROM rate_limit_status")
-                await db.commit()
-                logger.info("Rate limit state cleared from database")
-        except Exception as e:
-            logger.error(f"Error clearing rate limit from database: {e}")
-
-    async def _check_rate_limit(self):
-        """检查是否处于速率限制状态"""
-        if self.rate_limited_until:
-            if time.time() < self.rate_limited_until:
-                return True
-            else:
-                self.rate_limited_until = None
-                await self._clear_rate_limit_in_db()
-        return False
+    async def resolve_user_ids(self, usernames: List[str]) -> Dict[str, str]:
+        """批量解析用户名到用户ID，只请求缓存中没有或已过期的用户名"""
+        now = clock.now()
+        ttl = settings.USER_ID_CACHE_TTL_HOURS * 3600
+        pending = [
+            username for username in usernames
+            if username not in self.user_id_cache
+            or now - self.user_id_resolved_at.get(username, 0) > ttl
+        ]
 
-    async def is_rate_limited(self) -> bool:
-        """检查是否处于速率限制状态（供外部调用）"""
-        return await self._check_rate_limit()
+        if pending:
+            for start in range(0, len(pending), USERS_LOOKUP_BATCH_SIZE):
+                batch = pending[start:start + USERS_LOOKUP_BATCH_SIZE]
+                try:
+                    response = await self._request(ENDPOINT_USERS_LOOKUP, "/2/users/by", {'usernames': batch})
+                except TooManyRequests:
+                    logger.warning("Rate limit exceeded while resolving user IDs")
+                    break
+                except Exception as e:
+                    logger.error(f"Error resolving user IDs: {str(e)}")
+                    break
 
-    def get_rate_limit_reset_time(self) -> Optional[int]:
-        """获取速率限制重置时间（秒）"""
-        if self.rate_limited_until:
-            import time
-            remaining = max(0, int(self.rate_limited_until - time.time()))
-            return remaining
-        return None
-
-    def _track_api_call(self):
-        """跟踪API调用数量"""
-        current_time = time.time()
-        # 每15分钟重置计数器
-        if current_time - self.last_api_reset > 900:  # 15分钟
-            self.api_call_count = 0
-            self.last_api_reset = current_time
-
-        self.api_call_count += 1
-        logger.info(f"API调用计数: {self.api_call_count} (Free Tier: 1次/15分钟限制)")
-
-    async def get_user_tweets(self, username: str, since_id: Optional[str] = None) -> List[Dict]:
-        # 如果处于速率限制状态，直接返回空列表
-        if await self._check_rate_limit():
-            logger.warning(f"Rate limited, skipping request for {username}")
-            return []
+                # API 返回的用户名大小写可能与配置不同
+                requested = {username.lower(): username for username in batch}
+                resolved = {}
+                for user in response.get('data', []):
+                    username = requested.get(user['username'].lower())
+                    if username:
+                        resolved[username] = user['id']
+                for error in response.get('errors', []):
+                    logger.error(f"User {error.get('value')} not found: {error.get('detail')}")
 
-        try:
-            # 直接通过用户名获取推文，减少API调用
-            # 先获取用户信息和推文（但只在必要时获取用户ID）
-            user_id = self.user_id_cache.get(username)
+                self.user_id_cache.update(resolved)
+                self.user_id_resolved_at.update({username: now for username in resolved})
+                if resolved:
+                    await self._save_user_ids(resolved, now)
+                logger.info(f"Resolved {len(resolved)}/{len(batch)} user IDs in one lookup")
+
+        return {username: self.user_id_cache[username] for username in usernames if username in self.user_id_cache}
+
+    async def fetch_user_tweets_page(self, username: str, since_id: Optional[str] = None,
+                                     until_id: Optional[str] = None, pagination_token: Optional[str] = None,
+                                     max_results: int = 5,
+                                     token: Optional[BearerToken] = None) -> Tuple[List[Tweet], Optional[str]]:
+        """获取用户时间线 (since_id, until_id) 区间内的一页推文（从新到旧），返回 (推文, next_token)；出错时抛出异常"""
+        # 用户ID通常在启动时已批量解析，这里只处理新增的用户名
+        user_id = self.user_id_cache.get(username)
+        if not user_id:
+            user_id = (await self.resolve_user_ids([username])).get(username)
             if not user_id:
-                # 只在缓存中没有时才调用获取用户API
-                self._track_api_call()  # 跟踪API调用
-                user = self.client.get_user(username=username)
-                if not user.data:
-                    logger.error(f"User {username} not found")
-                    return []
-                user_id = user.data.id
-                self.user_id_cache[username] = user_id
-                logger.info(f"Cached user ID for {username}: {user_id}")
-                # 在用户ID获取后增加延迟
-                await asyncio.sleep(8)
-
-            # 获取用户推文
-            self._track_api_call()  # 跟踪API调用
-            tweets = self.client.get_users_tweets(
-                id=user_id,
-                max_results=5,  # 减少每次获取的推文数量
-                since_id=since_id,
-                tweet_fields=['created_at', 'text', 'public_metrics', 'attachments'],
-                expansions=['attachments.media_keys'],
-                media_fields=['type', 'url', 'preview_image_url', 'alt_text'],
-                exclude=['retweets', 'replies']
-            )
+                raise NotFound(404, f"User ID for {username} could not be resolved")
+
+        # 额度不足时在 _request 中等待，只阻塞该接口
+        response = await self._request(
+            ENDPOINT_USER_TWEETS,
+            f"/2/users/{user_id}/tweets",
+            {
+                'max_results': max_results,
+                'since_id': since_id,
+                'until_id': until_id,
+                'pagination_token': pagination_token,
+                'tweet.fields': TWEET_FIELDS,
+                'expansions': ['attachments.media_keys'],
+                'media.fields': MEDIA_FIELDS,
+                'exclude': ['retweets', 'replies']
+            },
+            token=token
+        )
+        return self._parse_tweets(response, username), response.get('meta', {}).get('next_token')
+
+    async def poll_user_tweets(self, username: str, since_id: Optional[str] = None) -> Tuple[List[Tweet], Optional[bool]]:
+        """实时轮询：获取 since_id 之后最新的一页推文，返回 (推文, 是否还有更早的未取回推文)；请求失败时为 ([], None)"""
+        try:
+            tweets, next_token = await self.fetch_user_tweets_page(username, since_id)
+            return tweets, next_token is not None
 
-            # 在推文获取后增加延迟，避免连续API请求
-            await asyncio.sleep(5)
-
-            if not tweets.data:
-                return []
-            
-            # 处理媒体数据
-            media_dict = {}
-            if tweets.includes and 'media' in tweets.includes:
-                for media in tweets.includes['media']:
-                    media_dict[media.media_key] = {
-                        'type': media.type,
-                        'url': getattr(media, 'url', None),
-                        'preview_image_url': getattr(media, 'preview_image_url', None),
-                        'alt_text': getattr(media, 'alt_text', None)
-                    }
-
-            tweet_list = []
-            for tweet in tweets.data:
-                # 处理附件媒体
-                media_attachments = []
-                if hasattr(tweet, 'attachments') and tweet.attachments and 'media_keys' in tweet.attachments:
-                    for media_key in tweet.attachments['media_keys']:
-                        if media_key in media_dict:
-                            media_attachments.append(media_dict[media_key])
-
-                tweet_data = {
-                    'id': tweet.id,
-                    'text': tweet.text,
-                    'created_at': tweet.created_at.isoformat(),
-                    'author': username,
-                    'url': f"https://twitter.com/{username}/status/{tweet.id}",
-                    'media': media_attachments,
-                    'metrics': {
-                        'retweets': tweet.public_metrics['retweet_count'],
-                        'likes': tweet.public_metrics['like_count'],
-                        'replies': tweet.public_metrics['reply_count'],
-                        'quotes': tweet.public_metrics['quote_count']
-                    }
-                }
-                tweet_list.append(tweet_data)
-            
-            return tweet_list
-            
-        except tweepy.TooManyRequests as e:
+        except TooManyRequests as e:
             logger.warning(f"Rate limit exceeded for user {username} - API调用过于频繁")
-            # 设置速率限制状态（等待API重置后重试）
-            self.rate_limited_until = time.time() + 15 * 60
-            await self._save_rate_limit_to_db(self.rate_limited_until)
-            return []
-        except tweepy.Forbidden as e:
+            return [], None
+        except Forbidden as e:
             logger.error(f"Access forbidden for user {username}: {str(e)}")
-            return []
-        except tweepy.NotFound as e:
+            return [], None
+        except NotFound as e:
             logger.error(f"User {username} not found: {str(e)}")
-            return []
+            return [], None
         except Exception as e:
             logger.error(f"Error fetching tweets for {username}: {str(e)}")
+            return [], None
+
+    async def get_user_tweets(self, username: str, since_id: Optional[str] = None) -> List[Tweet]:
+        tweets, _ = await self.poll_user_tweets(username, since_id)
+        return tweets
+
+    async def fetch_search_page(self, query: str, since_id: Optional[str] = None, until_id: Optional[str] = None,
+                                next_token: Optional[str] = None,
+                                token: Optional[BearerToken] = None) -> Tuple[List[Tweet], Optional[str]]:
+        """recent search 在 (since_id, until_id) 区间内的一页结果（从新到旧），返回 (推文, next_token)；出错时抛出异常"""
+        response = await self._request(
+            ENDPOINT_SEARCH_RECENT,
+            "/2/tweets/search/recent",
+            {
+                'query': query,
+                'max_results': 100,
+                'since_id': since_id,
+                'until_id': until_id,
+                'next_token': next_token,
+                'tweet.fields': TWEET_FIELDS + ['author_id'],
+                'expansions': ['attachments.media_keys', 'author_id'],
+                'media.fields': MEDIA_FIELDS,
+                'user.fields': ['username']
+            },
+            token=token
+        )
+        return self._parse_tweets(response), response.get('meta', {}).get('next_token')
+
+    async def poll_search(self, query: str, since_id: Optional[str] = None) -> Tuple[List[Tweet], Optional[bool]]:
+        """
+        实时轮询：用一条 recent search 查询同时获取多个用户的最新推文，author 字段取自返回的用户信息
+
+        返回 (推文, 是否还有更早的未取回推文)；请求失败时为 ([], None)。
+        """
+        try:
+            tweets, next_token = await self.fetch_search_page(query, since_id)
+            return tweets, next_token is not None
+
+        except TooManyRequests as e:
+            logger.warning("Rate limit exceeded for search - API调用过于频繁")
+            return [], None
+        except Exception as e:
+            logger.error(f"Error searching tweets: {str(e)}")
+            return [], None
+
+    async def search_recent_tweets(self, query: str, since_id: Optional[str] = None) -> List[Tweet]:
+        tweets, _ = await self.poll_search(query, since_id)
+        return tweets
+
+    async def lookup_tweet_metrics(self, tweet_ids: List[int], reserve: float = 0.0) -> Optional[Dict[int, Dict[str, int]]]:
+        """
+        批量查询推文的最新互动数据（最多 100 条），返回 {推文ID: metrics}
+
+        低优先级调用：不等待额度，剩余额度不足 reserve 比例时直接返回 None；
+        已删除或不可见的推文不会出现在结果中。
+        """
+        token = self.rate_limiter.try_acquire(ENDPOINT_TWEETS_LOOKUP, reserve)
+        if token is None:
+            return None
+        try:
+            response = await self._request(
+                ENDPOINT_TWEETS_LOOKUP,
+                "/2/tweets",
+                {
+                    'ids': tweet_ids[:TWEETS_LOOKUP_BATCH_SIZE],
+                    'tweet.fields': ['public_metrics']
+                },
+                token=token
+            )
+        except TooManyRequests:
+            logger.warning("Rate limit exceeded for tweets lookup - 暂停互动数据采样")
+            return None
+        except Exception as e:
+            logger.error(f"Error looking up tweet metrics: {str(e)}")
+            return None
+
+        results = {}
+        for tweet in response.get('data', []):
+            public_metrics = tweet.get('public_metrics', {})
+            results[int(tweet['id'])] = {
+                'retweets': public_metrics.get('retweet_count', 0),
+                'likes': public_metrics.get('like_count', 0),
+                'replies': public_metrics.get('reply_count', 0),
+                'quotes': public_metrics.get('quote_count', 0)
+            }
+        return results
+
+    async def get_stream_rules(self) -> List[Dict[str, str]]:
+        """filtered stream 当前生效的规则（id、value、tag）"""
+        response = await self._request(ENDPOINT_STREAM_RULES, "/2/tweets/search/stream/rules")
+        return response.get('data', [])
+
+    async def update_stream_rules(self, add: Optional[List[Dict[str, str]]] = None,
+                                  delete_ids: Optional[List[str]] = None) -> List[Dict[str, str]]:
+        """添加和删除 filtered stream 规则，返回新建成功的规则；被拒绝的规则记录日志后跳过"""
+        created = []
+        if add:
+            response = await self._request(ENDPOINT_STREAM_RULES, "/2/tweets/search/stream/rules",
+                                           method='POST', json_body={'add': add})
+            created = response.get('data', [])
+            for error in response.get('errors', []):
+                logger.error(f"Stream rule rejected: {error.get('value')} - {error.get('title')}")
+        if delete_ids:
+            await self._request(ENDPOINT_STREAM_RULES, "/2/tweets/search/stream/rules",
+                                method='POST', json_body={'delete': {'ids': delete_ids}})
+        return created
+
+    async def stream_tweets(self, stall_seconds: float) -> AsyncIterator[List[Tweet]]:
+        """
+        连接 filtered stream，逐行读取推送的推文
+
+        连接建立后先产出一个空列表，之后每收到一条推文产出一次，收到心跳（空行）时产出空列表。
+        超过 stall_seconds 没有收到任何数据时抛出 asyncio.TimeoutError；服务端关闭连接时正常结束。
+        """
+        query = self._query({
+            'tweet.fields': TWEET_FIELDS + ['author_id'],
+            'expansions': ['attachments.media_keys', 'author_id'],
+            'media.fields': MEDIA_FIELDS,
+            'user.fields': ['username']
+        })
+        token = await self.rate_limiter.acquire(ENDPOINT_STREAM)
+        # 长连接不受单次请求的总超时限制，是否中断由心跳判断
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=settings.TWITTER_REQUEST_TIMEOUT_SECONDS)
+        try:
+            async with self._get_session().get(f"{self.api_base_url}/2/tweets/search/stream", params=query,
+                                               headers=token.headers, timeout=timeout) as response:
+                TWITTER_REQUESTS.labels(ENDPOINT_STREAM, response.status).inc()
+                # 连接数超限（上一条连接尚未被服务端清理）同样返回 429，但连接额度没有用完，不阻塞该接口
+                status = response.status
+                if status == 429 and int(response.headers.get('x-rate-limit-remaining') or 0) > 0:
+                    status = 200
+                await self.rate_limiter.record_response(token, ENDPOINT_STREAM, response.headers, status)
+                if response.status != 200:
+                    try:
+                        payload = await response.json(content_type=None)
+                    except (aiohttp.ContentTypeError, ValueError):
+                        payload = {}
+                    self._raise_for_status(response, payload)
+
+                yield []
+                while True:
+                    line = await clock.wait_for(response.content.readline(), stall_seconds)
+                    if not line:
+                        return
+                    line = line.strip()
+                    if not line:
+                        yield []
+                        continue
+                    message = json.loads(line)
+                    if 'data' in message:
+                        yield self._parse_tweets({'data': [message['data']], 'includes': message.get('includes', {})})
+                    else:
+                        # 运维断开等通知以 errors 形式推送，随后服务端关闭连接
+                        for error in message.get('errors', []):
+                            logger.warning(f"Filtered stream message: {error.get('title')} - {error.get('detail')}")
+                        yield []
+        except TwitterAPIError:
+            raise
+        except Exception:
+            TWITTER_REQUESTS.labels(ENDPOINT_STREAM, 'error').inc()
+            raise
+
+    def _parse_tweets(self, response: Dict[str, Any], username: Optional[str] = None) -> List[Tweet]:
+        """将 API v2 的 JSON 响应转换为 Tweet 列表；未指定 username 时按 author_id 查找作者"""
+        if not response.get('data'):
             return []
-    
-    async def get_multiple_users_tweets(self, usernames: List[str], since_ids: Optional[Dict[str, str]] = None) -> Dict[str, List[Dict]]:
+
+        authors = {user['id']: user['username'] for user in response.get('includes', {}).get('users', [])}
+
+        # 处理媒体数据
+        media_dict = {}
+        for media in response.get('includes', {}).get('media', []):
+            media_dict[media['media_key']] = Media(
+                media.get('type'),
+                media.get('url'),
+                media.get('preview_image_url'),
+                media.get('alt_text')
+            )
+
+        tweet_list = []
+        for tweet in response['data']:
+            author = username or authors.get(tweet.get('author_id'))
+            if not author:
+                continue
+            # 处理附件媒体
+            media_keys = (tweet.get('attachments') or {}).get('media_keys', [])
+            media_attachments = tuple(media_dict[key] for key in media_keys if key in media_dict)
+            tweet_list.append(Tweet.from_api(tweet, author, media_attachments))
+
+        return tweet_list
+
+    async def get_multiple_users_tweets(self, usernames: List[str], since_ids: Optional[Dict[str, str]] = None) -> Dict[str, List[Tweet]]:
         results = {}
         
         for username in usernames:
@@ -203,10 +491,6 @@ class TwitterService:
                 since_id = since_ids.get(username) if since_ids else None
                 tweets = await self.get_user_tweets(username, since_id)
                 results[username] = tweets
-                
-                # 在用户之间添加延迟避免过快请求
-                if len(usernames) > 1:
-                    await asyncio.sleep(5)  # 增加到5秒延迟
                     
             except Exception as e:
                 logger.error(f"Error processing user {username}: {str(e)}")
@@ -214,11 +498,10 @@ class TwitterService:
                 
         return results
     
-    def validate_credentials(self) -> bool:
+    async def validate_credentials(self) -> bool:
         try:
-            self._track_api_call()  # 跟踪API调用
-            me = self.client.get_me()
-            return me.data is not None
+            me = await self._request(ENDPOINT_USERS_ME, "/2/users/me")
+            return me.get('data') is not None
         except Exception as e:
             logger.error(f"Twitter credentials validation failed: {str(e)}")
             return False
\ No newline at end of file
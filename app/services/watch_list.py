@@ -0,0 +1,223 @@
+import asyncio
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.models.database import get_db, transaction
+from app.utils import clock
+
+logger = logging.getLogger(__name__)
+
+SOURCE_ENV = 'env'  # TWITTER_USERNAMES
+SOURCE_FILE = 'file'  # WATCHLIST_FILE
+SOURCE_API = 'api'  # POST /monitor/users
+
+USERNAME_RE = re.compile(r'^[A-Za-z0-9_]{1,15}$')
+
+# 可以通过 WATCHLIST_FILE 在运行时修改的配置项，下一轮轮询即生效
+RELOADABLE_SETTINGS = (
+    'CHECK_INTERVAL_SECONDS',
+    'POLLING_MODE',
+    'POLLING_STRATEGY',
+    'ADAPTIVE_MIN_INTERVAL_SECONDS',
+    'ADAPTIVE_MAX_INTERVAL_SECONDS',
+    'NOTIFY_DIGEST_WINDOW_SECONDS',
+    'NOTIFY_DIGEST_MAX_TWEETS',
+    'DEDUP_MAX_DISTANCE',
+    'METRICS_ALERT_LIKES',
+    'METRICS_ALERT_RETWEETS',
+)
+
+# 取值有限的配置项：未知取值会让监控静默回退到默认模式，热更新时直接拒绝
+SETTING_CHOICES = {
+    'POLLING_MODE': ('timeline', 'search'),
+    'POLLING_STRATEGY': ('round_robin', 'adaptive'),
+}
+
+
+def normalize_usernames(usernames: List[str], strict: bool = True) -> List[str]:
+    """去掉 @ 和空白并按大小写不敏感去重；不合法的用户名在 strict 时抛出 ValueError，否则跳过"""
+    result: Dict[str, str] = {}
+    for username in usernames:
+        username = username.strip().lstrip('@')
+        if not username:
+            continue
+        if not USERNAME_RE.match(username):
+            if strict:
+                raise ValueError(f"Invalid Twitter username: {username!r}")
+            logger.warning(f"Skipping invalid Twitter username: {username!r}")
+            continue
+        result.setdefault(username.lower(), username)
+    return list(result.values())
+
+
+def apply_settings(overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """在运行时修改白名单内的配置项，返回实际生效的修改"""
+    applied = {}
+    for key, value in overrides.items():
+        if key not in RELOADABLE_SETTINGS:
+            logger.warning(f"Setting {key} cannot be reloaded at runtime, ignored")
+            continue
+        current = getattr(settings, key)
+        value = type(current)(value)
+        choices = SETTING_CHOICES.get(key)
+        if choices and value not in choices:
+            logger.error(f"Invalid value for {key}: {value!r} (expected one of {', '.join(choices)}), ignored")
+            continue
+        if value != current:
+            setattr(settings, key, value)
+            applied[key] = value
+    if applied:
+        logger.info(f"Reloaded settings: {applied}")
+    return applied
+
+
+class WatchList:
+    """
+    持久化的监控账号列表（watched_users 表）
+
+    账号有三个来源：TWITTER_USERNAMES（启动时同步）、WATCHLIST_FILE（文件修改后同步）和管理接口。
+    内存中保存有序列表，修改时先写库再替换列表，调度器在下一轮读取 usernames 即可生效，
+    监控不需要停止，用户ID缓存、轮换位置和速率限制状态都保留。
+    多 worker 共用数据库时，其他进程的修改由后台任务通过 PRAGMA data_version 发现后重新加载。
+    """
+
+    def __init__(self):
+        self.usernames: List[str] = []
+        self.added_at: Dict[str, float] = {}  # 账号加入监控的时间，作为没有轮询游标时的起点
+        self.task: Optional[asyncio.Task] = None
+        self._file_mtime: Optional[float] = None
+        self._data_version: Optional[int] = None
+
+    async def load(self):
+        """同步 TWITTER_USERNAMES 和 WATCHLIST_FILE，然后从数据库加载完整列表"""
+        self._file_mtime = None
+        self._data_version = None
+        await self.sync_source(SOURCE_ENV, normalize_usernames(settings.twitter_usernames_list, strict=False))
+        await self._check_file()
+        await self._reload()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _run(self):
+        while True:
+            await clock.sleep(settings.WATCHLIST_RELOAD_SECONDS)
+            try:
+                await self._check_file()
+                async with get_db() as db:
+                    cursor = await db.execute("PRAGMA data_version")
+                    data_version = (await cursor.fetchone())[0]
+                if data_version != self._data_version:
+                    self._data_version = data_version
+                    await self._reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reloading watch list: {str(e)}")
+
+    async def _check_file(self):
+        """WATCHLIST_FILE 修改后同步其中的账号和配置"""
+        path = settings.WATCHLIST_FILE
+        if not path or not os.path.exists(path):
+            return
+        mtime = os.path.getmtime(path)
+        if mtime == self._file_mtime:
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        self._file_mtime = mtime
+        if isinstance(config, list):
+            config = {'usernames': config}
+        await self.sync_source(SOURCE_FILE, normalize_usernames(config.get('usernames', []), strict=False))
+        apply_settings(config.get('settings', {}))
+        logger.info(f"Loaded watch list file {path}")
+
+    async def _reload(self):
+        async with get_db() as db:
+            cursor = await db.execute("SELECT username, added_at FROM watched_users ORDER BY added_at, rowid")
+            rows = await cursor.fetchall()
+        usernames = [row[0] for row in rows]
+        self.added_at = {username: added_at for username, added_at in rows}
+        if usernames != self.usernames:
+            logger.info(f"Watch list updated: {len(usernames)} accounts")
+            self.usernames = usernames
+
+    async def add(self, usernames: List[str], source: str = SOURCE_API) -> List[str]:
+        """添加账号，返回此前不在列表中的账号"""
+        existing = {username.lower() for username in self.usernames}
+        added = [username for username in normalize_usernames(usernames) if username.lower() not in existing]
+        if added:
+            now = clock.now()
+            async with transaction() as db:
+                await db.executemany(
+                    "INSERT OR IGNORE INTO watched_users (username, source, added_at) VALUES (?, ?, ?)",
+                    [(username, source, now) for username in added]
+                )
+            await self._reload()
+        return added
+
+    async def remove(self, usernames: List[str]) -> List[str]:
+        """移除账号（不论来源），返回实际移除的账号；轮询游标保留，重新添加后从原进度继续"""
+        wanted = {username.lower() for username in normalize_usernames(usernames)}
+        removed = [username for username in self.usernames if username.lower() in wanted]
+        if removed:
+            async with transaction() as db:
+                await db.executemany("DELETE FROM watched_users WHERE username = ?", [(u,) for u in removed])
+            await self._reload()
+        return removed
+
+    async def sync_source(self, source: str, usernames: List[str]):
+        """使某个来源的账号与给定列表一致：补充缺少的，删除该来源中已不存在的"""
+        now = clock.now()
+        async with transaction() as db:
+            await db.execute(
+                """DELETE FROM watched_users
+                   WHERE source = ? AND username NOT IN (SELECT value FROM json_each(?))""",
+                (source, json.dumps(usernames))
+            )
+            await db.executemany(
+                "INSERT OR IGNORE INTO watched_users (username, source, added_at) VALUES (?, ?, ?)",
+                [(username, source, now) for username in usernames]
+            )
+        await self._reload()
+
+    async def details(self) -> List[Dict[str, Any]]:
+        """每个账号的来源、用户ID、上次检查和上次发现新推文的时间"""
+        async with get_db() as db:
+            cursor = await db.execute(
+                """SELECT w.username, w.source, w.added_at, u.user_id, c.since_id, c.last_polled_at, c.last_new_at
+                   FROM watched_users w
+                   LEFT JOIN twitter_users u ON u.username = w.username
+                   LEFT JOIN poll_cursors c ON c.username = w.username
+                   ORDER BY w.added_at, w.rowid"""
+            )
+            rows = await cursor.fetchall()
+        return [
+            {
+                'username': username,
+                'source': source,
+                'added_at': added_at,
+                'user_id': user_id,
+                'since_id': str(since_id) if since_id else None,
+                'last_check': last_polled_at,
+                'last_new_tweet': last_new_at,
+                'status': '正常' if last_polled_at else ('等待检查' if user_id else '未解析')
+            }
+            for username, source, added_at, user_id, since_id, last_polled_at, last_new_at in rows
+        ]
+
+
+watch_list = WatchList()
@@ -1,14 +1,142 @@
 import aiohttp
+import asyncio
+import hashlib
 import json
 import logging
-from typing import Optional, Dict, Any
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List, Tuple
 from app.config import settings
+from app.models.database import transaction
+from app.utils import clock
+from app.utils.metrics import WECHAT_SEND_SECONDS, WECHAT_SEND_FAILURES
 
 logger = logging.getLogger(__name__)
 
+ERRCODE_RATE_LIMITED = 45009  # 企业微信 webhook 频率超限
+MARKDOWN_MAX_BYTES = 4096  # markdown 消息内容上限（UTF-8 字节）
+
+def _truncate_bytes(content: str, max_bytes: int) -> str:
+    """按 UTF-8 字节数截断，不截断多字节字符"""
+    encoded = content.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return content
+    return encoded[:max_bytes - len('...')].decode('utf-8', errors='ignore') + '...'
+
 class WeChatService:
-    def __init__(self):
-        self.webhook_url = settings.WECHAT_WEBHOOK_URL
+    def __init__(self, webhook_url: Optional[str] = None):
+        self.webhook_url = webhook_url or settings.WECHAT_WEBHOOK_URL
+        # 整个服务生命周期内共享的 HTTP 会话（keep-alive），首次发送时创建
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # webhook 限制每分钟 20 条：记录最近一个窗口内的发送时间，超出时排队等待
+        self.rate_limit_per_minute = settings.WECHAT_RATE_LIMIT_PER_MINUTE
+        self.rate_window_seconds = 60.0
+        self._sent_times: deque = deque()
+        # 多 worker 部署时各进程发往同一个 webhook 的消息共用一个窗口，发送时间记录在共享数据库中
+        self.shared_budget = settings.SHARDING_BACKEND == 'sqlite'
+        self._webhook_key = hashlib.sha256((self.webhook_url or '').encode('utf-8')).hexdigest()[:16]
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=settings.WECHAT_MAX_CONCURRENCY, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=30),
+                headers={'Content-Type': 'application/json'}
+            )
+        return self._session
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.WECHAT_MAX_CONCURRENCY)
+        return self._semaphore
+
+    async def close(self):
+        """关闭共享的 HTTP 会话"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _wait_for_slot(self):
+        """滑动窗口限流：窗口内已满时等待最早的一条过期，而不是直接失败"""
+        if self.shared_budget:
+            await self._wait_for_shared_slot()
+            return
+        while True:
+            now = clock.monotonic()
+            while self._sent_times and now - self._sent_times[0] >= self.rate_window_seconds:
+                self._sent_times.popleft()
+            if len(self._sent_times) < self.rate_limit_per_minute:
+                self._sent_times.append(now)
+                return
+            await clock.sleep(self._sent_times[0] + self.rate_window_seconds - now)
+
+    async def _wait_for_shared_slot(self):
+        """
+        多个 worker 共用的滑动窗口：在一个事务内清理过期记录、检查窗口内的发送数并占用一个名额，
+        各进程发往同一个 webhook 的消息合计不超过 WECHAT_RATE_LIMIT_PER_MINUTE
+        """
+        while True:
+            now = clock.now()
+            # 事务的第一条语句就是写入，直接获取写锁，检查和占用名额不会与其他 worker 交错
+            async with transaction() as db:
+                await db.execute(
+                    "DELETE FROM webhook_sends WHERE webhook = ? AND sent_at <= ?",
+                    (self._webhook_key, now - self.rate_window_seconds)
+                )
+                cursor = await db.execute(
+                    "SELECT COUNT(*), MIN(sent_at) FROM webhook_sends WHERE webhook = ?", (self._webhook_key,)
+                )
+                count, oldest = await cursor.fetchone()
+                if count < self.rate_limit_per_minute:
+                    await db.execute(
+                        "INSERT INTO webhook_sends (webhook, sent_at) VALUES (?, ?)", (self._webhook_key, now)
+                    )
+                    return
+            await clock.sleep(oldest + self.rate_window_seconds - now)
+
+    async def _fill_window(self):
+        """服务端返回频率超限（计数与本地不一致）：占满当前窗口，下个窗口再发"""
+        if not self.shared_budget:
+            now = clock.monotonic()
+            self._sent_times.extend([now] * max(0, self.rate_limit_per_minute - len(self._sent_times)))
+            return
+        now = clock.now()
+        async with transaction() as db:
+            await db.execute(
+                "DELETE FROM webhook_sends WHERE webhook = ? AND sent_at <= ?",
+                (self._webhook_key, now - self.rate_window_seconds)
+            )
+            cursor = await db.execute("SELECT COUNT(*) FROM webhook_sends WHERE webhook = ?", (self._webhook_key,))
+            count = (await cursor.fetchone())[0]
+            await db.executemany(
+                "INSERT INTO webhook_sends (webhook, sent_at) VALUES (?, ?)",
+                [(self._webhook_key, now)] * max(0, self.rate_limit_per_minute - count)
+            )
+
+    async def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """在并发上限和频率限制内发送一次 webhook 请求；被服务端限流时排队后重试一次"""
+        async with self._get_semaphore():
+            for attempt in range(2):
+                await self._wait_for_slot()
+                started = time.perf_counter()
+                try:
+                    async with self._get_session().post(self.webhook_url, json=payload) as response:
+                        result = await response.json(content_type=None)
+                except Exception:
+                    WECHAT_SEND_FAILURES.labels('exception').inc()
+                    raise
+                finally:
+                    WECHAT_SEND_SECONDS.observe(time.perf_counter() - started)
+                if response.status == 200 and result.get('errcode') == ERRCODE_RATE_LIMITED and attempt == 0:
+                    logger.warning("WeChat webhook rate limited, queuing for the next window")
+                    await self._fill_window()
+                    continue
+                if response.status != 200:
+                    result = {'errcode': response.status, 'errmsg': result}
+                if result.get('errcode') != 0:
+                    WECHAT_SEND_FAILURES.labels(result.get('errcode')).inc()
+                return result
         
     async def send_message(self, content: str, mentioned_list: Optional[list] = None) -> bool:
         try:
@@ -22,20 +150,13 @@ class WeChatService:
             if mentioned_list:
                 payload["text"]["mentioned_list"] = mentioned_list
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.webhook_url,
-                    json=payload,
-                    headers={'Content-Type': 'application/json'}
-                ) as response:
-                    result = await response.json()
-                    
-                    if response.status == 200 and result.get('errcode') == 0:
-                        logger.info("WeChat message sent successfully")
-                        return True
-                    else:
-                        logger.error(f"WeChat message failed: {result}")
-                        return False
+            result = await self._post(payload)
+            if result.get('errcode') == 0:
+                logger.info("WeChat message sent successfully")
+                return True
+            else:
+                logger.error(f"WeChat message failed: {result}")
+                return False
                         
         except Exception as e:
             logger.error(f"Error sending WeChat message: {str(e)}")
@@ -50,30 +171,60 @@ class WeChatService:
                 }
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.webhook_url,
-                    json=payload,
-                    headers={'Content-Type': 'application/json'}
-                ) as response:
-                    result = await response.json()
-                    
-                    if response.status == 200 and result.get('errcode') == 0:
-                        logger.info("WeChat markdown sent successfully")
-                        return True
-                    else:
-                        logger.error(f"WeChat markdown failed: {result}")
-                        return False
+            result = await self._post(payload)
+            if result.get('errcode') == 0:
+                logger.info("WeChat markdown sent successfully")
+                return True
+            else:
+                logger.error(f"WeChat markdown failed: {result}")
+                return False
                         
         except Exception as e:
             logger.error(f"Error sending WeChat markdown: {str(e)}")
             return False
     
     async def send_tweet_notification(self, tweet_data: Dict[str, Any]) -> bool:
-        content = self._format_tweet_message(tweet_data)
+        # 互动阈值提醒带有 alert 字段，作为标题
+        heading = f"## {tweet_data['alert']}" if tweet_data.get('alert') else None
+        content = self._format_tweet_message(tweet_data, heading=heading)
         return await self.send_markdown(content)
     
-    def _format_tweet_message(self, tweet_data: Dict[str, Any]) -> str:
+    def build_digest_messages(self, tweets: List[Dict[str, Any]]) -> List[Tuple[str, List[int]]]:
+        """
+        将多条推文合并为若干条 markdown 消息，每条不超过 4096 字节
+
+        返回 (消息内容, 包含的推文下标) 列表，调用方据此逐条标记投递结果。
+        """
+        if len(tweets) == 1:
+            heading = f"## {tweets[0]['alert']}" if tweets[0].get('alert') else None
+            return [(_truncate_bytes(self._format_tweet_message(tweets[0], heading=heading), MARKDOWN_MAX_BYTES), [0])]
+
+        sections = [
+            self._format_tweet_message(
+                tweet_data, heading=f"### {tweet_data.get('alert') or '🐦 @' + tweet_data.get('author', 'Unknown')}"
+            )
+            for tweet_data in tweets
+        ]
+
+        def render(indices: List[int]) -> str:
+            header = f"## 🐦 {len(indices)} 条新推文" if len(indices) > 1 else None
+            body = "\n\n".join(sections[i] for i in indices)
+            return f"{header}\n\n{body}" if header else body
+
+        messages: List[Tuple[str, List[int]]] = []
+        current: List[int] = []
+        for i in range(len(sections)):
+            if current and len(render(current + [i]).encode('utf-8')) > MARKDOWN_MAX_BYTES:
+                messages.append((render(current), current))
+                current = []
+            current.append(i)
+        if current:
+            messages.append((render(current), current))
+
+        # 单条推文本身超长时截断
+        return [(_truncate_bytes(content, MARKDOWN_MAX_BYTES), indices) for content, indices in messages]
+
+    def _format_tweet_message(self, tweet_data: Dict[str, Any], heading: Optional[str] = None) -> str:
         username = tweet_data.get('author', 'Unknown')
         text = tweet_data.get('text', '')
         url = tweet_data.get('url', '')
@@ -82,7 +233,8 @@ class WeChatService:
 
         formatted_text = text[:200] + "..." if len(text) > 200 else text
 
-        message = f"""## 🐦 @{username} 发布了新推文
+        heading = heading or f"## 🐦 @{username} 发布了新推文"
+        message = f"""{heading}
 
 **内容**: {formatted_text}
 """
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class Clock:
+    """系统时钟：调度、限流和重试相关的时间都通过它获取，测试和仿真时可以替换"""
+
+    def now(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+    def real_seconds(self, seconds: float) -> float:
+        """一段时钟时间对应的真实等待时间"""
+        return seconds
+
+
+class AcceleratedClock(Clock):
+    """
+    加速时钟：虚拟时间以 speed 倍速流逝，sleep 只等待 1/speed 的真实时间
+
+    虚拟时间由事件循环的单调时间换算，所有协程看到的是同一条时间线；
+    真实 I/O（本地 HTTP、SQLite）耗费的时间同样会被放大 speed 倍。
+    """
+
+    def __init__(self, speed: float = 1000.0, start: Optional[float] = None):
+        self.speed = speed
+        self._start = time.time() if start is None else start
+        self._origin = time.monotonic()
+
+    def _elapsed(self) -> float:
+        return (time.monotonic() - self._origin) * self.speed
+
+    def now(self) -> float:
+        return self._start + self._elapsed()
+
+    def monotonic(self) -> float:
+        return self._elapsed()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(max(0.0, seconds) / self.speed)
+
+    def real_seconds(self, seconds: float) -> float:
+        return seconds / self.speed
+
+
+_clock: Clock = Clock()
+
+
+def set_clock(clock: Clock):
+    global _clock
+    _clock = clock
+
+
+def get_clock() -> Clock:
+    return _clock
+
+
+def now() -> float:
+    return _clock.now()
+
+
+def utcnow() -> datetime:
+    return datetime.fromtimestamp(_clock.now(), tz=timezone.utc)
+
+
+def monotonic() -> float:
+    return _clock.monotonic()
+
+
+async def sleep(seconds: float):
+    await _clock.sleep(seconds)
+
+
+async def wait_for(awaitable: Awaitable[T], timeout: Optional[float]) -> T:
+    """与 asyncio.wait_for 相同，超时时间按当前时钟换算"""
+    return await asyncio.wait_for(awaitable, None if timeout is None else _clock.real_seconds(timeout))
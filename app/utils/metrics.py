@@ -0,0 +1,206 @@
+import math
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 所有指标都只在事件循环线程内更新，不需要加锁；更新操作只是字典查找和数值加法
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (5, 10, 20, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600)
+
+_registry: List['_Metric'] = []
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        _registry.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """按标签值取子指标，首次使用时创建"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labelnames, key):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, ('le', _format_value(bound)))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labelnames, key, ('le', '+Inf'))} {self.count}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {self.count}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+
+def render_metrics() -> str:
+    """按 Prometheus 文本格式（0.0.4）输出所有指标"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+TWITTER_REQUEST_SECONDS = Histogram(
+    'twitter_request_duration_seconds', 'Twitter API request latency', ['endpoint']
+)
+TWITTER_REQUESTS = Counter(
+    'twitter_requests_total', 'Twitter API requests by HTTP status', ['endpoint', 'status']
+)
+TWITTER_RATE_LIMIT_REMAINING = Gauge(
+    'twitter_rate_limit_remaining', 'Remaining calls in the current rate limit window', ['endpoint']
+)
+POLL_CYCLE_SECONDS = Histogram(
+    'poll_cycle_duration_seconds', 'Duration of one polling cycle', ['mode']
+)
+DETECTION_LAG_SECONDS = Histogram(
+    'tweet_detection_lag_seconds', 'Delay between tweet creation and detection', ['username'], buckets=LAG_BUCKETS
+)
+TWEETS_DETECTED = Counter(
+    'tweets_detected_total', 'New tweets detected', ['username']
+)
+TWEETS_BACKFILLED = Counter(
+    'tweets_backfilled_total', 'Tweets recovered by paginated backfill', ['kind']
+)
+POLL_GAPS_OPEN = Gauge(
+    'poll_gaps_open', 'Polling gaps waiting for backfill'
+)
+STREAM_CONNECTED = Gauge(
+    'stream_connected', 'Whether the filtered stream connection is up (1) or polling is the fallback (0)'
+)
+STREAM_DISCONNECTS = Counter(
+    'stream_disconnects_total', 'Filtered stream connection failures and disconnects', ['reason']
+)
+TWEETS_ARCHIVED = Counter(
+    'tweets_archived_total', 'Tweet records moved from the database to the compressed archive'
+)
+WECHAT_SEND_SECONDS = Histogram(
+    'wechat_send_duration_seconds', 'WeChat webhook request latency'
+)
+WECHAT_SEND_FAILURES = Counter(
+    'wechat_send_failures_total', 'Failed WeChat webhook sends by errcode', ['reason']
+)
+DB_TRANSACTION_SECONDS = Histogram(
+    'db_transaction_duration_seconds', 'SQLite write duration (transactions and direct commits) including lock wait',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+OUTBOX_PENDING = Gauge(
+    'outbox_pending', 'Notifications waiting in the outbox'
+)
+PIPELINE_QUEUE_DEPTH = Gauge(
+    'pipeline_queue_depth', 'Batches waiting in front of a monitor pipeline stage', ['stage']
+)
+PIPELINE_TWEETS = Counter(
+    'pipeline_tweets_total', 'Tweets passed through a monitor pipeline stage', ['stage']
+)
+PIPELINE_STAGE_SECONDS = Histogram(
+    'pipeline_stage_duration_seconds', 'Time a monitor pipeline stage spends on one batch', ['stage']
+)
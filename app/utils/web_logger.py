@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+from app.config import settings
+
+LOG_FORMAT = "[%(asctime)s] %(levelname)s: %(message)s"
+DATE_FORMAT = "%H:%M:%S"
+HEARTBEAT_SECONDS = 15  # SSE 空闲时发送注释行保持连接
+
+_handler: Optional['RingBufferHandler'] = None
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    固定容量的环形日志缓冲区，每条日志带单调递增的序号
+
+    第 seq 条日志存放在 seq % capacity 位置，读取某个序号之后的日志只需访问新增部分，
+    内存占用不随运行时间增长。日志可能来自其他线程，写入和读取都持有 handler 自带的锁。
+    """
+
+    def __init__(self, capacity: int = 1000):
+        super().__init__()
+        self.capacity = capacity
+        self._buffer: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self.last_seq = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            text = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        self.last_seq += 1
+        self._buffer[self.last_seq % self.capacity] = {'seq': self.last_seq, 'text': text}
+        self._notify()
+
+    def _notify(self):
+        """唤醒正在等待新日志的订阅者：置位当前事件并换上新的事件"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        event, self._event = self._event, asyncio.Event()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            event.set()
+        else:
+            self._loop.call_soon_threadsafe(event.set)
+
+    def entries_after(self, after: int = 0) -> List[Dict[str, Any]]:
+        """返回序号大于 after 的日志；已被覆盖的旧日志不再返回"""
+        with self.lock:
+            first = max(after + 1, self.last_seq - self.capacity + 1, 1)
+            return [self._buffer[seq % self.capacity] for seq in range(first, self.last_seq + 1)]
+
+    def subscribe(self) -> asyncio.Event:
+        """返回下一条日志写入时会被置位的事件"""
+        with self.lock:
+            if self._loop is None:
+                self._loop = asyncio.get_running_loop()
+                self._event = asyncio.Event()
+            return self._event
+
+
+def setup_web_logging(capacity: Optional[int] = None) -> RingBufferHandler:
+    """在根 logger 上挂载环形缓冲区（重复调用只挂载一次）"""
+    global _handler
+    if _handler is None:
+        _handler = RingBufferHandler(capacity or settings.WEB_LOG_CAPACITY)
+        _handler.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+        logging.getLogger().addHandler(_handler)
+    return _handler
+
+
+def get_web_logs(after: int = 0) -> List[Dict[str, Any]]:
+    """获取序号大于 after 的日志，元素为 {'seq': 序号, 'text': 格式化后的日志}"""
+    return setup_web_logging().entries_after(after)
+
+
+def get_last_seq() -> int:
+    return setup_web_logging().last_seq
+
+
+async def stream_web_logs(after: int = 0) -> AsyncIterator[str]:
+    """以 SSE 格式持续输出新日志；客户端断开时由框架取消"""
+    handler = setup_web_logging()
+    while True:
+        event = handler.subscribe()
+        entries = handler.entries_after(after)
+        for entry in entries:
+            # 多行日志（如异常堆栈）每行单独一个 data 字段
+            data = '\n'.join(f"data: {line}" for line in entry['text'].splitlines() or [''])
+            yield f"id: {entry['seq']}\n{data}\n\n"
+        if entries:
+            after = entries[-1]['seq']
+            continue
+        try:
+            await asyncio.wait_for(event.wait(), timeout=HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            yield f": keepalive {datetime.now().strftime(DATE_FORMAT)}\n\n"
@@ -0,0 +1,92 @@
+"""
+自适应轮询模拟基准：用合成的发推轨迹比较 round_robin 与 adaptive 策略
+
+两种策略每个 tick 都只轮询一个账号，API 调用量完全相同，比较检测延迟。
+与服务启动时的顺序一致：先用模拟开始前 HISTORY_DAYS 天的推文学习活跃度（observe），再同步监控列表（sync）。
+
+用法: python benchmarks/bench_adaptive_polling.py [账号数] [模拟天数]
+"""
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.poll_scheduler import AdaptivePollScheduler
+
+TICK_SECONDS = 20
+DAY = 24 * 3600
+HISTORY_DAYS = 3  # 启动前已记录的推文，对应 _load_activity 读取的范围
+
+
+def generate_traces(accounts: int, duration: float, seed: int = 42):
+    """活跃度服从对数正态分布：少数账号每几分钟一条，多数账号几天一条；时间为负的推文发布于模拟开始前"""
+    rng = random.Random(seed)
+    traces = {}
+    for i in range(accounts):
+        per_day = min(300.0, rng.lognormvariate(0.5, 1.8))
+        posts, t = [], -HISTORY_DAYS * DAY + rng.expovariate(per_day / DAY)
+        while t < duration:
+            posts.append(t)
+            t += rng.expovariate(per_day / DAY)
+        traces[f"user{i:04d}"] = posts
+    return traces
+
+
+def simulate(traces, duration: float, strategy: str):
+    usernames = list(traces)
+    cursors = {name: 0 for name in usernames}
+    scheduler = AdaptivePollScheduler(
+        poll_interval=TICK_SECONDS, min_interval=60, max_interval=6 * 3600,
+        half_life=72 * 3600, prior_rate=1 / (7 * DAY)
+    )
+    for username in usernames:
+        while cursors[username] < len(traces[username]) and traces[username][cursors[username]] < 0:
+            scheduler.observe(username, traces[username][cursors[username]])
+            cursors[username] += 1
+    scheduler.sync(usernames, 0.0)
+    latencies, polls, index, now = [], 0, 0, 0.0
+
+    while now < duration:
+        if strategy == 'adaptive':
+            username = scheduler.next_account(now)
+        else:
+            username = usernames[index % len(usernames)]
+            index += 1
+
+        if username:
+            polls += 1
+            posts = traces[username]
+            while cursors[username] < len(posts) and posts[cursors[username]] <= now:
+                posted_at = posts[cursors[username]]
+                latencies.append(now - posted_at)
+                scheduler.observe(username, posted_at)
+                cursors[username] += 1
+        now += TICK_SECONDS
+
+    latencies.sort()
+    return {
+        'polls': polls,
+        'detected': len(latencies),
+        'median': statistics.median(latencies) if latencies else 0.0,
+        'p90': latencies[int(len(latencies) * 0.9)] if latencies else 0.0
+    }
+
+
+def main():
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    days = float(sys.argv[2]) if len(sys.argv) > 2 else 7
+    duration = days * DAY
+    traces = generate_traces(accounts, duration)
+    total = sum(1 for posts in traces.values() for posted_at in posts if posted_at >= 0)
+    print(f"{accounts} accounts, {days:g} days, {total} synthetic tweets, one poll per {TICK_SECONDS}s tick")
+
+    for strategy in ('round_robin', 'adaptive'):
+        result = simulate(traces, duration, strategy)
+        print(f"{strategy:>12}: polls={result['polls']} detected={result['detected']} "
+              f"median={result['median'] / 60:.1f}min p90={result['p90'] / 60:.1f}min")
+
+
+if __name__ == '__main__':
+    main()
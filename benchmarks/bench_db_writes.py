@@ -0,0 +1,101 @@
+"""
+推文写入基准：旧路径（每次操作新建连接、逐条提交）对比新路径（共享 WAL 连接、每轮一个事务 executemany）
+
+用法: python benchmarks/bench_db_writes.py [推文数] [每轮推文数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('TWITTER_BEARER_TOKEN', 'benchmark-token')
+os.environ.setdefault('WECHAT_WEBHOOK_URL', 'https://example.invalid/webhook')
+
+import aiosqlite
+
+INSERT_SQL = """INSERT OR IGNORE INTO tweet_records
+                (tweet_id, username, content, tweet_url, created_at, metrics)
+                VALUES (?, ?, ?, ?, ?, ?)"""
+
+
+def make_tweets(count: int, offset: int):
+    from app.models.tweet import Tweet
+    return [
+        Tweet(
+            1800000000000000000 + offset + i,
+            f"user{i % 50}",
+            f"synthetic tweet {offset + i} " * 4,
+            '2024-06-01T00:00:00+00:00',
+            1717200000.0
+        )
+        for i in range(count)
+    ]
+
+
+def row(tweet):
+    return (str(tweet.id), tweet.author, tweet.text, tweet.url, tweet.created_at, str(tweet.metrics))
+
+
+async def old_path(db_path: str, tweets):
+    """基线：与改造前一致，每条推文两次连接、两次提交"""
+    for tweet in tweets:
+        async with aiosqlite.connect(db_path) as db:
+            await db.execute(INSERT_SQL, row(tweet))
+            await db.commit()
+        async with aiosqlite.connect(db_path) as db:
+            await db.execute("UPDATE tweet_records SET updated_at = ? WHERE username = ? AND tweet_id = ?",
+                             ('now', tweet.author, str(tweet.id)))
+            await db.commit()
+
+
+async def new_path(tweets, per_cycle: int):
+    from app.services.monitor_service import MonitorService
+    from app.services.pipeline import PollBatch
+    from app.services.routing import load_routing_config, build_rule_engine
+    monitor = MonitorService.__new__(MonitorService)
+    rule_engine = build_rule_engine(load_routing_config())
+    for start in range(0, len(tweets), per_cycle):
+        batch = PollBatch(tweets[start:start + per_cycle], [])
+        for tweet in batch.tweets:
+            batch.cursors[tweet.author] = str(tweet.id)
+            batch.routed.extend((tweet, group) for group in rule_engine.match(tweet.author, tweet.text))
+        batch.polled_usernames = sorted(batch.cursors)
+        await monitor._save_poll_results(batch)
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    per_cycle = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    workdir = tempfile.mkdtemp()
+
+    # 旧路径：默认 rollback journal + synchronous=FULL
+    old_db = os.path.join(workdir, 'old.db')
+    from app.config import settings
+    settings.DATABASE_URL = f"sqlite:///{old_db}"
+    from app.models.database import init_db, close_db
+    await init_db()
+    await close_db()
+    async with aiosqlite.connect(old_db) as db:
+        await db.execute("PRAGMA journal_mode=DELETE")
+    start = time.perf_counter()
+    await old_path(old_db, make_tweets(count, 0))
+    old_elapsed = time.perf_counter() - start
+
+    settings.DATABASE_URL = f"sqlite:///{os.path.join(workdir, 'new.db')}"
+    await init_db()
+    start = time.perf_counter()
+    await new_path(make_tweets(count, 0), per_cycle)
+    new_elapsed = time.perf_counter() - start
+    await close_db()
+
+    print(f"{count} tweets, {per_cycle} per poll cycle")
+    print(f"old path (connection per write): {count / old_elapsed:10.0f} inserts/s")
+    print(f"new path (shared WAL, batched):  {count / new_elapsed:10.0f} inserts/s")
+    print(f"speedup: {old_elapsed / new_elapsed:.1f}x")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""
+事件循环延迟基准：在假 Twitter API 响应很慢时，测量其他协程（如 /health）的响应延迟
+
+用法: python benchmarks/bench_event_loop_latency.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('TWITTER_BEARER_TOKEN', 'benchmark-token')
+os.environ.setdefault('WECHAT_WEBHOOK_URL', 'https://example.invalid/webhook')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+
+from aiohttp import web
+
+SLOW_RESPONSE_SECONDS = 3.0
+
+
+async def slow_user_tweets(request: web.Request) -> web.Response:
+    await asyncio.sleep(SLOW_RESPONSE_SECONDS)
+    return web.json_response({
+        'data': [{
+            'id': '1800000000000000000',
+            'text': 'hello from the slow fake twitter',
+            'created_at': '2024-06-01T00:00:00.000Z',
+            'public_metrics': {'retweet_count': 0, 'like_count': 0, 'reply_count': 0, 'quote_count': 0}
+        }]
+    })
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """每 interval 秒醒来一次，返回观察到的最大调度延迟"""
+    max_lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        max_lag = max(max_lag, time.perf_counter() - start - interval)
+    return max_lag
+
+
+async def main():
+    app = web.Application()
+    app.router.add_get('/2/users/{user_id}/tweets', slow_user_tweets)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    from app.config import settings
+    settings.TWITTER_API_BASE_URL = f"http://127.0.0.1:{port}"
+    from app.models.database import init_db
+    from app.services.twitter_service import TwitterService
+
+    await init_db()
+    service = TwitterService()
+    service.user_id_cache['bench'] = '42'
+
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(stop))
+    start = time.perf_counter()
+    tweets = await service.get_user_tweets('bench')
+    elapsed = time.perf_counter() - start
+    stop.set()
+    max_lag = await beat
+
+    await service.close()
+    await runner.cleanup()
+
+    print(f"fetched {len(tweets)} tweet(s) in {elapsed:.2f}s (fake API delay {SLOW_RESPONSE_SECONDS}s)")
+    print(f"max event loop lag during fetch: {max_lag * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
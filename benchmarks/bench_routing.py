@@ -0,0 +1,82 @@
+"""
+分组路由基准：逐条规则检查（每条规则遍历关键词 / 正则）对比编译后的 RuleEngine
+
+用法: python benchmarks/bench_routing.py [推文数]
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('TWITTER_BEARER_TOKEN', 'benchmark-token')
+os.environ.setdefault('WECHAT_WEBHOOK_URL', 'https://example.invalid/webhook')
+
+from app.services.routing import RoutingRule, RuleEngine, WILDCARD
+
+WORDS = [f"word{i}" for i in range(5000)]
+ACCOUNTS = [f"user{i}" for i in range(500)]
+
+
+def make_rules(count: int, rng: random.Random):
+    rules = []
+    for i in range(count):
+        accounts = [WILDCARD] if i % 10 == 0 else rng.sample(ACCOUNTS, 3)
+        keywords = rng.sample(WORDS, 3) if i % 4 else []
+        patterns = [rf"v{i}\.\d+"] if i % 50 == 0 else []
+        rules.append(RoutingRule(f"group{i % 200}", accounts, keywords, patterns))
+    return rules
+
+
+def make_tweets(count: int, rng: random.Random):
+    return [
+        (rng.choice(ACCOUNTS), ' '.join(rng.choice(WORDS) for _ in range(30)))
+        for _ in range(count)
+    ]
+
+
+def naive_match(rules, author: str, text: str):
+    """基线：逐条规则检查账号、关键词和正则"""
+    author, lowered = author.lower(), text.lower()
+    groups = set()
+    for rule in rules:
+        if WILDCARD not in rule.accounts and author not in rule.accounts:
+            continue
+        if rule.unfiltered or any(k in lowered for k in rule.keywords) or \
+                any(p.search(text) for p in rule.patterns):
+            groups.add(rule.group)
+    return groups
+
+
+def main():
+    tweet_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = random.Random(42)
+    tweets = make_tweets(tweet_count, rng)
+
+    print(f"{tweet_count} tweets per run")
+    print(f"{'rules':>8} {'naive us/tweet':>16} {'engine us/tweet':>16} {'build ms':>10}")
+    for rule_count in (1000, 2000, 5000, 10000):
+        rules = make_rules(rule_count, rng)
+
+        start = time.perf_counter()
+        engine = RuleEngine(rules)
+        build_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = [naive_match(rules, author, text) for author, text in tweets]
+        naive_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = [engine.match(author, text) for author, text in tweets]
+        engine_elapsed = time.perf_counter() - start
+
+        # 关键词按子串匹配，两种实现结果必须一致
+        assert actual == expected, "RuleEngine result differs from naive matcher"
+        print(f"{rule_count:>8} {naive_elapsed / tweet_count * 1e6:>16.1f} "
+              f"{engine_elapsed / tweet_count * 1e6:>16.1f} {build_elapsed * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""
+端到端仿真基准：用假 Twitter API 和假企业微信 webhook 以加速时钟运行完整的 MonitorService，
+报告每个场景的送达延迟分位数、API 调用量和发送的消息数，便于在 CI 中比较调度策略的改动
+
+用法:
+    python benchmarks/bench_simulated_monitor.py [--hours 4] [--speed 1000] [--accounts N] [--workers N]
+        [--tokens N] [--scenario 名称 ...] [--cassette 录制文件.jsonl] [--json 结果.json]
+
+--workers N 在同一进程内启动 N 个 MonitorService，各自使用独立的 bearer token（假 API 按 token 计算额度），
+通过 SHARDING_BACKEND=sqlite 的分片租约分担账号，用于验证吞吐随 worker 数的扩展。
+--tokens N 为每个 worker 配置 N 个 bearer token；timeline_low_limit 场景的时间线接口额度很低，
+轮询受额度而不是检查间隔限制，用于验证轮询能力随 token 数的增长。
+timeline_burst 场景中每次轮询的新推文远多于一页，与 timeline_burst_no_backfill 对比分页补齐的效果。
+stream 场景通过 filtered stream 接收推文，stream_flaky 每小时断开一次并中断 10 分钟（期间回退到轮询），
+stream_unavailable 的套餐不支持 stream，始终轮询；与 search 场景对比延迟和 API 调用量。
+
+注意：本地 HTTP 和 SQLite 消耗的真实时间同样会被放大 speed 倍计入延迟，
+比较不同场景时应使用相同的 speed。
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('TWITTER_BEARER_TOKEN', 'benchmark-token')
+os.environ.setdefault('WECHAT_WEBHOOK_URL', 'https://example.invalid/webhook')
+
+from app.config import settings
+from app.utils import clock
+from app.utils.clock import AcceleratedClock
+from benchmarks.simulator.fake_twitter import FakeTwitterAPI
+from benchmarks.simulator.fake_wechat import FakeWeChatWebhook
+from benchmarks.simulator.traces import synthetic_trace, load_cassette
+
+SCENARIOS = {
+    'timeline_round_robin': {
+        'accounts': 50,
+        'settings': {'POLLING_MODE': 'timeline', 'POLLING_STRATEGY': 'round_robin', 'CHECK_INTERVAL_SECONDS': 20},
+    },
+    'timeline_adaptive': {
+        'accounts': 50,
+        'settings': {'POLLING_MODE': 'timeline', 'POLLING_STRATEGY': 'adaptive', 'CHECK_INTERVAL_SECONDS': 20},
+    },
+    'timeline_low_limit': {
+        'accounts': 50,
+        'limits': {'/2/users/:id/tweets': 15},  # 每个 token 每分钟一次
+        'settings': {'POLLING_MODE': 'timeline', 'POLLING_STRATEGY': 'round_robin', 'CHECK_INTERVAL_SECONDS': 20},
+    },
+    # 账号发推频繁且每个账号一小时左右才轮到一次，每次轮询的新推文远超一页（5 条），依赖分页补齐
+    'timeline_burst': {
+        'accounts': 50,
+        'daily_tweets': 60,
+        'limits': {'/2/users/:id/tweets': 100},
+        'settings': {'POLLING_MODE': 'timeline', 'POLLING_STRATEGY': 'round_robin', 'CHECK_INTERVAL_SECONDS': 60},
+    },
+    'timeline_burst_no_backfill': {
+        'accounts': 50,
+        'daily_tweets': 60,
+        'limits': {'/2/users/:id/tweets': 100},
+        'settings': {'POLLING_MODE': 'timeline', 'POLLING_STRATEGY': 'round_robin', 'CHECK_INTERVAL_SECONDS': 60,
+                     'BACKFILL_ENABLED': False},
+    },
+    'search': {
+        'accounts': 500,
+        'settings': {'POLLING_MODE': 'search', 'CHECK_INTERVAL_SECONDS': 20},
+    },
+    'stream': {
+        'accounts': 500,
+        'stream': {},
+        'settings': {'POLLING_MODE': 'search', 'CHECK_INTERVAL_SECONDS': 20, 'STREAM_ENABLED': True},
+    },
+    'stream_flaky': {
+        'accounts': 500,
+        'stream': {'disconnect_every': 3600, 'outage': 600},
+        'settings': {'POLLING_MODE': 'search', 'CHECK_INTERVAL_SECONDS': 20, 'STREAM_ENABLED': True},
+    },
+    'stream_unavailable': {
+        'accounts': 500,
+        'stream': None,
+        'settings': {'POLLING_MODE': 'search', 'CHECK_INTERVAL_SECONDS': 20, 'STREAM_ENABLED': True},
+    },
+    'search_digest': {
+        'accounts': 500,
+        'settings': {'POLLING_MODE': 'search', 'CHECK_INTERVAL_SECONDS': 20,
+                     'NOTIFY_DIGEST_WINDOW_SECONDS': 60},
+    },
+}
+
+# 每个场景开始前恢复的默认值，避免场景之间相互影响
+BASE_SETTINGS = {
+    'NOTIFY_DIGEST_WINDOW_SECONDS': 0,
+    'NOTIFY_RULES_FILE': None,
+    'METRICS_TRACKING_ENABLED': False,
+    'AUTO_START_MONITORING': False,
+    'SHARDING_BACKEND': 'local',
+    'BACKFILL_ENABLED': True,
+    'STREAM_ENABLED': False,
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_scenario(name: str, spec: dict, hours: float, speed: float, accounts: int = None,
+                       cassette: str = None, workers: int = 1, tokens: int = 1) -> dict:
+    from app.models.database import init_db, close_db
+    from app.services.twitter_service import TwitterService
+    from app.services.wechat_service import WeChatService
+    from app.services.monitor_service import MonitorService
+    from app.services.sharding import SQLiteShardCoordinator
+
+    sim_clock = AcceleratedClock(speed)
+    clock.set_clock(sim_clock)
+    duration = hours * 3600
+    start = sim_clock.now()
+    if cassette:
+        trace = load_cassette(cassette, start)
+    else:
+        trace = synthetic_trace(accounts or spec['accounts'], duration, start,
+                                mean_daily_tweets=spec.get('daily_tweets', 4.0))
+
+    twitter = FakeTwitterAPI(trace, spec.get('limits'), spec.get('stream'))
+    wechat = FakeWeChatWebhook(trace)
+    overrides = {
+        **BASE_SETTINGS,
+        **spec['settings'],
+        'TWITTER_API_BASE_URL': await twitter.start(),
+        'WECHAT_WEBHOOK_URL': await wechat.start(),
+        'TWITTER_USERNAMES': ','.join(trace.accounts),
+        'DATABASE_URL': f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'sim.db')}",
+    }
+    if workers > 1:
+        overrides['SHARDING_BACKEND'] = 'sqlite'
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+
+    await init_db()
+    monitors = []
+    for i in range(workers):
+        twitter_service = TwitterService([f"sim-token-{i}-{j}" for j in range(tokens)])
+        coordinator = SQLiteShardCoordinator(f"sim-worker-{i}") if workers > 1 else None
+        monitors.append(MonitorService(twitter_service, WeChatService(), coordinator))
+    for monitor in monitors:
+        await monitor.start_monitoring()
+    # 启动服务消耗的真实时间同样被放大，此前发布的推文早于账号加入监控列表，属于历史推文
+    monitoring_started = sim_clock.now()
+    await clock.sleep(duration)
+    end = sim_clock.now()
+    for monitor in monitors:
+        await monitor.stop_monitoring()
+        await monitor.twitter_service.close()
+        await monitor.outbox.close()
+    await close_db()
+    await twitter.stop()
+    await wechat.stop()
+    clock.set_clock(clock.Clock())
+
+    # 最后一个检查间隔内发布的推文还来不及被检测，不计入统计；
+    # 结束时所在账号还没轮到的推文单独统计为 pending（轮换策略下每个账号要隔 账号数 x 检查间隔 才轮询一次）
+    latencies, missed, pending = wechat.latencies(monitoring_started, end - settings.CHECK_INTERVAL_SECONDS * 3,
+                                                  twitter.detectable)
+    return {
+        'scenario': name,
+        'workers': workers,
+        'tokens': tokens,
+        'accounts': len(trace.accounts),
+        'virtual_hours': round((end - start) / 3600, 2),
+        'tweets_posted': len(latencies) + missed + pending,
+        'tweets_notified': len(latencies),
+        'tweets_missed': missed,
+        'tweets_pending': pending,
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p90': percentile(latencies, 0.9),
+        'latency_p99': percentile(latencies, 0.99),
+        'latency_mean': statistics.mean(latencies) if latencies else None,
+        'api_calls': dict(twitter.calls),
+        'api_calls_total': sum(twitter.calls.values()),
+        'api_rejected_429': sum(twitter.rejected.values()),
+        'webhook_messages': len(wechat.messages),
+        'webhook_rejected_45009': wechat.rejected,
+    }
+
+
+def print_table(results):
+    def fmt(value):
+        return '-' if value is None else f"{value:.0f}s"
+
+    print(f"{'scenario':<22} {'accts':>6} {'posted':>7} {'sent':>6} {'missed':>7} {'pending':>8} {'p50':>7} "
+          f"{'p90':>7} {'p99':>7} {'api':>6} {'429':>5} {'msgs':>6} {'45009':>6}")
+    for r in results:
+        print(f"{r['scenario']:<22} {r['accounts']:>6} {r['tweets_posted']:>7} {r['tweets_notified']:>6} "
+              f"{r['tweets_missed']:>7} {r['tweets_pending']:>8} {fmt(r['latency_p50']):>7} {fmt(r['latency_p90']):>7} "
+              f"{fmt(r['latency_p99']):>7} {r['api_calls_total']:>6} {r['api_rejected_429']:>5} "
+              f"{r['webhook_messages']:>6} {r['webhook_rejected_45009']:>6}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hours', type=float, default=4, help='每个场景的仿真时长（虚拟小时）')
+    parser.add_argument('--speed', type=float, default=1000, help='时钟加速倍数')
+    parser.add_argument('--accounts', type=int, help='覆盖各场景的账号数')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='只运行指定场景')
+    parser.add_argument('--workers', type=int, default=1, help='分担账号的 worker 数量')
+    parser.add_argument('--tokens', type=int, default=1, help='每个 worker 的 bearer token 数量')
+    parser.add_argument('--cassette', help='使用录制的推文回放代替合成轨迹')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = []
+    for name in args.scenario or list(SCENARIOS):
+        print(f"running {name} ({args.hours}h at {args.speed:.0f}x, "
+              f"{args.workers} workers x {args.tokens} tokens)...", flush=True)
+        results.append(await run_scenario(name, SCENARIOS[name], args.hours, args.speed,
+                                          args.accounts, args.cassette, args.workers,
+                                          args.tokens))
+    print()
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,190 @@
+"""
+历史推文导出基准：向临时数据库写入合成推文，然后在独立子进程中通过 ASGI 接口完整读取 /tweets/export 的响应，
+测量每秒导出的行数和进程峰值内存（RSS），并与一次性读出全部行再序列化的做法对比；
+导出期间另有一个任务每 10ms 提交一次小事务，记录写入等待时间，检查导出是否阻塞监控的写入
+
+用法: python benchmarks/bench_tweet_export.py [推文数]（默认 100 万条，写入需要几分钟）
+"""
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('TWITTER_BEARER_TOKEN', 'benchmark-token')
+os.environ.setdefault('WECHAT_WEBHOOK_URL', 'https://example.invalid/webhook')
+
+WORDS = (
+    "bitcoin ethereum launch mainnet update release protocol token airdrop governance staking "
+    "bridge wallet security audit partnership roadmap community developer testnet upgrade"
+).split() + ["发布", "更新", "主网", "空投", "治理", "安全", "合作", "社区", "开发者", "测试网", "路线图", "升级"]
+AUTHORS = [f"account_{i}" for i in range(200)]
+BATCH_SIZE = 10000
+WRITE_INTERVAL = 0.01
+
+RUNS = [
+    ('ndjson, all rows', {'format': 'ndjson'}),
+    ('csv, all rows', {'format': 'csv'}),
+    ('ndjson, one author', {'format': 'ndjson', 'author': 'account_42'}),
+    ('ndjson, one month', {'format': 'ndjson', 'since': '2024-06-01T00:00:00+00:00',
+                           'until': '2024-07-01T00:00:00+00:00'}),
+    ('baseline: fetchall + serialize', None),
+]
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def seed(count: int):
+    from app.models.database import transaction
+    from app.services.tweet_history import snowflake_from_datetime
+    rng = random.Random(7)
+    first = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    span = 365 * 24 * 3600 / count
+    for start in range(0, count, BATCH_SIZE):
+        rows = []
+        for i in range(start, min(start + BATCH_SIZE, count)):
+            created_at = first + timedelta(seconds=span * i)
+            tweet_id = snowflake_from_datetime(created_at) + rng.randrange(1 << 22)
+            author = rng.choice(AUTHORS)
+            text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+            metrics = str({'like_count': rng.randrange(1000), 'retweet_count': rng.randrange(100)})
+            rows.append((str(tweet_id), author, text, f"https://twitter.com/{author}/status/{tweet_id}",
+                         created_at.isoformat(), metrics))
+        async with transaction() as db:
+            await db.executemany(
+                """INSERT OR IGNORE INTO tweet_records
+                   (tweet_id, username, content, tweet_url, created_at, metrics)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+
+
+async def writer(stop: asyncio.Event, waits: list):
+    """模拟监控推进游标的写入：记录每次事务从发起到提交的耗时"""
+    from app.models.database import transaction
+    n = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        async with transaction() as db:
+            await db.execute("INSERT OR REPLACE INTO poll_cursors (username, since_id, last_polled_at) "
+                             "VALUES (?, ?, ?)", (f"writer_{n % 10}", n, datetime.now(timezone.utc).isoformat()))
+        waits.append((time.perf_counter() - start) * 1000)
+        n += 1
+        await asyncio.sleep(WRITE_INTERVAL)
+
+
+async def export_via_app(params: dict):
+    """直接调用 ASGI 应用，逐块接收 StreamingResponse 的内容并丢弃，只统计字节数和行数"""
+    from urllib.parse import urlencode
+    from app.main import app
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': '/tweets/export', 'raw_path': b'/tweets/export', 'query_string': urlencode(params).encode(),
+        'headers': [], 'server': ('bench', 80), 'client': ('bench', 1)
+    }
+    totals = {'bytes': 0, 'lines': 0, 'status': None}
+
+    async def receive():
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            totals['status'] = message['status']
+        elif message['type'] == 'http.response.body':
+            body = message.get('body', b'')
+            totals['bytes'] += len(body)
+            totals['lines'] += body.count(b'\n')
+
+    await app(scope, receive, send)
+    if totals['status'] != 200:
+        raise RuntimeError(f"export returned {totals['status']}")
+    rows = totals['lines'] - (1 if params['format'] == 'csv' else 0)
+    return rows, totals['bytes']
+
+
+async def export_fetchall():
+    """对比：一次查询读出全部行，整体序列化后再发送"""
+    from app.models.database import get_db
+    from app.services.retention import ARCHIVE_COLUMNS, archive_record
+    async with get_db() as db:
+        cursor = await db.execute(
+            f"SELECT {ARCHIVE_COLUMNS} FROM tweet_records ORDER BY CAST(tweet_id AS INTEGER)"
+        )
+        rows = await cursor.fetchall()
+    body = ''.join(json.dumps(archive_record(row), ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+    return len(rows), len(body)
+
+
+async def run_child(db_path: str, index: int):
+    from app.config import settings
+    settings.DATABASE_URL = f"sqlite:///{db_path}"
+    from app.models.database import init_db, close_db
+    import app.main  # noqa: F401  导入放在测量基线之前
+
+    await init_db()
+    baseline = peak_rss_mb()
+    label, params = RUNS[index]
+
+    stop = asyncio.Event()
+    waits: list = []
+    write_task = asyncio.create_task(writer(stop, waits))
+    start = time.perf_counter()
+    rows, size = await (export_via_app(params) if params else export_fetchall())
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await write_task
+    await close_db()
+
+    waits.sort()
+    print(json.dumps({
+        'rows': rows, 'bytes': size, 'seconds': elapsed, 'baseline_rss': baseline, 'peak_rss': peak_rss_mb(),
+        'write_p50': statistics.median(waits) if waits else 0.0,
+        'write_p99': waits[int(len(waits) * 0.99)] if waits else 0.0,
+        'write_max': waits[-1] if waits else 0.0
+    }))
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'export.db')
+    from app.config import settings
+    settings.DATABASE_URL = f"sqlite:///{db_path}"
+    from app.models.database import init_db, close_db
+
+    await init_db()
+    start = time.perf_counter()
+    await seed(count)
+    await close_db()
+    print(f"seeded {count} tweets in {time.perf_counter() - start:.1f}s ({os.path.getsize(db_path) / 1e6:.0f} MB)\n")
+
+    print(f"{'run':<32} {'rows':>9} {'MB':>7} {'rows/s':>9} {'base RSS':>9} {'peak RSS':>9} "
+          f"{'write p50/p99/max ms':>22}")
+    for index, (label, _) in enumerate(RUNS):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', db_path, str(index)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{label:<32} {result['rows']:>9} {result['bytes'] / 1e6:>7.0f} "
+              f"{result['rows'] / result['seconds']:>9.0f} {result['baseline_rss']:>7.0f}MB "
+              f"{result['peak_rss']:>7.0f}MB "
+              f"{result['write_p50']:>8.2f}/{result['write_p99']:.2f}/{result['write_max']:.2f}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        asyncio.run(run_child(sys.argv[2], int(sys.argv[3])))
+    else:
+        asyncio.run(main())
@@ -0,0 +1,117 @@
+"""
+历史推文检索基准：向临时数据库写入合成推文（触发器同步维护 FTS5 索引），
+然后测量 /tweets/search 使用的查询在不同条件下的耗时，并与 LIKE 全表扫描对比
+
+用法: python benchmarks/bench_tweet_search.py [推文数]（默认 100 万条，写入需要几分钟）
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('TWITTER_BEARER_TOKEN', 'benchmark-token')
+os.environ.setdefault('WECHAT_WEBHOOK_URL', 'https://example.invalid/webhook')
+
+WORDS = (
+    "bitcoin ethereum launch mainnet update release protocol token airdrop governance staking "
+    "bridge wallet security audit partnership roadmap community developer testnet upgrade"
+).split() + ["发布", "更新", "主网", "空投", "治理", "安全", "合作", "社区", "开发者", "测试网", "路线图", "升级"]
+AUTHORS = [f"account_{i}" for i in range(200)]
+BATCH_SIZE = 10000
+
+
+def make_batch(rng: random.Random, start: int, count: int, first: datetime, span: float):
+    from app.services.tweet_history import snowflake_from_datetime
+    rows = []
+    for i in range(start, start + count):
+        created_at = first + timedelta(seconds=span * i)
+        tweet_id = snowflake_from_datetime(created_at) + rng.randrange(1 << 22)
+        author = rng.choice(AUTHORS)
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+        if i % 100000 == 0:
+            text += ' zeppelin'  # 稀有关键词
+        rows.append((str(tweet_id), author, text, f"https://twitter.com/{author}/status/{tweet_id}",
+                     created_at.isoformat(), None))
+    return rows
+
+
+async def seed(count: int):
+    from app.models.database import transaction
+    rng = random.Random(7)
+    first = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    span = 365 * 24 * 3600 / count
+    for start in range(0, count, BATCH_SIZE):
+        rows = make_batch(rng, start, min(BATCH_SIZE, count - start), first, span)
+        async with transaction() as db:
+            await db.executemany(
+                """INSERT OR IGNORE INTO tweet_records
+                   (tweet_id, username, content, tweet_url, created_at, metrics)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+
+
+async def timed(label: str, runs: int, func):
+    samples = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = await func()
+        samples.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<48} median {statistics.median(samples):8.2f} ms  max {max(samples):8.2f} ms")
+    return result
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    workdir = tempfile.mkdtemp()
+    from app.config import settings
+    settings.DATABASE_URL = f"sqlite:///{os.path.join(workdir, 'search.db')}"
+    from app.models.database import init_db, close_db, get_db
+    from app.services.tweet_history import search_tweets
+
+    await init_db()
+    start = time.perf_counter()
+    await seed(count)
+    print(f"seeded {count} tweets in {time.perf_counter() - start:.1f}s "
+          f"({os.path.getsize(os.path.join(workdir, 'search.db')) / 1e6:.0f} MB)\n")
+
+    june = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    await timed("keyword (indexed): 开发者", 20, lambda: search_tweets("开发者", limit=50))
+    await timed("short keyword (LIKE scan): 主网", 20, lambda: search_tweets("主网", limit=50))
+    await timed("keyword (rare): zeppelin", 20, lambda: search_tweets("zeppelin", limit=50))
+    await timed("two keywords: mainnet 空投", 20, lambda: search_tweets("mainnet 空投", limit=50))
+    await timed("keyword + author", 20, lambda: search_tweets("release", author="account_42", limit=50))
+    await timed("keyword + one week", 20, lambda: search_tweets(
+        "security", since=june, until=june + timedelta(days=7), limit=50))
+    await timed("author only", 20, lambda: search_tweets(author="account_7", limit=50))
+    await timed("time range only", 20, lambda: search_tweets(since=june, until=june + timedelta(days=1), limit=50))
+
+    async def deep_pages():
+        before_id = None
+        for _ in range(100):
+            page = await search_tweets("protocol", before_id=before_id, limit=50)
+            before_id = page['next_before_id']
+        return before_id
+    await timed("keyword, 100 keyset pages (total)", 3, deep_pages)
+
+    async def like_scan():
+        async with get_db() as db:
+            cursor = await db.execute(
+                """SELECT tweet_id FROM tweet_records WHERE content LIKE '%zeppelin%'
+                   ORDER BY CAST(tweet_id AS INTEGER) DESC LIMIT 50"""
+            )
+            return await cursor.fetchall()
+    await timed("baseline: LIKE scan for zeppelin", 3, like_scan)
+
+    await close_db()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""
+企业微信通知发送基准：在本地模拟 webhook 上比较
+旧路径（每条消息新建 ClientSession、逐条 await）与新路径（共享会话、有界并发）
+
+用法: python benchmarks/bench_wechat_dispatch.py [消息数] [webhook 延迟毫秒]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('TWITTER_BEARER_TOKEN', 'benchmark-token')
+os.environ.setdefault('WECHAT_WEBHOOK_URL', 'https://example.invalid/webhook')
+
+import aiohttp
+from aiohttp import web
+
+
+async def start_webhook(delay: float, limit_per_window: int = 0, window: float = 60.0):
+    """模拟企业微信 webhook；limit_per_window > 0 时超出限额返回 errcode 45009"""
+    received = []
+    rejected = []
+
+    async def handler(request: web.Request) -> web.Response:
+        await request.json()
+        await asyncio.sleep(delay)
+        now = time.monotonic()
+        recent = [t for t in received if now - t < window]
+        if limit_per_window and len(recent) >= limit_per_window:
+            rejected.append(now)
+            return web.json_response({'errcode': 45009, 'errmsg': 'api freq out of limit'})
+        received.append(now)
+        return web.json_response({'errcode': 0, 'errmsg': 'ok'})
+
+    app = web.Application()
+    app.router.add_post('/webhook', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/webhook", rejected
+
+
+async def old_send(url: str, content: str) -> bool:
+    """改造前的实现：每条消息一个新的 ClientSession"""
+    payload = {"msgtype": "markdown", "markdown": {"content": content}}
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json=payload) as response:
+            result = await response.json()
+            return response.status == 200 and result.get('errcode') == 0
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    delay = (int(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    from app.services.wechat_service import WeChatService
+
+    runner, url, _ = await start_webhook(delay)
+    start = time.perf_counter()
+    ok = 0
+    for i in range(count):
+        ok += await old_send(url, f"message {i}")
+    old_elapsed = time.perf_counter() - start
+
+    service = WeChatService(url)
+    service.rate_limit_per_minute = count  # 吞吐测试时不触发本地限流
+    start = time.perf_counter()
+    results = await asyncio.gather(*(service.send_markdown(f"message {i}") for i in range(count)))
+    new_elapsed = time.perf_counter() - start
+    await service.close()
+    await runner.cleanup()
+
+    print(f"{count} messages, webhook latency {delay * 1000:.0f} ms")
+    print(f"old path (session per message, sequential): {count / old_elapsed:8.1f} msg/s ({ok} ok)")
+    print(f"new path (shared session, bounded concurrent): {count / new_elapsed:8.1f} msg/s ({sum(results)} ok)")
+
+    # 限流排队：窗口缩短到 1 秒、每窗口 5 条，超出的消息排队而不是失败
+    runner, url, rejected = await start_webhook(0.0, limit_per_window=5, window=1.0)
+    service = WeChatService(url)
+    service.rate_limit_per_minute, service.rate_window_seconds = 5, 1.0
+    start = time.perf_counter()
+    results = await asyncio.gather(*(service.send_markdown(f"burst {i}") for i in range(20)))
+    elapsed = time.perf_counter() - start
+    await service.close()
+    await runner.cleanup()
+    print(f"burst of 20 under a 5/s limit: {sum(results)}/20 delivered in {elapsed:.1f}s "
+          f"({len(rejected)} window-edge 45009 responses re-queued)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,4 @@
+"""
+监控流程的本地仿真工具：假 Twitter API、假企业微信 webhook、发推轨迹（合成或录制回放），
+配合 app.utils.clock.AcceleratedClock 以数百到上千倍速运行 MonitorService。
+"""
@@ -0,0 +1,295 @@
+"""
+本地假 Twitter API v2：按轨迹和注入的时钟返回推文，并模拟按 token 和接口计算的 15 分钟速率限制窗口
+
+实现了监控用到的接口：/2/users/by、/2/users/:id/tweets、/2/tweets/search/recent、/2/tweets、/2/users/me，
+以及 filtered stream 的 /2/tweets/search/stream/rules 和 /2/tweets/search/stream。
+时间线和搜索支持 since_id、until_id 和分页：还有更早的结果时 meta.next_token 为本页最旧推文的 ID，
+作为 pagination_token / next_token 传回时相当于 until_id。
+
+stream 以分块传输逐行推送匹配规则的推文，每 20 秒发送一次心跳空行。stream 参数控制连接的可用性：
+None 表示套餐不支持（返回 403）；{'disconnect_every': 秒, 'outage': 秒} 表示每隔 disconnect_every 秒
+断开所有连接，之后 outage 秒内连接请求返回 503。
+"""
+import json
+import re
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from app.utils import clock
+from benchmarks.simulator.traces import SimTweet, Trace
+
+WINDOW_SECONDS = 15 * 60
+# 每 15 分钟窗口的调用次数上限（接近 Pro 套餐的应用级限额），可按场景覆盖
+DEFAULT_LIMITS = {
+    '/2/users/by': 300,
+    '/2/users/:id/tweets': 1500,
+    '/2/tweets/search/recent': 450,
+    '/2/tweets': 450,
+    '/2/users/me': 75,
+    '/2/tweets/search/stream': 50,
+    '/2/tweets/search/stream/rules': 450,
+}
+STREAM_TICK_SECONDS = 2  # 检查新推文的间隔（虚拟时间），即推送的延迟上限
+STREAM_HEARTBEAT_SECONDS = 20
+USER_ID_BASE = 10_000_000
+
+_FROM_RE = re.compile(r'from:(\w+)')
+
+
+def _int_param(request: web.Request, name: str) -> Optional[int]:
+    value = request.query.get(name)
+    return int(value) if value else None
+
+
+def _page_bounds(request: web.Request, token_param: str):
+    """(since_id, until_id, 每页条数)；分页 token 与 until_id 取较小者"""
+    bounds = [value for value in (_int_param(request, 'until_id'), _int_param(request, token_param)) if value]
+    return _int_param(request, 'since_id'), min(bounds) if bounds else None, int(request.query.get('max_results', 10))
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+class FakeTwitterAPI:
+    def __init__(self, trace: Trace, limits: Optional[Dict[str, int]] = None, stream: Optional[dict] = None):
+        self.trace = trace
+        self.stream = stream
+        self.rules: Dict[str, dict] = {}  # 规则 id -> {'id', 'value', 'tag'}
+        self.stream_connections = 0
+        self.stream_pushed = 0
+        self._closing = False
+        self._next_rule_id = 1
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.user_ids = {name.lower(): str(USER_ID_BASE + i) for i, name in enumerate(trace.accounts)}
+        self.names = {user_id: name for name, user_id in self.user_ids.items()}
+        self.display_names = {name.lower(): name for name in trace.accounts}
+        self.calls: Counter = Counter()
+        self.rejected: Counter = Counter()
+        # 账号（小写）-> 各次实时轮询（不带 until_id / 分页 token）的时间，以及 stream 推送推文的时间
+        self.live_polls: Dict[str, List[float]] = {}
+        self.pushed_at: Dict[int, float] = {}
+        self._windows: Dict[tuple, List[float]] = {}  # (token, endpoint) -> [窗口重置时间, 已用次数]
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ''
+
+    def _app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/2/users/by', self._users_by)
+        app.router.add_get('/2/users/me', self._users_me)
+        app.router.add_get('/2/users/{user_id}/tweets', self._user_tweets)
+        app.router.add_get('/2/tweets/search/recent', self._search)
+        app.router.add_get('/2/tweets', self._lookup)
+        app.router.add_get('/2/tweets/search/stream/rules', self._get_rules)
+        app.router.add_post('/2/tweets/search/stream/rules', self._post_rules)
+        app.router.add_get('/2/tweets/search/stream', self._stream)
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        self._closing = True  # 结束仍在推送的 stream 连接
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _take(self, request: web.Request, endpoint: str) -> Dict[str, str]:
+        """占用一次额度，返回速率限制响应头；额度耗尽时抛出 429。每个 bearer token 的额度独立计算"""
+        now = clock.now()
+        key = (request.headers.get('Authorization', ''), endpoint)
+        window = self._windows.get(key)
+        if window is None or now >= window[0]:
+            window = self._windows[key] = [now + WINDOW_SECONDS, 0]
+        limit = self.limits[endpoint]
+        self.calls[endpoint] += 1
+        headers = {
+            'x-rate-limit-limit': str(limit),
+            'x-rate-limit-reset': str(int(window[0])),
+        }
+        if window[1] >= limit:
+            self.rejected[endpoint] += 1
+            headers['x-rate-limit-remaining'] = '0'
+            raise web.HTTPTooManyRequests(headers=headers, text='{"title": "Too Many Requests"}',
+                                          content_type='application/json')
+        window[1] += 1
+        headers['x-rate-limit-remaining'] = str(limit - window[1])
+        return headers
+
+    def detectable(self, tweet: SimTweet, deadline: float) -> bool:
+        """
+        推文发布后、deadline 之前是否已被实时轮询或 stream 推送覆盖；覆盖后仍未送达才算漏报，补齐缺口的推文同样如此
+
+        deadline 之后才轮询到的推文（缺口可能来不及补齐）不算可检测。
+        """
+        pushed_at = self.pushed_at.get(tweet.id)
+        if pushed_at is not None and pushed_at <= deadline:
+            return True
+        polls = self.live_polls.get(tweet.author.lower(), [])
+        index = bisect_left(polls, tweet.posted_at)
+        return index < len(polls) and polls[index] <= deadline
+
+    def _render(self, tweets: List[SimTweet], with_authors: bool = False, limit: Optional[int] = None) -> dict:
+        """tweets 从新到旧排列；多于 limit 条时只返回一页并附带 next_token"""
+        next_token = None
+        if limit is not None and len(tweets) > limit:
+            tweets = tweets[:limit]
+            next_token = str(tweets[-1].id)
+        if not tweets:
+            return {'meta': {'result_count': 0}}
+        data, media, users = [], [], {}
+        for tweet in tweets:
+            item = {
+                'id': str(tweet.id),
+                'text': tweet.text,
+                'created_at': _iso(tweet.posted_at),
+                'public_metrics': tweet.metrics,
+            }
+            if tweet.media:
+                item['attachments'] = {'media_keys': [m['media_key'] for m in tweet.media if 'media_key' in m]}
+                media.extend(tweet.media)
+            if with_authors:
+                item['author_id'] = self.user_ids[tweet.author.lower()]
+                users[item['author_id']] = {'id': item['author_id'], 'username': tweet.author}
+            data.append(item)
+        includes = {}
+        if media:
+            includes['media'] = media
+        if users:
+            includes['users'] = list(users.values())
+        result = {'data': data, 'meta': {'result_count': len(data), 'newest_id': data[0]['id']}}
+        if next_token:
+            result['meta']['next_token'] = next_token
+        if includes:
+            result['includes'] = includes
+        return result
+
+    async def _users_by(self, request: web.Request) -> web.Response:
+        headers = self._take(request, '/2/users/by')
+        names = request.query.get('usernames', '').split(',')
+        data = [
+            {'id': self.user_ids[name.lower()], 'username': self.display_names[name.lower()]}
+            for name in names if name.lower() in self.user_ids
+        ]
+        return web.json_response({'data': data} if data else {}, headers=headers)
+
+    async def _users_me(self, request: web.Request) -> web.Response:
+        headers = self._take(request, '/2/users/me')
+        return web.json_response({'data': {'id': '1', 'username': 'simulator'}}, headers=headers)
+
+    async def _user_tweets(self, request: web.Request) -> web.Response:
+        headers = self._take(request, '/2/users/:id/tweets')
+        name = self.names.get(request.match_info['user_id'])
+        if name is None:
+            return web.json_response({'title': 'Not Found Error'}, status=404, headers=headers)
+        since_id, until_id, limit = _page_bounds(request, 'pagination_token')
+        now = clock.now()
+        if until_id is None:
+            self.live_polls.setdefault(name.lower(), []).append(now)
+        tweets = self.trace.visible(name, now, since_id, limit + 1, until_id)
+        return web.json_response(self._render(tweets, limit=limit), headers=headers)
+
+    async def _search(self, request: web.Request) -> web.Response:
+        headers = self._take(request, '/2/tweets/search/recent')
+        since_id, until_id, limit = _page_bounds(request, 'next_token')
+        now = clock.now()
+        tweets = []
+        for name in _FROM_RE.findall(request.query.get('query', '')):
+            if until_id is None:
+                self.live_polls.setdefault(name.lower(), []).append(now)
+            tweets.extend(self.trace.visible(name, now, since_id, limit + 1, until_id))
+        tweets.sort(key=lambda t: t.id, reverse=True)
+        return web.json_response(self._render(tweets, with_authors=True, limit=limit), headers=headers)
+
+    async def _lookup(self, request: web.Request) -> web.Response:
+        headers = self._take(request, '/2/tweets')
+        now = clock.now()
+        data = []
+        for tweet_id in request.query.get('ids', '').split(','):
+            tweet = self.trace.by_id.get(int(tweet_id)) if tweet_id.isdigit() else None
+            if tweet and tweet.posted_at <= now:
+                data.append({'id': str(tweet.id), 'text': tweet.text, 'public_metrics': tweet.metrics})
+        return web.json_response({'data': data} if data else {}, headers=headers)
+
+    async def _get_rules(self, request: web.Request) -> web.Response:
+        headers = self._take(request, '/2/tweets/search/stream/rules')
+        rules = list(self.rules.values())
+        return web.json_response({'data': rules, 'meta': {'result_count': len(rules)}} if rules
+                                 else {'meta': {'result_count': 0}}, headers=headers)
+
+    async def _post_rules(self, request: web.Request) -> web.Response:
+        headers = self._take(request, '/2/tweets/search/stream/rules')
+        body = await request.json()
+        created = []
+        for rule in body.get('add', []):
+            rule = {'id': str(self._next_rule_id), 'value': rule['value'], 'tag': rule.get('tag')}
+            self._next_rule_id += 1
+            self.rules[rule['id']] = rule
+            created.append(rule)
+        for rule_id in body.get('delete', {}).get('ids', []):
+            self.rules.pop(rule_id, None)
+        return web.json_response({'data': created} if created else {}, status=201 if created else 200,
+                                 headers=headers)
+
+    def _stream_down(self, now: float) -> bool:
+        """按 disconnect_every / outage 计算当前是否处于中断期"""
+        every = self.stream.get('disconnect_every')
+        if not every:
+            return False
+        elapsed = (now - self.trace.start) % every
+        return elapsed >= every - self.stream.get('outage', 0)
+
+    def _stream_members(self) -> set:
+        return {name.lower() for rule in self.rules.values() for name in _FROM_RE.findall(rule['value'])}
+
+    async def _stream(self, request: web.Request) -> web.StreamResponse:
+        headers = self._take(request, '/2/tweets/search/stream')
+        if self.stream is None:
+            return web.json_response({'title': 'Client Forbidden', 'reason': 'client-not-enrolled'},
+                                     status=403, headers=headers)
+        now = clock.now()
+        if self._stream_down(now):
+            return web.json_response({'title': 'Service Unavailable'}, status=503, headers=headers)
+        if self.stream_connections:
+            return web.json_response({'title': 'ConnectionException'}, status=429, headers=headers)
+
+        response = web.StreamResponse(headers=headers)
+        response.content_type = 'application/json'
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        self.stream_connections += 1
+        watermark = heartbeat = now
+        try:
+            while True:
+                await clock.sleep(STREAM_TICK_SECONDS)
+                now = clock.now()
+                if self._closing or self._stream_down(now):
+                    break
+                members = self._stream_members()
+                for tweet in self.trace.posted_between(watermark, now):
+                    if tweet.author.lower() not in members:
+                        continue
+                    rendered = self._render([tweet], with_authors=True)
+                    message = {'data': rendered['data'][0], 'includes': rendered.get('includes', {})}
+                    await response.write(json.dumps(message).encode() + b'\r\n')
+                    self.stream_pushed += 1
+                    self.pushed_at.setdefault(tweet.id, now)
+                watermark = now
+                if now - heartbeat >= STREAM_HEARTBEAT_SECONDS:
+                    await response.write(b'\r\n')
+                    heartbeat = now
+        except ConnectionResetError:
+            pass  # 客户端断开
+        finally:
+            self.stream_connections -= 1
+        return response
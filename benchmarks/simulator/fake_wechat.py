@@ -0,0 +1,78 @@
+"""
+本地假企业微信 webhook：记录收到的消息，按 20 条/分钟返回 45009 限流错误，
+并从消息里的推文链接计算每条推文从发布到送达的延迟
+"""
+import re
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from app.utils import clock
+from benchmarks.simulator.traces import Trace
+
+ERRCODE_RATE_LIMITED = 45009
+_STATUS_RE = re.compile(r'/status/(\d+)')
+
+
+class FakeWeChatWebhook:
+    def __init__(self, trace: Trace, limit_per_minute: int = 20):
+        self.trace = trace
+        self.limit_per_minute = limit_per_minute
+        self.messages: List[Tuple[float, str]] = []
+        self.rejected = 0
+        self.delivered: Dict[int, float] = {}  # 推文 ID -> 第一次送达的时间
+        self._window: deque = deque()
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ''
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post('/cgi-bin/webhook/send', self._send)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/cgi-bin/webhook/send?key=simulator"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _send(self, request: web.Request) -> web.Response:
+        now = clock.now()
+        while self._window and self._window[0] <= now - 60:
+            self._window.popleft()
+        if len(self._window) >= self.limit_per_minute:
+            self.rejected += 1
+            return web.json_response({'errcode': ERRCODE_RATE_LIMITED, 'errmsg': 'api freq out of limit'})
+        self._window.append(now)
+
+        payload = await request.json()
+        body = payload.get(payload.get('msgtype', ''), {})
+        content = body.get('content', '') if isinstance(body, dict) else ''
+        self.messages.append((now, content))
+        for tweet_id in _STATUS_RE.findall(content):
+            self.delivered.setdefault(int(tweet_id), now)
+        return web.json_response({'errcode': 0, 'errmsg': 'ok'})
+
+    def latencies(self, begin: float, end: float,
+                  detectable: Optional[Callable] = None) -> Tuple[List[float], int, int]:
+        """
+        [begin, end) 内发布的推文的送达延迟、漏报数和尚未轮询到的数量
+
+        未送达的推文中，detectable(推文, end) 判断为 end 之前尚未被轮询覆盖的（如轮换策略下发布后账号还没轮到）不算漏报。
+        """
+        latencies, missed, pending = [], 0, 0
+        for tweet in self.trace.posted_between(begin, end):
+            delivered_at = self.delivered.get(tweet.id)
+            if delivered_at is not None:
+                latencies.append(delivered_at - tweet.posted_at)
+            elif detectable is None or detectable(tweet, end):
+                missed += 1
+            else:
+                pending += 1
+        return latencies, missed, pending
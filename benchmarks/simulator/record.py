@@ -0,0 +1,64 @@
+"""
+录制真实推文作为仿真回放数据（需要真实的 TWITTER_BEARER_TOKEN）
+
+用法: python -m benchmarks.simulator.record 输出文件.jsonl 用户名1,用户名2 [每个用户的条数]
+
+每行保存一条 API v2 原始推文对象及其媒体，load_cassette 回放时保留真实的文本、媒体和互动数据结构。
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.models.database import init_db, close_db
+from app.services.twitter_service import TwitterService, TWEET_FIELDS, MEDIA_FIELDS, ENDPOINT_USER_TWEETS
+
+
+async def record(path: str, usernames: list, per_user: int):
+    await init_db()
+    service = TwitterService()
+    user_ids = await service.resolve_user_ids(usernames)
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for username, user_id in user_ids.items():
+            pagination_token = None
+            fetched = 0
+            while fetched < per_user:
+                response = await service._request(
+                    ENDPOINT_USER_TWEETS,
+                    f"/2/users/{user_id}/tweets",
+                    {
+                        'max_results': min(100, max(5, per_user - fetched)),
+                        'exclude': ['retweets', 'replies'],
+                        'tweet.fields': TWEET_FIELDS,
+                        'expansions': ['attachments.media_keys'],
+                        'media.fields': MEDIA_FIELDS,
+                        'pagination_token': pagination_token
+                    }
+                )
+                media = {m['media_key']: m for m in response.get('includes', {}).get('media', [])}
+                for tweet in response.get('data', []):
+                    keys = (tweet.get('attachments') or {}).get('media_keys', [])
+                    f.write(json.dumps({
+                        'author': username,
+                        'tweet': tweet,
+                        'media': [media[key] for key in keys if key in media]
+                    }, ensure_ascii=False) + '\n')
+                    written += 1
+                fetched += len(response.get('data', []))
+                pagination_token = response.get('meta', {}).get('next_token')
+                if not pagination_token or not response.get('data'):
+                    break
+            print(f"@{username}: {fetched} tweets")
+    await service.close()
+    await close_db()
+    print(f"recorded {written} tweets to {path}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(record(sys.argv[1], sys.argv[2].split(','), int(sys.argv[3]) if len(sys.argv) > 3 else 100))
@@ -0,0 +1,118 @@
+"""
+发推轨迹：仿真中每个账号在什么时间发布哪些推文
+
+可以按重尾分布随机生成上千个账号的轨迹，也可以从 record.py 录制的真实推文（cassette）回放，
+回放时保留真实的文本、媒体和互动数据结构，只把发布时间平移到仿真时间线上。
+"""
+import json
+import random
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.services.tweet_history import TWITTER_EPOCH_MS
+
+WORDS = (
+    "launch mainnet update release protocol token airdrop governance staking bridge wallet security "
+    "audit partnership roadmap community developer testnet upgrade 发布 更新 主网 空投 治理 社区 路线图"
+).split()
+
+
+def snowflake(posted_at: float, sequence: int) -> int:
+    """按发布时间生成雪花 ID，同一毫秒内用序号区分"""
+    return ((int(posted_at * 1000) - TWITTER_EPOCH_MS) << 22) + (sequence & ((1 << 22) - 1))
+
+
+class SimTweet:
+    __slots__ = ('id', 'author', 'posted_at', 'text', 'media', 'metrics')
+
+    def __init__(self, tweet_id: int, author: str, posted_at: float, text: str,
+                 media: Optional[List[dict]] = None, metrics: Optional[Dict[str, int]] = None):
+        self.id = tweet_id
+        self.author = author
+        self.posted_at = posted_at
+        self.text = text
+        self.media = media or []
+        self.metrics = metrics or {'retweet_count': 0, 'like_count': 0, 'reply_count': 0, 'quote_count': 0}
+
+
+class Trace:
+    def __init__(self, accounts: List[str], tweets: List[SimTweet], start: float):
+        self.accounts = accounts
+        self.start = start
+        self.tweets = sorted(tweets, key=lambda t: t.id)
+        self.by_id = {tweet.id: tweet for tweet in self.tweets}
+        self.by_author: Dict[str, List[SimTweet]] = {account.lower(): [] for account in accounts}
+        for tweet in self.tweets:
+            self.by_author.setdefault(tweet.author.lower(), []).append(tweet)
+        self._posted = {author: [t.posted_at for t in tweets] for author, tweets in self.by_author.items()}
+        self._all_posted = [tweet.posted_at for tweet in self.tweets]
+
+    def visible(self, author: str, now: float, since_id: Optional[int] = None, limit: int = 100,
+                until_id: Optional[int] = None) -> List[SimTweet]:
+        """now 时刻已发布且 ID 在 (since_id, until_id) 区间内的推文，从新到旧"""
+        author = author.lower()
+        tweets = self.by_author.get(author, [])
+        end = bisect_right(self._posted.get(author, []), now)
+        result = []
+        for tweet in reversed(tweets[:end]):
+            if until_id is not None and tweet.id >= until_id:
+                continue
+            if since_id is not None and tweet.id <= since_id:
+                break
+            result.append(tweet)
+            if len(result) >= limit:
+                break
+        return result
+
+    def posted_between(self, begin: float, end: float) -> List[SimTweet]:
+        """发布时间在 [begin, end) 内的推文，按 ID 排列（雪花 ID 随发布时间递增）"""
+        return self.tweets[bisect_left(self._all_posted, begin):bisect_left(self._all_posted, end)]
+
+
+def synthetic_trace(accounts: int, duration: float, start: float, seed: int = 1,
+                    mean_daily_tweets: float = 4.0) -> Trace:
+    """
+    生成合成轨迹：各账号的发推速率服从帕累托分布（少数账号非常活跃），发推时间为泊松过程
+
+    每个账号在开始前还有一条历史推文，作为监控启动时的基线，不计入检测延迟统计。
+    """
+    rng = random.Random(seed)
+    names = [f"sim_user_{i}" for i in range(accounts)]
+    tweets: List[SimTweet] = []
+    sequence = 0
+    for name in names:
+        rate = mean_daily_tweets * rng.paretovariate(1.5) / 3 / 86400  # 帕累托(1.5) 均值为 3
+        posted_at = start - rng.uniform(3600, 86400)
+        while posted_at < start + duration:
+            sequence += 1
+            text = f"{' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 20)))} #{sequence}"
+            tweets.append(SimTweet(snowflake(posted_at, sequence), name, posted_at, text))
+            posted_at = max(posted_at, start) + rng.expovariate(rate)
+    return Trace(names, tweets, start)
+
+
+def load_cassette(path: str, start: float) -> Trace:
+    """
+    从录制的推文回放：最早一条推文对齐到 start 之前一小时作为基线，其余保持真实的时间间隔
+
+    cassette 每行一个 JSON：{"author": ..., "tweet": API v2 推文对象, "media": [媒体对象]}
+    """
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    if not records:
+        raise ValueError(f"Cassette {path} is empty")
+
+    created = [datetime.fromisoformat(r['tweet']['created_at'].replace('Z', '+00:00')).timestamp() for r in records]
+    offset = start - 3600 - min(created)
+    tweets = []
+    for sequence, (record, created_at) in enumerate(zip(records, created), 1):
+        posted_at = created_at + offset
+        tweet = record['tweet']
+        tweets.append(SimTweet(snowflake(posted_at, sequence), record['author'], posted_at, tweet['text'],
+                               record.get('media'), tweet.get('public_metrics')))
+    accounts = sorted({record['author'] for record in records})
+    return Trace(accounts, tweets, start)
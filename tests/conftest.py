@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+os.environ.setdefault('TWITTER_BEARER_TOKEN', 'test-token')
+os.environ.setdefault('WECHAT_WEBHOOK_URL', 'https://example.invalid/webhook')
+
+from app.config import settings
+from app.models.database import init_db, close_db
+from app.services.watch_list import watch_list
+from app.utils import clock
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture
+async def db(tmp_path, monkeypatch):
+    """每个测试使用独立的临时数据库"""
+    monkeypatch.setattr(settings, 'DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    await close_db()
+    await init_db()
+    yield
+    await close_db()
+
+
+@pytest.fixture
+def watched(monkeypatch):
+    """直接设置内存中的监控列表，不经过 watched_users 表"""
+    def set_usernames(usernames):
+        monkeypatch.setattr(watch_list, 'usernames', list(usernames))
+        monkeypatch.setattr(watch_list, 'added_at', {username: 0.0 for username in usernames})
+    return set_usernames
+
+
+@pytest.fixture
+def fast_clock():
+    """1000 倍速的时钟：限流、租约和重试的等待按虚拟时间计算"""
+    previous = clock.get_clock()
+    accelerated = clock.AcceleratedClock(speed=1000)
+    clock.set_clock(accelerated)
+    yield accelerated
+    clock.set_clock(previous)
@@ -0,0 +1,136 @@
+import pytest
+
+from app.config import settings
+from app.models.database import get_db
+from app.services.monitor_service import MonitorService
+from app.services.twitter_service import ENDPOINT_USER_TWEETS, TwitterService
+from app.services.wechat_service import WeChatService
+from app.utils import clock
+from benchmarks.simulator.fake_twitter import FakeTwitterAPI
+from benchmarks.simulator.traces import SimTweet, Trace, snowflake
+
+pytestmark = pytest.mark.anyio
+
+BURST = 12  # 实时轮询一页 5 条，其余 7 条留给补齐
+
+
+def burst_trace() -> Trace:
+    now = clock.now()
+    tweets = [SimTweet(snowflake(now - 3600, 0), 'alice', now - 3600, 'baseline')]
+    tweets += [SimTweet(snowflake(now - 600 + i * 10, i + 1), 'alice', now - 600 + i * 10, f"burst tweet {i}")
+               for i in range(BURST)]
+    return Trace(['alice'], tweets, now - 7200)
+
+
+async def start_monitor(db, watched, monkeypatch, limits=None):
+    trace = burst_trace()
+    api = FakeTwitterAPI(trace, limits)
+    monkeypatch.setattr(settings, 'TWITTER_API_BASE_URL', await api.start())
+    watched(['alice'])
+    monitor = MonitorService(TwitterService(), WeChatService())
+    monitor.last_tweet_ids['alice'] = str(trace.tweets[0].id)
+    monitor.pipeline.start()
+    return api, trace, monitor
+
+
+async def stop_monitor(api: FakeTwitterAPI, monitor: MonitorService):
+    await monitor.pipeline.stop()
+    await monitor.twitter_service.close()
+    await api.stop()
+
+
+async def drain(monitor: MonitorService):
+    for stage in monitor.pipeline.stages:
+        await stage.queue.join()
+
+
+async def state():
+    async with get_db() as db:
+        cursor = await db.execute("SELECT tweet_id FROM tweet_records")
+        tweets = sorted(int(row[0]) for row in await cursor.fetchall())
+        cursor = await db.execute("SELECT COUNT(*), COUNT(DISTINCT tweet_id) FROM notification_outbox")
+        outbox = tuple(await cursor.fetchone())
+        cursor = await db.execute("SELECT since_id, until_id FROM poll_gaps")
+        gaps = [tuple(row) for row in await cursor.fetchall()]
+    return tweets, outbox, gaps
+
+
+async def backfill_next_gap(monitor: MonitorService) -> bool:
+    gap_id, kind, target, since_id, until_id = await monitor.backfill._next_gap()
+    tweets = await monitor.backfill._fetch_gap(gap_id, kind, target, str(since_id), str(until_id))
+    return await monitor._process_backfill(gap_id, kind, tweets)
+
+
+async def test_burst_is_polled_then_backfilled(db, watched, monkeypatch):
+    api, trace, monitor = await start_monitor(db, watched, monkeypatch)
+    try:
+        burst = [tweet.id for tweet in trace.tweets[1:]]
+        await monitor._check_tweets()
+        await drain(monitor)
+
+        # 实时轮询通知最新一页，游标与本页最旧一条之间记为缺口
+        tweets, outbox, gaps = await state()
+        assert tweets == burst[-5:]
+        assert outbox == (5, 5)
+        assert gaps == [(trace.tweets[0].id, burst[-5])]
+
+        assert await backfill_next_gap(monitor)
+        tweets, outbox, gaps = await state()
+        assert tweets == burst
+        assert outbox == (BURST, BURST)
+        assert gaps == []
+        # 补齐每页取满 100 条，整个缺口一次调用取完
+        assert api.calls['/2/users/:id/tweets'] == 2
+    finally:
+        await stop_monitor(api, monitor)
+
+
+async def test_backfill_waits_for_window_reset_when_budget_is_reserved(db, watched, monkeypatch, fast_clock):
+    monkeypatch.setattr(settings, 'BACKFILL_API_RESERVE', 0.75)
+    api, trace, monitor = await start_monitor(db, watched, monkeypatch, limits={'/2/users/:id/tweets': 4})
+    try:
+        await monitor._check_tweets()
+        await drain(monitor)
+
+        # 实时轮询后剩余 3 次，不超过保留的 75%，补齐不占用
+        rate_limiter = monitor.twitter_service.rate_limiter
+        assert rate_limiter.try_acquire(ENDPOINT_USER_TWEETS, reserve=settings.BACKFILL_API_RESERVE) is None
+
+        started = clock.now()
+        assert await backfill_next_gap(monitor)
+        assert clock.now() - started >= 600  # 等到 15 分钟窗口重置后才调用
+        tweets, outbox, gaps = await state()
+        assert len(tweets) == BURST and gaps == []
+        assert api.rejected['/2/users/:id/tweets'] == 0
+    finally:
+        await stop_monitor(api, monitor)
+
+
+async def test_empty_page_with_next_token_does_not_drop_the_poll(db, watched, monkeypatch):
+    api, trace, monitor = await start_monitor(db, watched, monkeypatch)
+    try:
+        # 时间线排除了转推和回复：过滤后整页为空，但仍带 next_token
+        async def empty_page(username, since_id=None):
+            return [], True
+
+        monkeypatch.setattr(monitor.twitter_service, 'poll_user_tweets', empty_page)
+        monitor.stream.connected = True
+        monitor.stream.covered = {'alice'}
+        submitted = []
+        submit = monitor.pipeline.submit
+
+        async def spy(batch, wait=False):
+            submitted.append(batch)
+            return await submit(batch, wait)
+
+        monkeypatch.setattr(monitor.pipeline, 'submit', spy)
+        await monitor._check_tweets()
+        await drain(monitor)
+
+        assert len(submitted) == 1 and submitted[0].gaps == []
+        assert await state() == ([], (0, 0), [])
+        # 轮询正常结束，追赶凭据照常生效
+        assert monitor.stream.caught_up == {'alice'}
+    finally:
+        monitor.stream.connected = False
+        await stop_monitor(api, monitor)
@@ -0,0 +1,119 @@
+import json
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from app.config import settings
+from app.models.database import get_db
+from app.models.tweet import Tweet
+from app.services.dedup import SimHashIndex, simhash
+from app.services.monitor_service import MonitorService
+from app.services.pipeline import PollBatch
+from app.services.twitter_service import TwitterService
+from app.services.wechat_service import WeChatService
+
+TEXT = "Mainnet upgrade ships next week with faster finality and lower fees for everyone"
+WINDOW = 600
+
+
+def test_near_duplicates_within_distance_are_found():
+    index = SimHashIndex(window_seconds=WINDOW, max_distance=3)
+    fingerprint = simhash(TEXT)
+    index.add('1', fingerprint, 1000)
+    assert index.find(fingerprint ^ 0b101, 1100, 1100) == '1'
+    assert index.find(fingerprint ^ 0b11111, 1100, 1100) is None
+    # 链接和 @提及不影响指纹
+    assert simhash(f"@someone {TEXT} https://t.co/abc") == fingerprint
+
+
+def test_posted_at_of_both_tweets_is_compared():
+    index = SimHashIndex(window_seconds=WINDOW)
+    fingerprint = simhash(TEXT)
+    index.add('new', fingerprint, 10000)
+    # 补齐取回的旧推文：条目仍在窗口内，但两条推文的发布时间相差超过窗口
+    assert index.find(fingerprint, 10000 - 2 * WINDOW, 10000) is None
+    assert index.find(fingerprint, 10000 - WINDOW, 10000) == 'new'
+    # 超出窗口的条目被淘汰
+    assert index.find(fingerprint, 10000 + 2 * WINDOW, 10000 + 2 * WINDOW) is None
+    assert len(index) == 0
+
+
+def test_duplicates_are_routed_to_groups_that_missed_the_original():
+    index = SimHashIndex(window_seconds=WINDOW)
+    index.add('1', simhash(TEXT), 1000, {'a', 'all'})
+    assert index.route('1', {'b', 'all'}) == {'b'}
+    assert index.route('1', {'a', 'b'}) == set()
+
+
+def make_tweet(tweet_id: int, author: str, text: str = TEXT) -> Tweet:
+    posted_at = time.time()
+    created_at = datetime.fromtimestamp(posted_at, tz=timezone.utc).isoformat()
+    return Tweet(tweet_id, author, text, created_at, posted_at)
+
+
+@pytest.fixture
+def routed_monitor(tmp_path, monkeypatch):
+    rules = tmp_path / 'rules.json'
+    rules.write_text(json.dumps({'groups': [
+        {'name': 'a', 'webhook_url': 'https://example.invalid/a', 'rules': [{'accounts': ['alice']}]},
+        {'name': 'b', 'webhook_url': 'https://example.invalid/b', 'rules': [{'accounts': ['bob']}]},
+        {'name': 'all', 'webhook_url': 'https://example.invalid/all', 'rules': [{'accounts': ['*']}]}
+    ]}), encoding='utf-8')
+    monkeypatch.setattr(settings, 'NOTIFY_RULES_FILE', str(rules))
+    monkeypatch.setattr(settings, 'DEDUP_WINDOW_SECONDS', WINDOW)
+    return lambda: MonitorService(TwitterService(), WeChatService())
+
+
+async def process(monitor: MonitorService, tweets) -> PollBatch:
+    batch = await monitor._filter_batch(PollBatch(tweets, [], advance_cursor=False))
+    await monitor._persist_batch(batch)
+    return batch
+
+
+async def outbox_targets():
+    async with get_db() as db:
+        cursor = await db.execute("SELECT tweet_id, target FROM notification_outbox")
+        return {(tweet_id, target) for tweet_id, target in await cursor.fetchall()}
+
+
+@pytest.mark.anyio
+async def test_duplicate_is_only_suppressed_for_groups_that_received_it(db, routed_monitor):
+    monitor = routed_monitor()
+    await process(monitor, [make_tweet(1, 'alice')])
+    batch = await process(monitor, [make_tweet(2, 'bob', f"RT {TEXT}")])
+
+    assert batch.duplicates == {'2': '1'}
+    assert await outbox_targets() == {('1', 'a'), ('1', 'all'), ('2', 'b')}
+
+    # 重启后按推文记录恢复已发送的分组
+    restarted = routed_monitor()
+    await restarted._load_dedup_index()
+    batch = await process(restarted, [make_tweet(3, 'bob', f"{TEXT} https://t.co/xyz")])
+    assert batch.duplicates == {'3': '1'}
+    assert batch.routed == []
+
+
+def test_max_distance_can_be_changed_at_runtime():
+    index = SimHashIndex(window_seconds=WINDOW, max_distance=3)
+    fingerprint = simhash(TEXT)
+    index.add('1', fingerprint, 1000, {'a'})
+    near = fingerprint ^ 0b11111
+    assert index.find(near, 1000, 1000) is None
+
+    index.configure(6)
+    assert index.find(near, 1000, 1000) == '1'
+    assert index.route('1', {'a', 'b'}) == {'b'}
+
+
+@pytest.mark.anyio
+async def test_reloaded_dedup_distance_takes_effect(db, routed_monitor, monkeypatch):
+    from app.services.watch_list import apply_settings
+    monkeypatch.setattr(settings, 'DEDUP_MAX_DISTANCE', settings.DEDUP_MAX_DISTANCE)
+    monitor = routed_monitor()
+    await process(monitor, [make_tweet(1, 'alice')])
+
+    assert apply_settings({'DEDUP_MAX_DISTANCE': 0}) == {'DEDUP_MAX_DISTANCE': 0}
+    batch = await process(monitor, [make_tweet(2, 'bob', f"RT {TEXT}")])
+    assert batch.duplicates == {}
+    assert monitor.dedup_index.max_distance == 0
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from aiohttp import web
+
+from app import main
+from app.config import settings
+from app.services.monitor_service import MonitorService
+from app.services.twitter_service import TwitterService
+from app.services.wechat_service import WeChatService
+
+pytestmark = pytest.mark.anyio
+
+SLOW_RESPONSE_SECONDS = 1.0
+MAX_RESPONSE_SECONDS = 0.2  # 轮询进行中管理接口的响应时间上限
+
+
+@pytest.fixture
+async def slow_twitter(monkeypatch):
+    """每个时间线请求都要 SLOW_RESPONSE_SECONDS 秒才返回的假 Twitter API；返回收到请求时置位的事件"""
+    requested = asyncio.Event()
+
+    async def user_tweets(request: web.Request) -> web.Response:
+        requested.set()
+        await asyncio.sleep(SLOW_RESPONSE_SECONDS)
+        return web.json_response({
+            'data': [{
+                'id': '1800000000000000000',
+                'text': 'hello from the slow fake twitter',
+                'created_at': '2024-06-01T00:00:00.000Z',
+                'public_metrics': {'retweet_count': 0, 'like_count': 0, 'reply_count': 0, 'quote_count': 0}
+            }]
+        })
+
+    app = web.Application()
+    app.router.add_get('/2/users/{user_id}/tweets', user_tweets)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    monkeypatch.setattr(settings, 'TWITTER_API_BASE_URL', f"http://127.0.0.1:{port}")
+    yield requested
+    await runner.cleanup()
+
+
+async def test_endpoints_respond_while_poll_in_flight(db, slow_twitter, watched, monkeypatch):
+    watched(['slow'])
+    twitter_service = TwitterService()
+    twitter_service.user_id_cache['slow'] = '42'
+    monitor = MonitorService(twitter_service, WeChatService())
+    monkeypatch.setattr(main, 'monitor_service', monitor)
+
+    poll = asyncio.create_task(monitor._check_tweets())
+    await asyncio.wait_for(slow_twitter.wait(), timeout=5)
+
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            for path in ('/health', '/monitor/status'):
+                started = time.perf_counter()
+                response = await client.get(path)
+                elapsed = time.perf_counter() - started
+                assert response.status_code == 200
+                assert elapsed < MAX_RESPONSE_SECONDS, f"{path} took {elapsed:.3f}s while a poll was in flight"
+                assert not poll.done()
+
+        await asyncio.wait_for(poll, timeout=5)
+        batch = monitor.pipeline.stages[0].queue.get_nowait()
+        assert [tweet.id for tweet in batch.tweets] == [1800000000000000000]
+    finally:
+        poll.cancel()
+        await twitter_service.close()
@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+import httpx
+import pytest
+
+from app import main
+from app.config import settings
+from app.models.database import get_db, transaction
+from app.services.retention import ARCHIVE_COLUMNS, RetentionService, _append_member, archive_record, segment_path
+from app.services.tweet_history import snowflake_from_datetime
+from app.services.tweet_export import export_tweets
+from app.utils import clock
+
+pytestmark = pytest.mark.anyio
+
+
+async def seed(days_ago: list, author: str = 'alice') -> list:
+    rows = []
+    for i, days in enumerate(days_ago):
+        created_at = clock.utcnow() - timedelta(days=days)
+        tweet_id = snowflake_from_datetime(created_at) + i
+        rows.append((str(tweet_id), author, f"{author} says \"hi\", #{i}",
+                     f"https://twitter.com/{author}/status/{tweet_id}", created_at.isoformat(), str({'likes': i})))
+    async with transaction() as db:
+        await db.executemany(
+            """INSERT INTO tweet_records (tweet_id, username, content, tweet_url, created_at, metrics)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+    return [row[0] for row in rows]
+
+
+async def export(**params) -> httpx.Response:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        return await client.get('/tweets/export', params=params)
+
+
+def ndjson_ids(response: httpx.Response) -> list:
+    return [json.loads(line)['id'] for line in response.text.splitlines()]
+
+
+async def test_ndjson_export_is_oldest_first_and_filtered(db):
+    alice = await seed([3, 2, 1])
+    bob = await seed([2.5], author='bob')
+    response = await export()
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    assert ndjson_ids(response) == [alice[0], bob[0], alice[1], alice[2]]
+    assert json.loads(response.text.splitlines()[0])['metrics'] == {'likes': 0}
+
+    assert ndjson_ids(await export(author='bob')) == bob
+    since = (clock.utcnow() - timedelta(days=2.2)).isoformat()
+    assert ndjson_ids(await export(author='alice', since=since)) == alice[1:]
+
+
+async def test_csv_export_quotes_text(db):
+    ids = await seed([1])
+    response = await export(format='csv')
+    assert response.headers['content-type'].startswith('text/csv')
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0][:3] == ['id', 'author', 'text']
+    assert rows[1][:3] == [ids[0], 'alice', 'alice says "hi", #0']
+    assert json.loads(rows[1][5]) == {'likes': 0}
+
+
+async def test_batches_cover_every_row(db):
+    ids = await seed([5 - i * 0.01 for i in range(25)])
+    chunks = [chunk async for chunk in export_tweets(batch_size=4)]
+    assert len(chunks) == 7
+    assert [json.loads(line)['id'] for line in ''.join(chunks).splitlines()] == ids
+
+
+async def test_archived_tweets_are_exported_once(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'RETENTION_DAYS', 10)
+    monkeypatch.setattr(settings, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+    ids = await seed([30, 30, 1])
+    await RetentionService().run_once()
+
+    # 归档与导出同时进行：一条推文已写入新的归档段、尚未从数据库删除
+    late = await seed([20])
+    async with get_db() as connection:
+        cursor = await connection.execute(f"SELECT {ARCHIVE_COLUMNS} FROM tweet_records WHERE tweet_id = ?", (late[0],))
+        row = await cursor.fetchone()
+    day = (clock.utcnow() - timedelta(days=20)).date()
+    _append_member(segment_path(settings.ARCHIVE_DIR, day, int(late[0])), [archive_record(row)])
+
+    assert ndjson_ids(await export()) == [late[0], ids[2]]
+    assert ndjson_ids(await export(include_archive='true')) == [ids[0], ids[1], late[0], ids[2]]
@@ -0,0 +1,115 @@
+import pytest
+
+from app.config import settings
+from app.services.filtered_stream import (
+    HTTP_BACKOFF_BASE, NETWORK_BACKOFF_MAX, NETWORK_BACKOFF_STEP, RATE_LIMIT_BACKOFF_BASE, FilteredStream
+)
+from app.services.twitter_service import TwitterService, search_members
+from app.utils import clock
+from benchmarks.simulator.fake_twitter import FakeTwitterAPI
+from benchmarks.simulator.traces import Trace
+
+pytestmark = pytest.mark.anyio
+
+
+async def deliver(tweets):
+    pass
+
+
+@pytest.fixture
+async def api(db, monkeypatch):
+    api = FakeTwitterAPI(Trace(['alice', 'bob', 'carol'], [], clock.now()), stream={})
+    monkeypatch.setattr(settings, 'TWITTER_API_BASE_URL', await api.start())
+    twitter_service = TwitterService()
+    yield api, twitter_service
+    await twitter_service.close()
+    await api.stop()
+
+
+def connected_stream(covered) -> FilteredStream:
+    stream = FilteredStream(TwitterService(), deliver)
+    stream.covered = set(covered)
+    stream._connected()
+    return stream
+
+
+async def test_ticket_covers_only_accounts_with_rules():
+    stream = FilteredStream(TwitterService(), deliver)
+    assert stream.begin_poll(['alice']) is None  # 未连接时照常轮询，不追赶
+
+    stream = connected_stream({'alice', 'bob'})
+    ticket = stream.begin_poll(['Alice', 'carol'])
+    assert ticket == (stream.session, ['Alice'])
+    stream.finish_poll(ticket)
+    assert stream.caught_up == {'alice'}
+
+
+async def test_ticket_from_a_previous_connection_is_ignored():
+    stream = connected_stream({'alice', 'bob'})
+    ticket = stream.begin_poll(['alice', 'bob'])
+
+    # 轮询期间连接断开并重连：断开期间的推文还没有被追赶轮询取回
+    stream._disconnected()
+    stream.finish_poll(ticket)
+    assert stream.caught_up == set()
+    stream._connected()
+    stream.finish_poll(ticket)
+    assert stream.caught_up == set()
+
+    stream.finish_poll(stream.begin_poll(['bob']))
+    assert stream.caught_up == {'bob'}
+    assert stream.reconnects == 1
+
+
+async def test_backoff_grows_per_reason_and_resets_on_connect(monkeypatch):
+    monkeypatch.setattr(settings, 'STREAM_RECONNECT_MAX_SECONDS', 320)
+    stream = FilteredStream(TwitterService(), deliver)
+    # 网络错误线性增加，第一次立即重连
+    assert [stream._backoff('network_error') for _ in range(3)] == [0, NETWORK_BACKOFF_STEP, NETWORK_BACKOFF_STEP * 2]
+    stream._failures = 1000
+    assert stream._backoff('stalled') == NETWORK_BACKOFF_MAX
+
+    stream._connected()
+    assert [stream._backoff('http_error') for _ in range(3)] == [HTTP_BACKOFF_BASE * k for k in (1, 2, 4)]
+    stream._connected()
+    assert [stream._backoff('rate_limited') for _ in range(4)] == [RATE_LIMIT_BACKOFF_BASE * k for k in (1, 2, 4)] + [320]
+
+
+async def test_sync_rules_adds_before_deleting(api, watched, monkeypatch, fast_clock):
+    fake, twitter_service = api
+    monkeypatch.setattr(settings, 'STREAM_RULE_MAX_LENGTH', 50)  # 每条规则只放得下两个账号
+    # 同一应用下的其他规则不受影响
+    await twitter_service.update_stream_rules(add=[{'value': 'from:someone', 'tag': 'other'}])
+    stream = FilteredStream(twitter_service, deliver)
+
+    watched(['alice', 'bob', 'carol'])
+    await stream.sync_rules()
+    assert stream.covered == {'alice', 'bob', 'carol'}
+    assert len(stream.rules) == 2
+    calls = dict(fake.calls)
+
+    # 账号没有变化时不调用 API
+    await stream.sync_rules()
+    assert dict(fake.calls) == calls
+
+    stream.caught_up = {'alice', 'bob'}
+    requests = []
+    update = twitter_service.update_stream_rules
+
+    async def spy(add=None, delete_ids=None):
+        # 记录每次请求时服务端已生效的规则覆盖的账号
+        live = {member for rule in fake.rules.values() for member in search_members(rule['value'])}
+        requests.append(('add' if add else 'delete', live))
+        return await update(add=add, delete_ids=delete_ids)
+
+    monkeypatch.setattr(twitter_service, 'update_stream_rules', spy)
+    watched(['alice', 'carol'])
+    await stream.sync_rules()
+    # 先添加新规则再删除旧规则：删除时 alice 和 carol 已有新规则覆盖
+    assert [kind for kind, _ in requests] == ['add', 'delete']
+    assert {'alice', 'carol'} <= requests[1][1]
+    assert stream.covered == {'alice', 'carol'}
+    assert stream.caught_up == {'alice'}  # 移出监控列表的账号不再计为已追赶
+    assert sorted(rule['value'] for rule in fake.rules.values()) == [
+        '(from:alice OR from:carol) -is:retweet -is:reply', 'from:someone'
+    ]
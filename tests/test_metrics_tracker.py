@@ -0,0 +1,145 @@
+import pytest
+
+from app.config import settings
+from app.models.database import get_db, transaction
+from app.services.metrics_tracker import ALERT_LIKES, ALERT_RETWEETS, MetricsTracker, prune_samples
+from app.services.notification_outbox import NotificationOutbox
+from app.services.routing import build_rule_engine
+from app.services.sharding import LocalShardCoordinator
+from app.services.twitter_service import TwitterService
+
+pytestmark = pytest.mark.anyio
+
+NOW = 1_000_000
+BASE = 300
+
+CONFIG = {
+    'groups': [
+        {'name': 'all', 'webhook_url': 'u', 'rules': [{'accounts': ['*']}]},
+        {'name': 'eth', 'webhook_url': 'u', 'rules': [{'accounts': ['vitalik'], 'keywords': ['mainnet']}]}
+    ]
+}
+
+
+class OwnedCoordinator(LocalShardCoordinator):
+    """只负责给定账号的 worker"""
+
+    is_distributed = True
+
+    def __init__(self, owned):
+        super().__init__('worker-a', 1)
+        self.owned = owned
+
+    def owned_accounts(self, usernames):
+        return list(self.owned)
+
+
+@pytest.fixture
+async def tracker(db, monkeypatch):
+    monkeypatch.setattr(settings, 'METRICS_SAMPLE_BASE_SECONDS', BASE)
+    monkeypatch.setattr(settings, 'METRICS_TRACKING_HOURS', 48)
+    tracker = MetricsTracker(TwitterService(), build_rule_engine(CONFIG), NotificationOutbox({}))
+    yield tracker
+    await tracker.twitter_service.close()
+
+
+async def track(*rows):
+    """rows: (tweet_id, username, posted_at, next_sample_at, samples, alerted)"""
+    async with transaction() as db:
+        await db.executemany(
+            """INSERT INTO tracked_tweets (tweet_id, username, posted_at, next_sample_at, samples, alerted)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+
+
+async def query(sql: str, params=()) -> list:
+    async with get_db() as db:
+        cursor = await db.execute(sql, params)
+        return [tuple(row) for row in await cursor.fetchall()]
+
+
+async def test_claim_due_returns_due_tweets_and_next_due(tracker):
+    await track(
+        (1, 'alice', NOW - 900, NOW - 10, 1, 0),
+        (2, 'bob', NOW - 900, NOW - 100, 1, 0),
+        (3, 'alice', NOW - 900, NOW + 50, 1, 0),
+        (4, 'bob', NOW - 900, NOW + 20, 1, 0)
+    )
+    rows, next_due = await tracker._claim_due(NOW)
+    assert [row[0] for row in rows] == [2, 1]  # 最早到期的先采样
+    assert next_due == NOW - 100
+
+    assert await tracker._claim_due(NOW - 1000) == ([], NOW - 100)
+
+    # 多 worker 部署时只取本 worker 负责的账号
+    tracker.coordinator = OwnedCoordinator(['alice'])
+    rows, next_due = await tracker._claim_due(NOW)
+    assert [row[0] for row in rows] == [1]
+    assert next_due == NOW - 10
+
+
+async def test_record_samples_schedules_decaying_resamples(tracker):
+    horizon = 48 * 3600
+    await track(
+        (1, 'alice', NOW - 900, NOW, 0, 0),
+        (2, 'alice', NOW - 900, NOW, 3, 0),
+        (3, 'alice', NOW - horizon + BASE, NOW, 0, 0),  # 下一次采样超出跟踪时长
+        (4, 'alice', NOW - 900, NOW, 0, 0)  # 已删除，查询结果中没有
+    )
+    rows, _ = await tracker._claim_due(NOW)
+    metrics = {tweet_id: {'likes': tweet_id * 10, 'retweets': 1} for tweet_id in (1, 2, 3)}
+    await tracker._record_samples(rows, metrics, NOW)
+
+    assert await query("SELECT tweet_id, next_sample_at, samples FROM tracked_tweets ORDER BY tweet_id") == [
+        (1, NOW + BASE * 2, 1),
+        (2, NOW + BASE * 16, 4)
+    ]
+    assert await query("SELECT tweet_id, sampled_at, likes, retweets FROM tweet_metrics ORDER BY tweet_id") == [
+        (1, NOW, 10, 1), (2, NOW, 20, 1), (3, NOW, 30, 1)
+    ]
+    assert await query("SELECT COUNT(*) FROM notification_outbox") == [(0,)]  # 未配置阈值
+
+
+async def test_alerts_are_routed_once_per_threshold(tracker, monkeypatch):
+    monkeypatch.setattr(settings, 'METRICS_ALERT_LIKES', 100)
+    monkeypatch.setattr(settings, 'METRICS_ALERT_RETWEETS', 50)
+    async with transaction() as db:
+        await db.execute(
+            """INSERT INTO tweet_records (tweet_id, username, content, tweet_url, created_at)
+               VALUES ('1', 'vitalik', 'Mainnet is live', 'https://x.com/vitalik/status/1', '')"""
+        )
+    await track((1, 'vitalik', NOW - 900, NOW, 0, 0), (2, 'bob', NOW - 900, NOW, 0, ALERT_LIKES))
+    assert await tracker.outbox.pending_count() == 0
+
+    rows, _ = await tracker._claim_due(NOW)
+    await tracker._record_samples(rows, {1: {'likes': 150, 'retweets': 10}, 2: {'likes': 500, 'retweets': 80}}, NOW)
+
+    # 推文 1 越过点赞阈值，按原推文内容路由；推文 2 的点赞已提醒过，只提醒转推，没有推文记录时使用默认链接
+    outbox = await query("SELECT tweet_id, target, payload FROM notification_outbox ORDER BY tweet_id, target")
+    assert [row[:2] for row in outbox] == [('1:likes', 'all'), ('1:likes', 'eth'), ('2:retweets', 'all')]
+    assert '"url": "https://x.com/vitalik/status/1"' in outbox[0][2]
+    assert '"url": "https://twitter.com/bob/status/2"' in outbox[2][2]
+    assert tracker.outbox.pending == 3
+    assert await query("SELECT tweet_id, alerted FROM tracked_tweets ORDER BY tweet_id") == [
+        (1, ALERT_LIKES), (2, ALERT_LIKES | ALERT_RETWEETS)
+    ]
+
+    # 之后的采样不再重复提醒
+    await tracker._record_samples(
+        await query("SELECT tweet_id, username, posted_at, samples, alerted FROM tracked_tweets"),
+        {1: {'likes': 200, 'retweets': 10}, 2: {'likes': 600, 'retweets': 90}}, NOW + BASE * 2
+    )
+    assert await query("SELECT COUNT(*) FROM notification_outbox") == [(3,)]
+
+
+async def test_samples_expire_with_the_retention_cutoff(db):
+    await track((1, 'alice', NOW, NOW, 0, 0), (5, 'alice', NOW, NOW, 0, 0))
+    async with transaction() as conn:
+        await conn.executemany(
+            "INSERT INTO tweet_metrics VALUES (?, ?, 0, 0, 0, 0)",
+            [(tweet_id, NOW + i) for tweet_id in (1, 2, 3, 5) for i in range(3)]
+        )
+    assert await prune_samples(before_id=5, batch_size=2) == 9
+    assert await query("SELECT DISTINCT tweet_id FROM tweet_metrics") == [(5,)]
+    assert await query("SELECT tweet_id FROM tracked_tweets") == [(5,)]
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.models.database import get_db, transaction
+from app.services.notification_outbox import ENQUEUE_SQL, CLAIM_LEASE_SECONDS, NotificationOutbox, enqueue_rows
+from app.utils import clock
+from app.utils.metrics import DB_TRANSACTION_SECONDS, OUTBOX_PENDING
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeWeChat:
+    """记录发送内容的假 webhook；delay 模拟在限流窗口中排队的时间，results 依次决定每次发送是否成功"""
+
+    def __init__(self, delay: float = 0.0, results=None):
+        self.delay = delay
+        self.results = list(results or [])
+        self.sent = []
+        self.started = asyncio.Event()
+
+    async def send_tweet_notification(self, tweet_data) -> bool:
+        self.started.set()
+        await clock.sleep(self.delay)
+        self.sent.append(tweet_data['id'])
+        return self.results.pop(0) if self.results else True
+
+    async def close(self):
+        pass
+
+
+async def enqueue(*tweet_ids, target='default'):
+    rows = enqueue_rows([({'id': tweet_id, 'author': 'a', 'text': 't'}, target) for tweet_id in tweet_ids])
+    async with transaction() as db:
+        await db.executemany(ENQUEUE_SQL, rows)
+
+
+async def statuses():
+    async with get_db() as db:
+        cursor = await db.execute("SELECT tweet_id, status, attempts FROM notification_outbox ORDER BY id")
+        return await cursor.fetchall()
+
+
+async def wait_until(predicate, timeout: float = 5.0):
+    for _ in range(int(timeout / 0.01)):
+        if await predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+async def test_lease_is_renewed_while_delivery_waits(db, fast_clock):
+    # 发送在限流中排队的时间远超租约，期间其他 worker 不能领取同一条记录
+    service = FakeWeChat(delay=CLAIM_LEASE_SECONDS * 3)
+    outbox = NotificationOutbox({'default': service})
+    await enqueue('1')
+    outbox.start()
+    try:
+        await asyncio.wait_for(service.started.wait(), timeout=5)
+        await clock.sleep(CLAIM_LEASE_SECONDS * 2)
+        assert await NotificationOutbox({})._claim_due(10) == []
+
+        async def delivered():
+            return (await statuses()) == [('1', 'delivered', 1)]
+        await wait_until(delivered)
+        assert service.sent == ['1']
+    finally:
+        await outbox.stop()
+
+
+async def test_failed_delivery_is_retried(db, fast_clock):
+    service = FakeWeChat(results=[False, True])
+    outbox = NotificationOutbox({'default': service})
+    await enqueue('1')
+    outbox.start()
+    try:
+        async def delivered():
+            return (await statuses()) == [('1', 'delivered', 2)]
+        await wait_until(delivered)
+        assert service.sent == ['1', '1']
+    finally:
+        await outbox.stop()
+
+
+async def test_claim_is_limited_to_rate_budget(db, fast_clock, monkeypatch):
+    monkeypatch.setattr(settings, 'WECHAT_RATE_LIMIT_PER_MINUTE', 5)
+    service = FakeWeChat(delay=1000)
+    outbox = NotificationOutbox({'default': service})
+    await enqueue(*[str(i) for i in range(12)])
+    outbox.start()
+    try:
+        await asyncio.wait_for(service.started.wait(), timeout=5)
+        async with get_db() as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM notification_outbox WHERE locked_until IS NOT NULL")
+            assert (await cursor.fetchone())[0] == 5
+    finally:
+        await outbox.stop()
+
+
+async def test_each_outbox_row_is_sent_once(db, fast_clock):
+    # 同一推文对同一分组只入队一次
+    await enqueue('1')
+    await enqueue('1')
+    await enqueue('1', target='other')
+    assert [row[:2] for row in await statuses()] == [('1', 'pending'), ('1', 'pending')]
+
+
+async def test_pending_gauge_is_tracked_in_memory(db, fast_clock):
+    await enqueue('1')
+    outbox = NotificationOutbox({'default': FakeWeChat()})
+    assert await outbox.pending_count() == 1  # 启动时从数据库加载一次
+
+    rows = enqueue_rows([({'id': tweet_id, 'author': 'a', 'text': 't'}, 'default') for tweet_id in ('1', '2', '3')])
+    async with transaction() as conn:
+        cursor = await conn.executemany(ENQUEUE_SQL, rows)
+        outbox.enqueued(cursor.rowcount)
+    assert OUTBOX_PENDING.labels().value == 3  # 已存在的记录被忽略，不重复计数
+
+    # 之后的计数随投递结果更新，不再查询数据库
+    await outbox._record_result([(row[0], row[3]) for row in await outbox._claim_due(2)], True, None)
+    assert OUTBOX_PENDING.labels().value == 1
+    await outbox._record_result([(row[0], row[3]) for row in await outbox._claim_due(1)], False, 'error')
+    assert await outbox.pending_count() == 1
+
+
+async def test_direct_commits_are_timed(db):
+    observed = DB_TRANSACTION_SECONDS.labels().count
+    async with get_db() as conn:
+        await conn.execute("SELECT 1")
+    assert DB_TRANSACTION_SECONDS.labels().count == observed  # 只读不计
+
+    async with get_db() as conn:
+        await conn.execute("INSERT INTO twitter_users (username, user_id, resolved_at) VALUES ('a', '1', 0)")
+        await conn.commit()
+    assert DB_TRANSACTION_SECONDS.labels().count == observed + 1
@@ -0,0 +1,115 @@
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from app.config import settings
+from app.models.database import get_db
+from app.models.tweet import Tweet
+from app.services.monitor_service import MonitorService
+from app.services.pipeline import PollBatch
+from app.services.twitter_service import TwitterService
+from app.services.wechat_service import WeChatService
+
+pytestmark = pytest.mark.anyio
+
+START_ID = 100
+
+
+def timeline(*tweet_ids: int) -> list:
+    """一页时间线：从新到旧排列"""
+    posted_at = time.time()
+    created_at = datetime.fromtimestamp(posted_at, tz=timezone.utc).isoformat()
+    return [Tweet(tweet_id, 'alice', f"tweet number {tweet_id} from alice", created_at, posted_at)
+            for tweet_id in sorted(tweet_ids, reverse=True)]
+
+
+@pytest.fixture
+async def monitor(db, watched):
+    watched(['alice'])
+    service = MonitorService(TwitterService(), WeChatService())
+    service.last_tweet_ids['alice'] = str(START_ID)
+    service.pipeline.start()
+    yield service
+    await service.pipeline.stop()
+    await service.twitter_service.close()
+    await service.outbox.close()
+
+
+def fail_next_save(monitor: MonitorService, monkeypatch):
+    save = monitor._save_poll_results
+
+    async def failing(batch):
+        monkeypatch.setattr(monitor, '_save_poll_results', save)
+        raise RuntimeError('disk I/O error')
+
+    monkeypatch.setattr(monitor, '_save_poll_results', failing)
+
+
+async def recorded():
+    async with get_db() as db:
+        cursor = await db.execute("SELECT tweet_id FROM tweet_records ORDER BY tweet_id")
+        tweets = [int(row[0]) for row in await cursor.fetchall()]
+        cursor = await db.execute("SELECT tweet_id FROM notification_outbox ORDER BY tweet_id")
+        notified = [int(row[0]) for row in await cursor.fetchall()]
+        cursor = await db.execute("SELECT since_id FROM poll_cursors WHERE username = 'alice'")
+        row = await cursor.fetchone()
+    return tweets, notified, row[0] if row else None
+
+
+async def test_failed_persist_restores_cursor_and_refetches(monitor, monkeypatch):
+    fail_next_save(monitor, monkeypatch)
+    assert not await monitor.pipeline.submit(PollBatch(timeline(101, 102), ['alice']), wait=True)
+
+    # 游标、最近保留的推文ID、去重索引和活跃度都恢复到批次之前
+    assert monitor.last_tweet_ids['alice'] == str(START_ID)
+    assert not monitor.recent_ids
+    assert len(monitor.dedup_index) == 0
+    assert 'alice' not in monitor.poll_scheduler.accounts
+    assert await recorded() == ([], [], None)
+
+    # 下一轮轮询从原来的游标重新取回
+    assert await monitor.pipeline.submit(PollBatch(timeline(101, 102), ['alice']), wait=True)
+    assert await recorded() == ([101, 102], [101, 102], 102)
+    assert monitor.poll_scheduler.accounts['alice'].count > 0
+
+
+async def test_later_batch_does_not_persist_cursor_past_failed_tweets(monitor, monkeypatch):
+    # 第一批写库失败时，已经过滤的第二批不能把数据库中的游标推进到第一批的推文之后
+    fail_next_save(monitor, monkeypatch)
+    first = await monitor._filter_batch(PollBatch(timeline(101, 102), ['alice']))
+    second = await monitor._filter_batch(PollBatch(timeline(103, 104), ['alice']))
+    with pytest.raises(RuntimeError):
+        await monitor._persist_batch(first)
+    await monitor._persist_batch(second)
+    tweets, notified, cursor = await recorded()
+    assert tweets == [103, 104] and cursor == START_ID
+
+    # 重新轮询取回全部推文，第二批的推文不会重复通知
+    assert await monitor.pipeline.submit(PollBatch(timeline(101, 102, 103, 104, 105), ['alice']), wait=True)
+    assert await recorded() == ([101, 102, 103, 104, 105], [101, 102, 103, 104, 105], 105)
+
+
+async def test_failed_search_batch_restores_query_since_id(monitor):
+    batch = PollBatch(timeline(101), ['alice'], search_cursor=('from:alice', '90'))
+    monitor.search_since_ids['from:alice'] = '101'
+    monitor._rollback_batch(batch)
+    assert monitor.search_since_ids['from:alice'] == '90'
+
+    batch = PollBatch(timeline(101), ['alice'], search_cursor=('from:alice', None))
+    monitor._rollback_batch(batch)
+    assert 'from:alice' not in monitor.search_since_ids
+
+
+async def test_restart_does_not_count_recent_tweets_twice(monitor, monkeypatch):
+    monkeypatch.setattr(settings, 'TWITTER_USERNAMES', '')
+    assert await monitor.pipeline.submit(PollBatch(timeline(101, 102), ['alice']), wait=True)
+
+    rates = []
+    for _ in range(2):
+        await monitor.start_monitoring()
+        rates.append(monitor.poll_scheduler.rate('alice', time.time()))
+        await monitor.stop_monitoring()
+    # 每次启动都从推文记录重新学习活跃度，停止再启动不会把回看窗口内的推文再计入一次
+    assert rates[0] == pytest.approx(rates[1])
+    assert rates[0] > monitor.poll_scheduler.prior_rate
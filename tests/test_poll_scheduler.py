@@ -0,0 +1,74 @@
+from collections import Counter
+
+from app.services.poll_scheduler import AdaptivePollScheduler
+
+
+def make_scheduler(**overrides) -> AdaptivePollScheduler:
+    options = dict(poll_interval=20, min_interval=60, max_interval=3600, half_life=72 * 3600,
+                   prior_rate=1 / (7 * 24 * 3600))
+    options.update(overrides)
+    return AdaptivePollScheduler(**options)
+
+
+def run(scheduler: AdaptivePollScheduler, start: float, rounds: int, step: float = 20) -> Counter:
+    polled = Counter()
+    for i in range(rounds):
+        username = scheduler.next_account(start + i * step)
+        if username:
+            polled[username] += 1
+    return polled
+
+
+def test_accounts_observed_before_sync_are_scheduled():
+    # 启动时先从推文记录学习活跃度，再同步监控列表
+    scheduler = make_scheduler()
+    scheduler.observe('active', 1000)
+    scheduler.sync(['active', 'quiet'], 2000)
+
+    polled = run(scheduler, 2000, 200)
+    assert polled['active'] > 0
+    assert polled['quiet'] > 0
+
+
+def test_active_account_is_polled_more_often():
+    scheduler = make_scheduler()
+    for i in range(50):
+        scheduler.observe('active', 10000 + i * 600)
+    scheduler.sync(['active', 'quiet1', 'quiet2', 'quiet3'], 40000)
+
+    polled = run(scheduler, 40000, 1000)
+    assert polled['active'] > polled['quiet1']
+    assert min(polled.values()) >= 1000 * 20 // 3600  # 最大间隔保证不活跃账号也会被轮询
+
+
+def test_min_interval_limits_polling():
+    scheduler = make_scheduler(min_interval=100)
+    scheduler.sync(['only'], 0)
+    assert scheduler.next_account(0) == 'only'
+    assert scheduler.next_account(50) is None
+    assert scheduler.next_account(100) == 'only'
+
+
+def test_removed_accounts_are_not_polled():
+    scheduler = make_scheduler()
+    scheduler.sync(['a', 'b'], 0)
+    scheduler.sync(['a'], 0)
+    assert set(run(scheduler, 0, 50)) == {'a'}
+
+    # 重新加入后恢复轮询
+    scheduler.sync(['a', 'b'], 1000)
+    assert 'b' in run(scheduler, 1000, 50)
+
+
+def test_configure_applies_shorter_max_interval_to_scheduled_accounts():
+    scheduler = make_scheduler(poll_interval=300)
+    for i in range(50):
+        scheduler.observe('active', -30000 + i * 600)
+    scheduler.sync(['active', 'quiet'], 0)
+    assert set(run(scheduler, 0, 2, step=60)) == {'active', 'quiet'}
+    assert set(run(scheduler, 120, 10, step=60)) == {'active'}  # quiet 排在一小时后
+
+    # 热更新缩短最大间隔后，已排期的账号提前到新的最大间隔内
+    scheduler.configure(poll_interval=300, min_interval=60, max_interval=120, now=720)
+    assert 'quiet' in run(scheduler, 720, 3, step=60)
+    assert scheduler.interval('quiet', 900) == 120
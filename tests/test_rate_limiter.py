@@ -0,0 +1,105 @@
+import pytest
+
+from app.services.rate_limiter import DEFAULT_RESET_SECONDS, RateLimitScheduler, TokenPool
+from app.utils import clock
+
+pytestmark = pytest.mark.anyio
+
+ENDPOINT = '/2/users/:id/tweets'
+
+
+def window(limit: int, remaining: int, reset_in: float = 900, reset_at: float = None) -> dict:
+    return {
+        'x-rate-limit-limit': str(limit),
+        'x-rate-limit-remaining': str(remaining),
+        'x-rate-limit-reset': str(int(reset_at or clock.now() + reset_in))
+    }
+
+
+async def test_rate_limited_token_is_rotated_out(db):
+    pool = TokenPool(['token-a', 'token-b'])
+    first, second = pool.tokens
+    await pool.record_response(first, ENDPOINT, window(100, 0), 429)
+
+    # 只有收到 429 的 token 退出轮换，接口整体没有限流
+    assert not pool.is_rate_limited(ENDPOINT)
+    assert await pool.acquire(ENDPOINT) is second
+    assert await pool.acquire(ENDPOINT) is second
+
+    await pool.record_response(second, ENDPOINT, window(100, 0, reset_in=300), 429)
+    assert pool.is_rate_limited(ENDPOINT)
+    assert 290 <= pool.get_reset_time(ENDPOINT) <= 300  # 第一个恢复的 token
+
+
+async def test_pick_keeps_the_reserve_for_live_polling(db):
+    pool = TokenPool(['token-a', 'token-b'])
+    first, second = pool.tokens
+    await pool.record_response(first, ENDPOINT, window(100, 10))
+    await pool.record_response(second, ENDPOINT, window(100, 60))
+
+    # 剩余额度高于保留比例的 token 中选剩余最多的一个
+    assert pool.try_acquire(ENDPOINT, reserve=0.5) is second
+    assert second.scheduler.budgets[ENDPOINT].remaining == 59
+
+    await pool.record_response(second, ENDPOINT, window(100, 40))
+    assert pool.try_acquire(ENDPOINT, reserve=0.5) is None
+    # 实时轮询不保留额度，仍可调用（second 刚被占用，按窗口均匀分配时先轮到 first）
+    assert pool.try_acquire(ENDPOINT) is first
+
+
+async def test_headers_calibrate_the_budget(db):
+    scheduler = RateLimitScheduler('token')
+    headers = window(100, 42)
+    await scheduler.record_response(ENDPOINT, headers)
+    budget = scheduler.budgets[ENDPOINT]
+    assert (budget.limit, budget.remaining, budget.reset_at) == (100, 42, float(headers['x-rate-limit-reset']))
+    assert not scheduler.is_rate_limited(ENDPOINT)
+
+    # 窗口重置后补满令牌
+    budget.reset_at = clock.now() - 1
+    assert scheduler.snapshot()[ENDPOINT] == {'limit': 100, 'remaining': 100, 'reset_seconds': None}
+
+
+async def test_429_without_reset_header_waits_default_window(db):
+    scheduler = RateLimitScheduler('token')
+    await scheduler.record_response(ENDPOINT, {}, 429)
+    assert scheduler.is_rate_limited(ENDPOINT)
+    assert DEFAULT_RESET_SECONDS - 5 <= scheduler.get_reset_time(ENDPOINT) <= DEFAULT_RESET_SECONDS
+
+
+async def test_429_with_reset_in_the_past_still_backs_off(db):
+    # 本地时钟比服务器快：响应头中的重置时间已经过去
+    scheduler = RateLimitScheduler('token')
+    await scheduler.record_response(ENDPOINT, window(100, 0, reset_in=-30), 429)
+    budget = scheduler.budgets[ENDPOINT]
+    assert budget.remaining == 0 and budget.reset_at > clock.now()
+    assert scheduler.is_rate_limited(ENDPOINT)
+
+
+async def test_budget_is_persisted_only_when_the_window_changes(db, monkeypatch):
+    scheduler = RateLimitScheduler('token')
+    saved = []
+
+    async def save(budget):
+        saved.append((budget.remaining, budget.reset_at))
+
+    monkeypatch.setattr(scheduler, '_save', save)
+    reset_at = clock.now() + 900
+    for remaining in (99, 98, 97):
+        await scheduler.record_response(ENDPOINT, window(100, remaining, reset_at=reset_at))
+    assert len(saved) == 1  # 同一窗口内只写一次
+
+    await scheduler.record_response(ENDPOINT, window(100, 0, reset_at=reset_at))
+    assert saved[-1][0] == 0  # 额度耗尽时写入，重启后仍等待重置
+    reset_at += 900
+    await scheduler.record_response(ENDPOINT, window(100, 99, reset_at=reset_at))
+    assert len(saved) == 3  # 进入新窗口
+
+    # 重启后加载的窗口视为已保存，同一窗口内的响应不再写库
+    await RateLimitScheduler('token')._save(scheduler.budgets[ENDPOINT])
+    restored = RateLimitScheduler('token')
+    await restored.load()
+    assert restored.budgets[ENDPOINT].remaining == 99
+    monkeypatch.setattr(restored, '_save', save)
+    await restored.record_response(ENDPOINT, window(100, 98, reset_at=reset_at))
+    assert len(saved) == 3
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.config import settings
+from app.models.database import get_db, transaction
+from app.services import retention
+from app.services.retention import RetentionService, archive_totals, read_archive
+from app.services.tweet_history import snowflake_from_datetime
+from app.utils import clock
+
+pytestmark = pytest.mark.anyio
+
+
+async def seed(days_ago: list) -> list:
+    """每个元素一条推文，发布于若干天前；返回推文 ID"""
+    rows = []
+    for i, days in enumerate(days_ago):
+        created_at = clock.utcnow() - timedelta(days=days)
+        tweet_id = snowflake_from_datetime(created_at) + i
+        rows.append((str(tweet_id), 'alice', f"tweet {i}", f"https://twitter.com/alice/status/{tweet_id}",
+                     created_at.isoformat(), str({'likes': i, 'retweets': 0})))
+    async with transaction() as db:
+        await db.executemany(
+            """INSERT INTO tweet_records (tweet_id, username, content, tweet_url, created_at, metrics)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            rows
+        )
+    return [int(row[0]) for row in rows]
+
+
+async def remaining_ids() -> list:
+    async with get_db() as db:
+        cursor = await db.execute("SELECT CAST(tweet_id AS INTEGER) FROM tweet_records ORDER BY 1")
+        return [row[0] for row in await cursor.fetchall()]
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'RETENTION_DAYS', 10)
+    monkeypatch.setattr(settings, 'RETENTION_BATCH_SIZE', 2)
+    monkeypatch.setattr(settings, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+    return settings.ARCHIVE_DIR
+
+
+async def test_old_tweets_are_archived_then_deleted(db, archive_dir):
+    ids = await seed([30, 30, 30, 20, 3, 1])
+    service = RetentionService()
+    await service.load_archive_totals()
+    assert (service.archive_segments, service.archive_bytes) == (0, 0)
+
+    assert await service.run_once() == 4
+    assert await remaining_ids() == ids[4:]
+    archived = list(read_archive())
+    assert [int(record['id']) for record in archived] == ids[:4]
+    assert archived[1]['metrics'] == {'likes': 1, 'retweets': 0}
+
+    # 状态中的段数量和大小随写入累加，与目录扫描的结果一致
+    assert (service.archive_segments, service.archive_bytes) == archive_totals(archive_dir)
+    assert service.archive_segments == 2  # 每天一个段
+    assert await service.run_once() == 0
+
+
+async def test_status_does_not_touch_the_filesystem(db, archive_dir, monkeypatch):
+    await seed([30])
+    service = RetentionService()
+    await service.load_archive_totals()
+    await service.run_once()
+
+    def scan(*args, **kwargs):
+        raise AssertionError('status() must not scan the archive directory')
+
+    monkeypatch.setattr(retention, 'list_segments', scan)
+    status = service.status()
+    assert status['archived_rows'] == 1
+    assert status['archive_segments'] == 1 and status['archive_bytes'] > 0
+
+
+async def test_archive_reads_are_filtered_by_author_and_time(db, archive_dir):
+    ids = await seed([40, 30, 20])
+    await RetentionService().run_once()
+    since = datetime.now(timezone.utc) - timedelta(days=35)
+    assert [int(record['id']) for record in read_archive(since=since)] == ids[1:]
+    assert list(read_archive(author='bob')) == []
+
+
+async def test_delivered_notifications_and_metrics_expire_with_the_tweets(db, archive_dir):
+    old, recent = await seed([30, 1])
+    long_ago = clock.now() - 30 * 86400
+    async with transaction() as db:
+        await db.executemany(
+            """INSERT INTO notification_outbox (tweet_id, target, payload, status, next_attempt_at, created_at,
+                                                delivered_at) VALUES (?, ?, '{}', ?, ?, ?, ?)""",
+            [(str(old), 'a', 'delivered', long_ago, long_ago, long_ago),
+             (str(old), 'b', 'pending', long_ago, long_ago, None),  # 一直投递失败的通知保留
+             (str(recent), 'a', 'delivered', clock.now(), clock.now(), clock.now())]
+        )
+        await db.executemany(
+            "INSERT INTO tweet_metrics (tweet_id, sampled_at, likes, retweets, replies, quotes) VALUES (?, ?, 1, 0, 0, 0)",
+            [(old, 1), (old, 2), (recent, 1)]
+        )
+        await db.executemany(
+            "INSERT INTO tracked_tweets (tweet_id, username, posted_at, next_sample_at) VALUES (?, 'alice', 0, 0)",
+            [(old,), (recent,)]
+        )
+
+    service = RetentionService()
+    assert await service.run_once() == 1
+    assert service.status()['pruned_rows'] == 3
+    async with get_db() as connection:
+        cursor = await connection.execute("SELECT tweet_id, target FROM notification_outbox ORDER BY id")
+        assert await cursor.fetchall() == [(str(old), 'b'), (str(recent), 'a')]
+        cursor = await connection.execute("SELECT DISTINCT tweet_id FROM tweet_metrics")
+        assert await cursor.fetchall() == [(recent,)]
+        cursor = await connection.execute("SELECT tweet_id FROM tracked_tweets")
+        assert await cursor.fetchall() == [(recent,)]
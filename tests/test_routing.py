@@ -0,0 +1,75 @@
+import json
+
+from app.services.routing import AhoCorasick, build_rule_engine, load_routing_config
+
+CONFIG = {
+    'groups': [
+        {'name': 'all', 'webhook_url': 'https://example.invalid/all', 'rules': [{'accounts': ['*']}]},
+        {'name': 'eth', 'webhook_url': 'https://example.invalid/eth',
+         'rules': [{'accounts': ['vitalik'], 'keywords': ['Mainnet', '主网']}]},
+        {'name': 'releases', 'webhook_url': 'https://example.invalid/releases',
+         'rules': [{'accounts': ['*'], 'patterns': [r'v\d+\.\d+']}]},
+        {'name': 'elon', 'webhook_url': 'https://example.invalid/elon', 'rules': [{'accounts': ['ElonMusk']}]}
+    ]
+}
+
+
+def test_aho_corasick_finds_overlapping_keywords():
+    automaton = AhoCorasick(['he', 'she', 'hers', 'his'])
+    assert automaton.search('ushers') == {0, 1, 2}
+    assert automaton.search('nothing here') == {0}
+    assert automaton.search('xyz') == set()
+
+
+def test_unfiltered_rules_match_every_tweet_of_the_account():
+    engine = build_rule_engine(CONFIG)
+    assert engine.match('elonmusk', 'hello') == {'all', 'elon'}
+    assert engine.match('someone', 'hello') == {'all'}
+
+
+def test_keywords_only_match_subscribed_accounts():
+    engine = build_rule_engine(CONFIG)
+    assert 'eth' in engine.match('Vitalik', 'The MAINNET is live')
+    assert 'eth' in engine.match('vitalik', '主网上线')
+    assert 'eth' not in engine.match('vitalik', 'gm')
+    assert 'eth' not in engine.match('someone', 'mainnet is live')
+
+
+def test_patterns_are_checked_after_the_combined_prefilter():
+    engine = build_rule_engine(CONFIG)
+    assert 'releases' in engine.match('someone', 'Shipped V2.1 today')
+    assert 'releases' not in engine.match('someone', 'version two')
+
+
+def test_uncombinable_patterns_are_checked_one_by_one():
+    # 内联标志只能出现在开头，合并后的正则无法编译
+    config = {'groups': [{'name': 'g', 'webhook_url': 'u',
+                          'rules': [{'accounts': ['*'], 'patterns': ['(?i)alpha', '(?i)beta']}]}]}
+    engine = build_rule_engine(config)
+    assert engine.match('a', 'BETA release') == {'g'}
+    assert engine.match('a', 'gamma') == set()
+
+
+def test_backreferences_are_not_renumbered_by_the_prefilter():
+    # 合并后 \1 会指向第一条规则的分组，'xx' 不再匹配
+    config = {'groups': [
+        {'name': 'first', 'webhook_url': 'u', 'rules': [{'accounts': ['*'], 'patterns': [r'(a)b']}]},
+        {'name': 'second', 'webhook_url': 'u', 'rules': [{'accounts': ['*'], 'patterns': [r'(x)\1']}]}
+    ]}
+    engine = build_rule_engine(config)
+    assert engine.match('a', 'xx') == {'second'}
+    assert engine.match('a', 'ab') == {'first'}
+    assert engine.match('a', 'xy') == set()
+
+
+def test_default_config_routes_everything_to_the_default_webhook(monkeypatch):
+    from app.config import settings
+    monkeypatch.setattr(settings, 'NOTIFY_RULES_FILE', '')
+    engine = build_rule_engine(load_routing_config())
+    assert engine.match('anyone', 'anything') == {'default'}
+
+
+def test_config_is_loaded_from_file(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps(CONFIG), encoding='utf-8')
+    assert load_routing_config(str(path)) == CONFIG
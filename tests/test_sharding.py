@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.sharding import SQLiteShardCoordinator, fair_share, shard_of
+from app.services.wechat_service import WeChatService
+from app.utils import clock
+
+pytestmark = pytest.mark.anyio
+
+SHARD_COUNT = 8
+
+
+def test_fair_share_covers_every_shard():
+    workers = ['a', 'b', 'c']
+    assert sum(fair_share(64, workers, worker) for worker in workers) == 64
+    assert shard_of('ElonMusk', 64) == shard_of('elonmusk', 64)
+
+
+async def test_workers_split_shards_and_take_over_released_ones(db):
+    first = SQLiteShardCoordinator('worker-a', SHARD_COUNT)
+    second = SQLiteShardCoordinator('worker-b', SHARD_COUNT)
+    try:
+        await first.start()
+        assert len(first.shards) == SHARD_COUNT
+
+        await second.start()
+        await first.heartbeat()  # 份额变小后释放多余的分片
+        await second.heartbeat()
+        assert len(first.shards) == len(second.shards) == SHARD_COUNT // 2
+        assert not first.shards & second.shards
+
+        usernames = [f"user_{i}" for i in range(50)]
+        assert sorted(first.owned_accounts(usernames) + second.owned_accounts(usernames)) == sorted(usernames)
+
+        await second.stop()
+        await first.heartbeat()
+        assert len(first.shards) == SHARD_COUNT
+    finally:
+        await first.stop()
+        await second.stop()
+
+
+async def test_expired_lease_stops_polling(db):
+    coordinator = SQLiteShardCoordinator('worker-a', SHARD_COUNT)
+    try:
+        await coordinator.start()
+        assert coordinator.owned_accounts(['someone']) == ['someone']
+        coordinator.lease_until = clock.now() - 1  # 心跳失败，租约到期
+        assert coordinator.owned_accounts(['someone']) == []
+    finally:
+        await coordinator.stop()
+
+
+async def test_webhook_budget_is_shared_between_workers(db, monkeypatch):
+    limit, window = 3, 0.3
+    monkeypatch.setattr(settings, 'SHARDING_BACKEND', 'sqlite')
+    monkeypatch.setattr(settings, 'WECHAT_RATE_LIMIT_PER_MINUTE', limit)
+    workers = [WeChatService('https://example.invalid/hook'), WeChatService('https://example.invalid/hook')]
+    for service in workers:
+        service.rate_window_seconds = window
+    sent = []
+
+    async def send(service: WeChatService):
+        await service._wait_for_slot()
+        sent.append(clock.monotonic())
+
+    started = clock.monotonic()
+    await asyncio.gather(*(send(workers[i % 2]) for i in range(8)))
+
+    # 两个 worker 合计每个窗口最多发送 limit 条：8 条至少需要跨过两个完整窗口
+    sent.sort()
+    assert sent[-1] - started >= 2 * window
+    assert all(later - earlier >= window - 0.05 for earlier, later in zip(sent, sent[limit:]))
@@ -0,0 +1,93 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.models.database import transaction
+from app.services.tweet_history import build_match_query, search_tweets, snowflake_from_datetime
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+TWEETS = [
+    ('alice', '以太坊主网升级完成'),
+    ('bob', 'Mainnet upgrade is live'),
+    ('alice', '新版本发布：v2.1'),
+    ('carol', 'gm'),
+    ('alice', '主网发布倒计时 100% ready'),
+    ('bob', '100_percent mainnet'),
+]
+
+
+async def insert_tweets():
+    """按时间顺序写入，推文 ID 与雪花 ID 一样随时间递增"""
+    ids = []
+    async with transaction() as db:
+        for i, (username, content) in enumerate(TWEETS):
+            tweet_id = snowflake_from_datetime(START.replace(hour=i)) + i
+            ids.append(tweet_id)
+            await db.execute(
+                """INSERT INTO tweet_records (tweet_id, username, content, tweet_url, created_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (str(tweet_id), username, content, f"https://x.com/{username}/status/{tweet_id}",
+                 START.replace(hour=i).isoformat())
+            )
+    return ids
+
+
+def texts(result) -> list:
+    return [tweet['text'] for tweet in result['tweets']]
+
+
+def test_match_query_splits_indexed_and_short_terms():
+    assert build_match_query('主网升级 mainnet') == ('"主网升级" "mainnet"', [])
+    assert build_match_query('say "hi" 发布') == ('"say" """hi"""', ['%发布%'])
+    # 短词按字面匹配，LIKE 通配符被转义
+    assert build_match_query('% a_') == (None, ['%\\%%', '%a\\_%'])
+    with pytest.raises(ValueError):
+        build_match_query('   ')
+
+
+async def test_trigram_index_matches_substrings(db):
+    await insert_tweets()
+    assert texts(await search_tweets('主网')) == ['主网发布倒计时 100% ready', '以太坊主网升级完成']  # 两个字走 LIKE
+    assert texts(await search_tweets('主网升级')) == ['以太坊主网升级完成']
+    assert texts(await search_tweets('MAINNET')) == ['100_percent mainnet', 'Mainnet upgrade is live']
+    assert texts(await search_tweets('mainnet upgrade')) == ['Mainnet upgrade is live']
+    assert texts(await search_tweets('mainnet', author='bob')) == ['100_percent mainnet', 'Mainnet upgrade is live']
+    assert texts(await search_tweets('mainnet', author='alice')) == []
+
+
+async def test_short_terms_fall_back_to_like(db):
+    await insert_tweets()
+    assert texts(await search_tweets('发布')) == ['主网发布倒计时 100% ready', '新版本发布：v2.1']
+    assert texts(await search_tweets('发布 主网')) == ['主网发布倒计时 100% ready']
+    assert texts(await search_tweets('gm')) == ['gm']
+    # % 和 _ 按字面匹配
+    assert texts(await search_tweets('0%')) == ['主网发布倒计时 100% ready']
+    assert texts(await search_tweets('0_')) == ['100_percent mainnet']
+    # 短词与索引词组合
+    assert texts(await search_tweets('100 ready')) == ['主网发布倒计时 100% ready']
+
+
+async def test_before_id_pages_through_results(db):
+    ids = await insert_tweets()
+    pages = []
+    before_id = None
+    while True:
+        page = await search_tweets(before_id=before_id, limit=4)
+        pages.append([int(tweet['id']) for tweet in page['tweets']])
+        before_id = page['next_before_id']
+        if before_id is None:
+            break
+        before_id = int(before_id)
+    assert pages == [ids[::-1][:4], ids[::-1][4:]]
+
+    # 关键词查询同样按 ID 分页，时间范围与 before_id 取交集
+    first = await search_tweets('主网', limit=1)
+    assert first['next_before_id'] == str(ids[4])
+    assert texts(await search_tweets('主网', before_id=int(first['next_before_id']))) == ['以太坊主网升级完成']
+    first = await search_tweets('mainnet', limit=1)
+    assert texts(await search_tweets('mainnet', before_id=int(first['next_before_id']))) == ['Mainnet upgrade is live']
+    window = await search_tweets(since=START.replace(hour=1), until=START.replace(hour=5), before_id=ids[3])
+    assert [int(tweet['id']) for tweet in window['tweets']] == [ids[2], ids[1]]
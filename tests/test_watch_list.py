@@ -0,0 +1,18 @@
+import logging
+
+from app.config import settings
+from app.services.watch_list import apply_settings
+
+
+def test_unknown_polling_mode_is_rejected(monkeypatch, caplog):
+    monkeypatch.setattr(settings, 'POLLING_MODE', 'timeline')
+    monkeypatch.setattr(settings, 'POLLING_STRATEGY', 'round_robin')
+
+    with caplog.at_level(logging.ERROR):
+        applied = apply_settings({'POLLING_MODE': 'serach', 'POLLING_STRATEGY': 'adaptive'})
+    # 拼写错误的取值被拒绝并记录错误，同一文件中合法的配置项照常生效
+    assert applied == {'POLLING_STRATEGY': 'adaptive'}
+    assert settings.POLLING_MODE == 'timeline'
+    assert 'Invalid value for POLLING_MODE' in caplog.text
+
+    assert apply_settings({'POLLING_MODE': 'search'}) == {'POLLING_MODE': 'search'}
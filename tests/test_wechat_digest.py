@@ -0,0 +1,63 @@
+from app.services.wechat_service import MARKDOWN_MAX_BYTES, WeChatService
+
+
+def tweet(i: int, text: str = 'gm', alt_text: str = '') -> dict:
+    data = {'id': str(i), 'author': f"user{i}", 'text': text, 'url': f"https://x.com/user{i}/status/{i}",
+            'metrics': {'likes': i}}
+    if alt_text:
+        data['media'] = [{'type': 'photo', 'url': f"https://pbs.twimg.com/{i}.jpg", 'alt_text': alt_text}]
+    return data
+
+
+def size(content: str) -> int:
+    return len(content.encode('utf-8'))
+
+
+def test_cjk_digest_is_split_below_the_byte_limit():
+    # 每条约 200 个汉字（600 字节以上），按字符数计算会严重低估长度
+    tweets = [tweet(i, '主网升级' * 50) for i in range(20)]
+    service = WeChatService()
+    messages = service.build_digest_messages(tweets)
+
+    assert len(messages) > 1
+    assert [i for _, indices in messages for i in indices] == list(range(20))
+    for content, indices in messages:
+        assert size(content) <= MARKDOWN_MAX_BYTES
+        assert not content.endswith('...')  # 按条拆分，不截断
+        assert all(tweets[i]['url'] in content for i in indices)
+    # 贪心装满：除最后一条外，每条消息都放不下下一条推文
+    for (content, _), (_, following) in zip(messages, messages[1:]):
+        section = service._format_tweet_message(tweets[following[0]], heading=f"### 🐦 @user{following[0]}")
+        assert size(content) + size(section) > MARKDOWN_MAX_BYTES
+
+
+def test_oversized_entry_is_sent_alone_and_truncated():
+    tweets = [tweet(0), tweet(1, alt_text='长' * 2000), tweet(2)]
+    messages = WeChatService().build_digest_messages(tweets)
+
+    assert [indices for _, indices in messages] == [[0], [1], [2]]
+    content = messages[1][0]
+    assert size(content) <= MARKDOWN_MAX_BYTES
+    assert content.endswith('...')
+    content.encode('utf-8').decode('utf-8')  # 截断在字符边界上
+    assert tweets[0]['url'] in messages[0][0] and tweets[2]['url'] in messages[2][0]
+
+
+def test_header_and_footer_are_counted_against_the_limit():
+    service = WeChatService()
+    baseline = service.build_digest_messages([tweet(0), tweet(1, alt_text='x')])
+    assert len(baseline) == 1
+    padding = MARKDOWN_MAX_BYTES - size(baseline[0][0])
+
+    # 标题、分隔和每条末尾的原推文链接一起恰好 4096 字节：仍合并为一条，不截断
+    fits = service.build_digest_messages([tweet(0), tweet(1, alt_text='x' * (1 + padding))])
+    assert [indices for _, indices in fits] == [[0, 1]]
+    content = fits[0][0]
+    assert size(content) == MARKDOWN_MAX_BYTES
+    assert content.startswith('## 🐦 2 条新推文')
+    assert content.endswith(f"[查看原推文]({tweet(1)['url']})")
+
+    # 多一个字节就拆成两条，各自不带摘要标题
+    split = service.build_digest_messages([tweet(0), tweet(1, alt_text='x' * (2 + padding))])
+    assert [indices for _, indices in split] == [[0], [1]]
+    assert all(not content.startswith('## 🐦 2 条') and not content.endswith('...') for content, _ in split)